@@ -0,0 +1,65 @@
+import sqlite3
+from database import DatabaseError
+from instrumentation import instrumented
+from migrations import fill_summary_tables
+
+class GalleryAnalytics:
+    # Все отчёты читают сводные таблицы, которые триггеры держат в актуальном состоянии
+    def __init__(self, db):
+        self.db = db
+    
+    def _fetch(self, sql, parameters=()):
+        try:
+            with self.db.pool.connection() as conn:
+                return conn.execute(sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения статистики: {e}")
+    
+    @instrumented("analytics.totals")
+    def totals(self):
+        count, value = self._fetch('''
+            SELECT COALESCE(SUM(count), 0), COALESCE(SUM(total_price), 0) FROM style_stats
+        ''')[0]
+        return count, value
+    
+    @instrumented("analytics.value_by_style", rows_read=len)
+    def value_by_style(self, limit=None):
+        return self._fetch('''
+            SELECT key, count, total_price FROM style_stats
+            ORDER BY total_price DESC LIMIT ?
+        ''', (-1 if limit is None else limit,))
+    
+    @instrumented("analytics.average_price_by_artist", rows_read=len)
+    def average_price_by_artist(self, limit=None):
+        return self._fetch('''
+            SELECT key, count, total_price / count AS average FROM artist_stats
+            ORDER BY average DESC LIMIT ?
+        ''', (-1 if limit is None else limit,))
+    
+    @instrumented("analytics.counts_by_decade", rows_read=len)
+    def counts_by_decade(self):
+        return self._fetch("SELECT key, count FROM decade_stats ORDER BY key")
+    
+    @instrumented("analytics.filter_values")
+    def filter_values(self):
+        # Списки для фильтров берутся из ключей сводок: их столько же, сколько групп, а не работ
+        return {
+            "artist": [key for key, in self._fetch("SELECT key FROM artist_stats ORDER BY key")],
+            "style": [key for key, in self._fetch("SELECT key FROM style_stats ORDER BY key")],
+        }
+    
+    def report(self, limit=10):
+        return {
+            "totals": self.totals(),
+            "styles": self.value_by_style(limit),
+            "artists": self.average_price_by_artist(limit),
+            "decades": self.counts_by_decade(),
+        }
+    
+    def rebuild(self):
+        # Пересчёт с нуля на случай, если сводку правили в обход триггеров
+        try:
+            with self.db.transaction() as conn:
+                fill_summary_tables(conn)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка пересчёта статистики: {e}")
@@ -0,0 +1,222 @@
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+from gallery_logging import setup_logging
+from database import DatabaseManager, DatabaseError, archive_path
+
+# 256 страниц по 4 КБ — около 1 МБ за шаг; между шагами блокировка базы отпускается
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.005
+DEFAULT_RETENTION = 7
+SNAPSHOT_PREFIX = "gallery-"
+SNAPSHOT_TIME_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+class BackupError(Exception):
+    pass
+
+def _connect_read_only(path):
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+
+def verify_backup(path):
+    if not os.path.exists(path):
+        raise BackupError(f"Файл копии не найден: {path}")
+    try:
+        conn = _connect_read_only(path)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            has_artworks = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'artworks'").fetchone() is not None
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        raise BackupError(f"Копия повреждена: {e}")
+    if result != "ok":
+        raise BackupError(f"Копия не прошла проверку целостности: {result}")
+    if not has_artworks:
+        raise BackupError(f"Файл не является базой галереи: {path}")
+
+def _copy_schema(source, name, path, pages, step):
+    dest = sqlite3.connect(path)
+    try:
+        source.backup(dest, pages=pages, progress=step, name=name)
+        # Снимок — самостоятельный файл, без -wal рядом
+        dest.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        dest.close()
+
+def backup_database(db_name, target, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, progress=None,
+                    archive_name=None):
+    # Копия пишется во временный файл и подменяет target только после проверки. Архив, если
+    # он есть, копируется рядом со снимком (gallery-….archive.db) в той же транзакции чтения
+    targets = {"main": target}
+    if archive_name is not None and os.path.exists(archive_name):
+        targets["archive"] = archive_path(target)
+    tmp_paths = {name: f"{path}.tmp" for name, path in targets.items()}
+    for tmp_path in tmp_paths.values():
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    source = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        if "archive" in targets:
+            source.execute("ATTACH DATABASE ? AS archive", (archive_name,))
+        # Без открытой транзакции чтения любой коммит другого соединения перезапускает
+        # копирование с нуля, и при постоянной записи оно может не закончиться никогда.
+        # В режиме WAL снимок не мешает писателям, только откладывает checkpoint
+        source.execute("BEGIN")
+        for name in targets:
+            source.execute(f"SELECT 1 FROM {name}.sqlite_master LIMIT 1").fetchone()
+        
+        def step(status, remaining, total):
+            if progress is not None:
+                progress(total - remaining, total)
+            if remaining:
+                time.sleep(sleep)
+        
+        for name, tmp_path in tmp_paths.items():
+            _copy_schema(source, name, tmp_path, pages, step)
+        source.execute("COMMIT")
+    except sqlite3.Error as e:
+        for tmp_path in tmp_paths.values():
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        raise BackupError(f"Ошибка резервного копирования: {e}")
+    finally:
+        source.close()
+    
+    try:
+        for tmp_path in tmp_paths.values():
+            verify_backup(tmp_path)
+    except BackupError:
+        for tmp_path in tmp_paths.values():
+            os.unlink(tmp_path)
+        raise
+    # Архив подменяется первым: снимок без своего архива в каталоге не появится
+    for name in reversed(list(targets)):
+        os.replace(tmp_paths[name], targets[name])
+    return target
+
+def restore_database(db, path):
+    verify_backup(path)
+    archive = archive_path(path)
+    has_archive = os.path.exists(archive)
+    if has_archive:
+        verify_backup(archive)
+    db.pool.enable_archive(create=has_archive)
+    source = _connect_read_only(path)
+    try:
+        with db.pool.connection() as conn:
+            # Одним шагом: другие соединения увидят либо старую базу, либо восстановленную
+            source.backup(conn)
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if not has_archive and db.pool.archive_enabled:
+                # Снимок сделан до первого переноса: все его работы в горячей таблице
+                conn.execute("DELETE FROM archive.artworks")
+        if has_archive:
+            # backup() пишет только в main получателя, поэтому архив — своим соединением
+            archive_source = _connect_read_only(archive)
+            archive_dest = sqlite3.connect(db.archive_name)
+            try:
+                archive_source.backup(archive_dest)
+            finally:
+                archive_dest.close()
+                archive_source.close()
+    except sqlite3.Error as e:
+        raise BackupError(f"Ошибка восстановления: {e}")
+    finally:
+        source.close()
+    db.cache.invalidate()
+    if result != "ok":
+        raise BackupError(f"База после восстановления не прошла проверку целостности: {result}")
+    # Снимок мог быть сделан до последних миграций
+    db.setup_database()
+
+class BackupManager:
+    def __init__(self, db, directory=None, retention=DEFAULT_RETENTION, pages=BACKUP_PAGES,
+                 sleep=BACKUP_SLEEP):
+        self.db = db
+        self.directory = directory or \
+            os.path.splitext(os.path.abspath(db.db_name))[0] + ".backups"
+        self.retention = retention
+        self.pages = pages
+        self.sleep = sleep
+    
+    def snapshots(self):
+        # Имена содержат время создания, поэтому сортировка по имени — по возрасту.
+        # Копии архива лежат рядом со своими снимками и отдельными снимками не считаются
+        return sorted(path for path in
+                      glob.glob(os.path.join(self.directory, f"{SNAPSHOT_PREFIX}*.db"))
+                      if not path.endswith(".archive.db"))
+    
+    def snapshot(self, progress=None, prune=True):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{SNAPSHOT_PREFIX}{datetime.now().strftime(SNAPSHOT_TIME_FORMAT)}.db"
+        path = os.path.join(self.directory, name)
+        started = time.perf_counter()
+        backup_database(self.db.db_name, path, self.pages, self.sleep, progress,
+                        self.db.archive_name)
+        removed = self.prune() if prune else []
+        logging.info("Created snapshot %s in %.2f s, removed %d old snapshots", path,
+                     time.perf_counter() - started, len(removed),
+                     extra={"audit": {"action": "snapshot", "path": path}})
+        return path
+    
+    def prune(self):
+        snapshots = self.snapshots()
+        removed = snapshots[:max(0, len(snapshots) - self.retention)]
+        for path in removed:
+            os.unlink(path)
+            if os.path.exists(archive_path(path)):
+                os.unlink(archive_path(path))
+        return removed
+    
+    def restore(self, path):
+        # Проверяем копию до того, как что-то менять; текущее состояние сохраняем отдельным
+        # снимком, чтобы неудачное восстановление можно было откатить
+        verify_backup(path)
+        # Без удаления старых: иначе под ротацию мог бы попасть сам восстанавливаемый снимок
+        safety = self.snapshot(prune=False)
+        restore_database(self.db, path)
+        self.prune()
+        logging.warning("Restored database from %s, previous state saved to %s", path, safety,
+                        extra={"audit": {"action": "restore", "path": path, "safety": safety}})
+        return safety
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Резервные копии базы галереи")
+    parser.add_argument("--db", default="art_gallery.db", help="файл базы данных")
+    parser.add_argument("--dir", help="каталог снимков (по умолчанию рядом с базой)")
+    parser.add_argument("--keep", type=int, default=DEFAULT_RETENTION,
+                        help="сколько последних снимков хранить")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("snapshot", help="сделать снимок работающей базы")
+    commands.add_parser("list", help="показать снимки")
+    restore_parser = commands.add_parser("restore", help="восстановить базу из снимка")
+    restore_parser.add_argument("path")
+    
+    args = parser.parse_args(argv)
+    setup_logging()
+    try:
+        db = DatabaseManager(args.db)
+        backups = BackupManager(db, args.dir, args.keep)
+        if args.command == "snapshot":
+            print(f"Снимок: {backups.snapshot()}")
+        elif args.command == "list":
+            for path in backups.snapshots():
+                print(path)
+        else:
+            safety = backups.restore(args.path)
+            print(f"База восстановлена из {args.path}, прежнее состояние: {safety}")
+        db.close()
+    except (BackupError, DatabaseError, OSError) as e:
+        print(f"Ошибка: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from database import DatabaseManager
+from backup import BackupManager
+from analytics import GalleryAnalytics
+from server import run_load_test
+from models import Artwork
+
+SIZES = (1000, 100000, 1000000)
+SINGLE_OPERATIONS = 1000
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_TOLERANCE = 0.5
+STRESS_OPERATIONS = 500
+# Абсолютный бюджет на первую отрисовку окна, независимо от базовой линии
+STARTUP_BUDGET = 1.0
+HTTP_REQUESTS = 500
+HTTP_CONCURRENCY = 8
+SCROLL_STEPS = 100
+# Оригиналы для столбца миниатюр: крупные, чтобы генерация в фоне была заметной работой
+SCROLL_IMAGE_SIZE = (3000, 2000)
+SCROLL_IMAGE_COLORS = ("darkred", "darkgreen", "navy")
+# Модули, которые widgets подгружает только по требованию, а не при собственном импорте
+DEFERRED_IMPORTS = ("analytics", "backup", "image_store", "thumbnails", "multiprocessing",
+                    "ssl", "urllib.request", "http.client")
+
+# (художник, стиль, годы работы, вес в каталоге)
+ARTISTS = [
+    ("Винсент Ван Гог", "Постимпрессионизм", 1881, 1890, 12),
+    ("Клод Моне", "Импрессионизм", 1858, 1926, 10),
+    ("Пабло Пикассо", "Кубизм", 1900, 1973, 10),
+    ("Казимир Малевич", "Супрематизм", 1904, 1935, 6),
+    ("Василий Кандинский", "Абстракционизм", 1896, 1944, 6),
+    ("Илья Репин", "Реализм", 1863, 1930, 5),
+    ("Иван Айвазовский", "Романтизм", 1835, 1900, 5),
+    ("Rembrandt van Rijn", "Барокко", 1625, 1669, 4),
+    ("Leonardo da Vinci", "Ренессанс", 1470, 1519, 2),
+    ("Salvador Dalí", "Сюрреализм", 1922, 1989, 4),
+    ("Frida Kahlo", "Наивное искусство", 1925, 1954, 3),
+    ("Иван Шишкин", "Реализм", 1852, 1898, 5),
+    ("Gustav Klimt", "Модерн", 1880, 1918, 3),
+    ("Edvard Munch", "Экспрессионизм", 1880, 1944, 3),
+    ("Марк Шагал", "Модернизм", 1907, 1985, 4),
+]
+TITLE_WORDS = ["Пейзаж", "Портрет", "Натюрморт", "Композиция", "Этюд", "Вид", "Утро", "Вечер",
+               "Landscape", "Portrait", "Study", "Garden", "Sea", "Night", "Flowers", "City"]
+
+def generate_artworks(count, seed=42, first_number=0):
+    # Номер в названии делает работы разными и для проверки дубликатов
+    rng = random.Random(seed)
+    weights = [artist[4] for artist in ARTISTS]
+    for number in range(first_number, first_number + count):
+        artist, style, first_year, last_year, _ = rng.choices(ARTISTS, weights)[0]
+        title = f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS).lower()} №{number}"
+        # Цены распределены логнормально: много недорогих работ и редкие шедевры
+        price = round(min(rng.lognormvariate(9, 2), 5e8), 2)
+        yield Artwork(None, title, artist, rng.randint(first_year, last_year), style, price, "")
+
+def measure(fn, *args, **kwargs):
+    started = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - started
+
+def bench_database(size, tmp_dir):
+    results = {}
+    db_path = os.path.join(tmp_dir, f"bench_{size}.db")
+    db = DatabaseManager(db_path)
+    
+    results[f"db.bulk_insert.{size}"] = measure(db.add_artworks, generate_artworks(size))
+    
+    extra = list(generate_artworks(SINGLE_OPERATIONS, seed=size, first_number=size))
+    started = time.perf_counter()
+    single_ids = [db.add_artwork(artwork) for artwork in extra]
+    results[f"db.single_insert_x{SINGLE_OPERATIONS}.{size}"] = time.perf_counter() - started
+    
+    results[f"db.first_page.{size}"] = measure(db.get_artworks_page)
+    results[f"db.full_load.{size}"] = measure(db.get_all_artworks)
+    # Фильтр по художнику и стилю должен отдавать первую страницу без сортировки всех совпадений
+    results[f"db.query_filtered.artist.{size}"] = measure(db.query_artworks,
+                                                          artist="Клод Моне")
+    results[f"db.query_filtered.style.{size}"] = measure(db.query_artworks, style="Реализм")
+    results[f"db.query_filtered.artist_year.{size}"] = measure(
+        db.query_artworks, artist="Пабло Пикассо", year_from=1930)
+    results[f"db.analytics_report.{size}"] = measure(GalleryAnalytics(db).report)
+    elapsed, _ = asyncio.run(run_load_test(db, HTTP_REQUESTS, HTTP_CONCURRENCY, HTTP_CONCURRENCY))
+    results[f"http.load_x{HTTP_REQUESTS}.{size}"] = elapsed
+    
+    started = time.perf_counter()
+    for artwork_id in single_ids:
+        db.delete_artwork(artwork_id)
+    results[f"db.single_delete_x{SINGLE_OPERATIONS}.{size}"] = time.perf_counter() - started
+    
+    backups = BackupManager(db, os.path.join(tmp_dir, f"backups_{size}"))
+    results[f"db.snapshot.{size}"] = measure(backups.snapshot)
+    # Те же одиночные вставки и удаления, но пока в соседнем потоке снимается копия
+    snapshot = threading.Thread(target=backups.snapshot)
+    snapshot.start()
+    started = time.perf_counter()
+    for artwork_id in [db.add_artwork(artwork) for artwork in extra]:
+        db.delete_artwork(artwork_id)
+    results[f"db.single_insert_delete_during_snapshot_x{SINGLE_OPERATIONS}.{size}"] = \
+        time.perf_counter() - started
+    snapshot.join()
+    
+    db.close()
+    
+    # Отдельная копия для массового удаления, чтобы база осталась для замеров интерфейса
+    delete_db = DatabaseManager(os.path.join(tmp_dir, f"bench_{size}_delete.db"))
+    ids = delete_db.add_artworks(generate_artworks(size))
+    results[f"db.bulk_delete.{size}"] = measure(delete_db.delete_artworks, ids)
+    delete_db.close()
+    
+    # 90 % коллекции уходит в архив: загрузка по умолчанию должна зависеть от оставшихся 10 %
+    archive_db = DatabaseManager(os.path.join(tmp_dir, f"bench_{size}_archive.db"))
+    ids = archive_db.add_artworks(generate_artworks(size))
+    archive_db.mark_archived(ids[:size * 9 // 10])
+    results[f"db.archive_90pct.{size}"] = measure(archive_db.archive_artworks)
+    results[f"db.full_load_hot_10pct.{size}"] = measure(archive_db.get_all_artworks)
+    results[f"db.first_page_with_archive.{size}"] = measure(archive_db.get_artworks_page,
+                                                            include_archive=True)
+    archive_db.close()
+    return results, db_path
+
+def bench_table_render(db_path):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    from widgets import ArtworkTable
+    
+    app = QApplication.instance() or QApplication([])
+    db = DatabaseManager(db_path)
+    table = ArtworkTable(db)
+    table.resize(1000, 600)
+    table.show()
+    
+    def wait_for_worker():
+        app.processEvents()
+        while table.worker.pending():
+            table.worker.wait_for_done()
+            app.processEvents()
+    
+    # Первая загрузка запускается отложенно после показа и тянет за собой догрузку
+    # видимых строк — дожидаемся всего этого вне замера
+    wait_for_worker()
+    wait_for_worker()
+    started = time.perf_counter()
+    table.load_data()
+    wait_for_worker()
+    table.table.viewport().grab()
+    elapsed = time.perf_counter() - started
+    
+    table.close()
+    db.close()
+    return elapsed
+
+def bench_table_scroll(db_path, steps=SCROLL_STEPS):
+    # Худший кадр при прокрутке по страницам, пока миниатюры догружаются и генерируются в фоне
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtGui import QColor, QImage
+    from PySide6.QtWidgets import QApplication
+    from image_store import ImageStore, attach_image
+    from table_model import SKELETON_ROWS
+    from widgets import ArtworkTable
+    
+    app = QApplication.instance() or QApplication([])
+    db = DatabaseManager(db_path)
+    store = ImageStore.for_database(db_path)
+    paths = []
+    for color in SCROLL_IMAGE_COLORS:
+        image = QImage(*SCROLL_IMAGE_SIZE, QImage.Format_RGB32)
+        image.fill(QColor(color))
+        paths.append(os.path.join(os.path.dirname(db_path), f"scroll_{color}.jpg"))
+        image.save(paths[-1])
+    for number, row in enumerate(db.get_artworks_page(limit=steps * 20)):
+        attach_image(db, store, row[0], paths[number % len(paths)])
+    
+    table = ArtworkTable(db)
+    table.resize(1000, 600)
+    table.show()
+    app.processEvents()
+    while table.model.rowCount() <= SKELETON_ROWS and table.worker.pending():
+        table.worker.wait_for_done()
+        app.processEvents()
+    
+    scroll_bar = table.table.verticalScrollBar()
+    worst = 0
+    for _ in range(steps):
+        started = time.perf_counter()
+        scroll_bar.setValue(scroll_bar.value() + scroll_bar.pageStep())
+        app.processEvents()
+        table.table.viewport().grab()
+        worst = max(worst, time.perf_counter() - started)
+    
+    table.thumbnails.close()
+    table.close()
+    table.worker.wait_for_done()
+    db.close()
+    return worst
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+def bench_startup(db_path):
+    # Запускается сама программа: время считается от старта процесса, включая интерпретатор
+    # и импорты, до первой отрисовки окна и до прихода первой страницы таблицы
+    work_dir = tempfile.mkdtemp()
+    os.link(db_path, os.path.join(work_dir, "art_gallery.db"))
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, MAIN_SCRIPT, "--startup-probe"], cwd=work_dir,
+                               env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True)
+    timings = {}
+    for line in process.stdout:
+        timings[line.strip()] = time.perf_counter() - started
+    process.wait(timeout=60)
+    if set(timings) != {"painted", "loaded"}:
+        raise RuntimeError("Окно не было отрисовано")
+    return timings["painted"], timings["loaded"]
+
+def check_startup_budget(results, budget=STARTUP_BUDGET):
+    return [(name, seconds) for name, seconds in sorted(results.items())
+            if name.startswith("gui.startup_first_paint.") and seconds > budget]
+
+def bench_import_widgets():
+    # -X importtime печатает в stderr каждый загруженный модуль с накопленным временем, мкс
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import widgets"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            capture_output=True, text=True, check=True).stderr
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative) / 1e6
+    return modules["widgets"], sorted(modules)
+
+def check_deferred_imports(modules, deferred=DEFERRED_IMPORTS):
+    return [name for name in deferred if name in modules]
+
+def stress_writer(db_path, operations, seed):
+    # Каждый процесс вставляет работы и удаляет часть своих же, примерно 70/30
+    db = DatabaseManager(db_path, pool_size=1)
+    rng = random.Random(seed)
+    own_ids = []
+    inserted = deleted = 0
+    for artwork in generate_artworks(operations, seed=seed, first_number=seed * operations):
+        if own_ids and rng.random() < 0.3:
+            deleted += db.delete_artwork(own_ids.pop(rng.randrange(len(own_ids))))
+        else:
+            own_ids.append(db.add_artwork(artwork))
+            inserted += 1
+    db.close()
+    return inserted, deleted
+
+def run_stress(db_path, processes, operations):
+    # Процессы стартуют на пустом файле и мигрируют его одновременно — это тоже часть проверки
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        counts = pool.starmap(stress_writer, [(db_path, operations, seed)
+                                              for seed in range(processes)])
+    elapsed = time.perf_counter() - started
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        rows = conn.execute("SELECT COUNT(*) FROM artworks").fetchone()[0]
+        summarized = conn.execute("SELECT COALESCE(SUM(count), 0) FROM style_stats").fetchone()[0]
+    finally:
+        conn.close()
+    
+    inserted = sum(count[0] for count in counts)
+    deleted = sum(count[1] for count in counts)
+    return {
+        "elapsed": elapsed,
+        "operations_per_second": processes * operations / elapsed,
+        "integrity": integrity,
+        "expected_rows": inserted - deleted,
+        "rows": rows,
+        "summarized_rows": summarized,
+    }
+
+def run(sizes, tmp_dir, gui=True):
+    results = {}
+    for size in sizes:
+        db_results, db_path = bench_database(size, tmp_dir)
+        results.update(db_results)
+        if gui:
+            results[f"gui.table_load_data.{size}"] = bench_table_render(db_path)
+            first_paint, first_page = bench_startup(db_path)
+            results[f"gui.startup_first_paint.{size}"] = first_paint
+            results[f"gui.startup_first_page.{size}"] = first_page
+            results[f"gui.table_scroll_worst_frame.{size}"] = bench_table_scroll(db_path)
+    return results
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        expected = baseline.get(name)
+        if expected is not None and seconds > expected * (1 + tolerance):
+            regressions.append((name, expected, seconds))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности галереи")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--no-gui", action="store_true", help="пропустить замеры интерфейса")
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое замедление относительно базовой линии (0.5 = +50%%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--stress", type=int, metavar="N",
+                        help="дополнительно запустить N процессов-писателей на одну базу")
+    parser.add_argument("--stress-operations", type=int, default=STRESS_OPERATIONS)
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET,
+                        help="предельное время до первой отрисовки окна, с")
+    args = parser.parse_args(argv)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = run(args.sizes, tmp_dir, gui=not args.no_gui)
+        eager_imports = []
+        if not args.no_gui:
+            results["gui.import_widgets"], modules = bench_import_widgets()
+            eager_imports = check_deferred_imports(modules)
+        if args.stress:
+            stress = run_stress(os.path.join(tmp_dir, "stress.db"), args.stress,
+                                args.stress_operations)
+            if stress["integrity"] != "ok" or stress["rows"] != stress["expected_rows"] \
+                    or stress["summarized_rows"] != stress["rows"]:
+                print(f"Нарушена целостность после нагрузки: {stress}", file=sys.stderr)
+                return 1
+            results[f"db.stress_writers.{args.stress}x{args.stress_operations}"] = stress["elapsed"]
+    
+    report = json.dumps(results, indent=2, sort_keys=True)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    
+    over_budget = check_startup_budget(results, args.startup_budget)
+    for name, seconds in over_budget:
+        print(f"Превышен бюджет запуска {name}: {seconds:.3f} с (бюджет {args.startup_budget} с)",
+              file=sys.stderr)
+    for name in eager_imports:
+        print(f"Модуль {name} загружается при импорте widgets, а не по требованию",
+              file=sys.stderr)
+    failed = bool(over_budget or eager_imports)
+    
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 1 if failed else 0
+    
+    if not os.path.exists(args.baseline):
+        return 1 if failed else 0
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for name, expected, seconds in regressions:
+        print(f"Регрессия {name}: {seconds:.4f} с (база {expected:.4f} с)", file=sys.stderr)
+    return 1 if regressions or failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
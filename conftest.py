@@ -0,0 +1,16 @@
+import os
+import tempfile
+import pytest
+
+@pytest.fixture(scope="session")
+def app():
+    # Один QApplication на весь прогон: удалённый вместе с модулем тестов ронял бы следующие
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture(autouse=True)
+def isolated_tempdir(tmp_path, monkeypatch):
+    # Рядом с базой из mkstemp остаются -wal, -shm, архив и каталоги изображений и снимков;
+    # отдельный каталог на тест pytest удаляет сам, вместе со всеми соседними файлами
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
@@ -1,81 +1,923 @@
+import os
 import sqlite3
 import logging
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from models import Artwork, ValidationError
+from itertools import islice
+from models import Artwork, ArtworkFrame, ValidationError, validate_columns, content_key, \
+    content_hash
+from migrations import migrate, create_archive_schema
+from instrumentation import METRICS, InstrumentedConnection, instrumented
+from query_cache import QueryCache, cached, DEFAULT_MAX_ENTRIES
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+    "busy_timeout": 5000,
+}
+
+DEFAULT_CHUNK_SIZE = 1000
+
+MAX_CHANGE_LOG = 100000
+# Журнал обрезается с запасом, чтобы не брать блокировку записи при каждом запуске
+CHANGE_LOG_SLACK = 10000
+ARTWORK_COLUMNS = ("id", "title", "artist", "year", "style", "price", "created_at")
+# Служебные столбцы переезжают в архив вместе со строкой
+ARCHIVE_COLUMNS = ARTWORK_COLUMNS + ("image_hash", "content_key")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+SEARCH_LIMIT = 500
+
+# Повторы захвата блокировки записи поверх busy_timeout: 0.05, 0.1, 0.2 … с, со случайным
+# разбросом, чтобы несколько процессов не просыпались одновременно
+WRITE_RETRIES = 6
+WRITE_BACKOFF = 0.05
+
+# Что делать со вставкой работы, которая уже есть в коллекции (то же название, художник и год)
+DUPLICATE_POLICIES = ("reject", "skip", "upsert")
+DEFAULT_DUPLICATE_POLICY = "reject"
 
 class DatabaseError(Exception):
     pass
 
+class DuplicateError(DatabaseError):
+    def __init__(self, message, artwork_id):
+        super().__init__(message)
+        self.artwork_id = artwork_id
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _select_artworks(conn, where="", params=(), order="id DESC", limit=None,
+                     include_archive=False):
+    # Без архива — запрос только к горячей таблице. С архивом каждая ветка UNION ALL сортируется
+    # и обрезается по своим индексам, поэтому страница не требует сортировки всей истории
+    columns = ", ".join(ARTWORK_COLUMNS)
+    params = list(params)
+    limit_sql = ""
+    outer_params = []
+    if limit is not None:
+        limit_sql = " LIMIT ?"
+        params.append(limit)
+        outer_params.append(limit)
+    query = f"SELECT {columns} FROM artworks {where} ORDER BY {order}{limit_sql}"
+    if not include_archive:
+        return conn.execute(query, params)
+    return conn.execute(f'''
+        SELECT * FROM ({query})
+        UNION ALL
+        SELECT * FROM ({query.replace(" FROM artworks ", " FROM archive.artworks ", 1)})
+        ORDER BY {order}{limit_sql}
+    ''', params + params + outer_params)
+
+def _is_busy(error):
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+def _begin_immediate(conn, retries=WRITE_RETRIES, backoff=WRITE_BACKOFF):
+    # BEGIN IMMEDIATE берёт блокировку записи сразу: транзакция не упрётся в чужого писателя
+    # посередине и не получит SQLITE_BUSY при повышении уровня блокировки
+    for attempt in range(retries + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logging.warning("Database is busy, retrying in %.2f s (attempt %d of %d)",
+                            delay, attempt + 1, retries)
+            METRICS.record_busy_retry()
+            time.sleep(delay)
+
+def archive_path(db_name):
+    if db_name == ":memory:":
+        return db_name
+    return os.path.splitext(os.path.abspath(db_name))[0] + ".archive.db"
+
+class ConnectionPool:
+    def __init__(self, db_name, pragmas=None, max_size=4, timeout=10.0, archive_name=None):
+        self.db_name = db_name
+        self.archive_name = archive_name
+        self.archive_enabled = False
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        # Каждое соединение с ":memory:" открывает отдельную пустую базу
+        self.max_size = 1 if db_name == ":memory:" else max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=self.timeout,
+                               check_same_thread=False, isolation_level=None,
+                               factory=InstrumentedConnection)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+    
+    def enable_archive(self, create=False):
+        # Файл архива появляется только при первом переносе: до этого соединения работают
+        # без ATTACH, а запросы с архивом читают одну горячую таблицу
+        if not self.archive_enabled and self.archive_name is not None:
+            self.archive_enabled = create or os.path.exists(self.archive_name)
+        return self.archive_enabled
+    
+    def _attach_archive(self, conn):
+        # ATTACH внутри транзакции запрещён — такое соединение подключит архив при следующей выдаче
+        if (not self.archive_enabled or conn.in_transaction
+                or getattr(conn, "archive_attached", False)):
+            return
+        conn.execute("ATTACH DATABASE ? AS archive", (self.archive_name,))
+        # Режим журнала и синхронизация задаются для каждой подключённой базы отдельно
+        for name in ("journal_mode", "synchronous"):
+            if name in self.pragmas:
+                conn.execute(f"PRAGMA archive.{name} = {self.pragmas[name]}")
+        create_archive_schema(conn)
+        conn.archive_attached = True
+    
+    def checkout(self):
+        if self._closed:
+            raise DatabaseError("Пул соединений закрыт")
+        try:
+            conn = self._idle.get_nowait()
+            METRICS.record_wait(0)
+            return conn
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+        
+        if can_create:
+            try:
+                return self._connect()
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._created -= 1
+                raise DatabaseError(f"Ошибка подключения к базе данных: {e}")
+        
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise DatabaseError("Нет свободных соединений с базой данных")
+        finally:
+            METRICS.record_wait(time.perf_counter() - started)
+        return conn
+    
+    def checkin(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+        else:
+            self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is not None:
+            self._attach_archive(conn)
+            local.depth += 1
+            try:
+                yield conn
+            finally:
+                local.depth -= 1
+            return
+        
+        conn = self.checkout()
+        local.conn = conn
+        local.depth = 1
+        try:
+            self._attach_archive(conn)
+            yield conn
+        finally:
+            local.conn = None
+            self.checkin(conn)
+    
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
 class DatabaseManager:
-    def __init__(self, db_name="art_gallery.db"):
+    def __init__(self, db_name="art_gallery.db", pragmas=None, pool_size=4,
+                 cache_size=DEFAULT_MAX_ENTRIES, duplicates=DEFAULT_DUPLICATE_POLICY,
+                 archive_name=None):
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(f"Неизвестная политика для дубликатов: {duplicates}")
         self.db_name = db_name
+        self.duplicates = duplicates
+        # Архив лежит рядом с базой: art_gallery.db -> art_gallery.archive.db
+        self.archive_name = archive_name or archive_path(db_name)
+        self.pool = ConnectionPool(db_name, pragmas, pool_size, archive_name=self.archive_name)
+        self.cache = QueryCache(db_name, cache_size)
         self.setup_database()
-        self.setup_logging()
     
-    def setup_logging(self):
-        logging.basicConfig(
-            filename='gallery_activity.log',
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+    @contextmanager
+    def transaction(self):
+        with self.pool.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            _begin_immediate(conn)
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                # В кэш могли попасть строки, прочитанные внутри откаченной транзакции
+                self.cache.invalidate()
+                raise
+            conn.commit()
+    
+    @contextmanager
+    def read_transaction(self):
+        # Отложенный BEGIN: согласованный снимок для нескольких чтений без блокировки записи,
+        # в режиме WAL писатели его не ждут
+        with self.pool.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+    
+    def close(self):
+        self.cache.close()
+        self.pool.close()
     
     def setup_database(self):
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS artworks (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        title TEXT NOT NULL,
-                        artist TEXT NOT NULL,
-                        year INTEGER NOT NULL,
-                        style TEXT NOT NULL,
-                        price REAL NOT NULL,
-                        created_at TEXT NOT NULL
-                    )
-                ''')
-                conn.commit()
+            # При актуальной схеме запуск обходится тремя чтениями без блокировки записи
+            with self.pool.connection() as conn:
+                migrate(conn)
+                first_seq, last_seq = conn.execute(
+                    "SELECT MIN(seq), MAX(seq) FROM artwork_changes").fetchone()
+                self.fts_available = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'artworks_fts'").fetchone() is not None
+            if last_seq is not None and last_seq - first_seq >= MAX_CHANGE_LOG + CHANGE_LOG_SLACK:
+                with self.transaction() as conn:
+                    conn.execute('''
+                        DELETE FROM artwork_changes WHERE seq <= ?
+                    ''', (last_seq - MAX_CHANGE_LOG,))
         except sqlite3.Error as e:
             raise DatabaseError(f"Ошибка создания базы данных: {e}")
     
-    def add_artwork(self, artwork: Artwork):
+    def _find_duplicates(self, conn, hashes):
+        # hashes: ключ -> хеш. Кандидаты ищутся по индексу хеша, совпадение подтверждается
+        # самими ключами
+        found = {}
+        for chunk in _chunked(set(hashes.values()), 500):
+            for artwork_id, title, artist, year in conn.execute(f'''
+                SELECT id, title, artist, year FROM artworks
+                WHERE content_key IN ({",".join("?" * len(chunk))}) ORDER BY id
+            ''', chunk):
+                key = content_key(title, artist, year)
+                if key in hashes and key not in found:
+                    found[key] = artwork_id
+        return found
+    
+    def _update_duplicates(self, conn, updates):
+        conn.executemany('''
+            UPDATE artworks SET title = ?, artist = ?, year = ?, style = ?, price = ?
+            WHERE id = ?
+        ''', [(a.title, a.artist, a.year, a.style, a.price, artwork_id)
+              for a, artwork_id in updates])
+    
+    def _duplicate_error(self, artwork, artwork_id, prefix=""):
+        where = "в загружаемых данных" if artwork_id is None else f"в коллекции (ID {artwork_id})"
+        return DuplicateError(f"{prefix}Произведение «{artwork.title}» ({artwork.artist}, "
+                              f"{artwork.year}) уже есть {where}", artwork_id)
+    
+    def find_duplicates(self, artworks):
+        # Для каждой работы — DuplicateError, если она повторяет работу из коллекции или стоящую
+        # раньше в том же списке, иначе None. Внутри transaction() видит её же соединение
+        keys = [content_key(a.title, a.artist, a.year) for a in artworks]
+        try:
+            with self.pool.connection() as conn:
+                existing = self._find_duplicates(conn, {key: content_hash(key) for key in keys})
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка поиска дубликатов: {e}")
+        errors = []
+        seen = set()
+        for artwork, key in zip(artworks, keys):
+            if key in existing or key in seen:
+                errors.append(self._duplicate_error(artwork, existing.get(key)))
+            else:
+                errors.append(None)
+            seen.add(key)
+        return errors
+    
+    @instrumented("add_artwork", rows_written=lambda artwork_id: 1)
+    def add_artwork(self, artwork: Artwork, duplicates=None):
         artwork.validate()
+        policy = duplicates or self.duplicates
+        key = content_key(artwork.title, artwork.artist, artwork.year)
+        key_hash = content_hash(key)
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                current_time = datetime.now().strftime("%d.%m.%Y %H:%M")
-                cursor.execute('''
-                    INSERT INTO artworks (title, artist, year, style, price, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (artwork.title, artwork.artist, artwork.year, artwork.style, 
-                      artwork.price, current_time))
-                conn.commit()
-                
-                logging.info(f"Added artwork: {artwork.title} by {artwork.artist}")
-                return cursor.lastrowid
+            with self.transaction() as conn:
+                artwork_id = self._find_duplicates(conn, {key: key_hash}).get(key)
+                if artwork_id is None:
+                    current_time = datetime.now().strftime(TIMESTAMP_FORMAT)
+                    cursor = conn.execute('''
+                        INSERT INTO artworks (title, artist, year, style, price, created_at,
+                                              content_key)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (artwork.title, artwork.artist, artwork.year, artwork.style, 
+                          artwork.price, current_time, key_hash))
+                    artwork_id = cursor.lastrowid
+                    action = "add"
+                elif policy == "reject":
+                    raise self._duplicate_error(artwork, artwork_id)
+                elif policy == "upsert":
+                    self._update_duplicates(conn, [(artwork, artwork_id)])
+                    action = "upsert"
+                else:
+                    action = "skip_duplicate"
+            self.cache.invalidate()
+            
+            if action == "add":
+                logging.info("Added artwork: %s by %s", artwork.title, artwork.artist,
+                             extra={"audit": {"action": "add", "id": artwork_id,
+                                              "title": artwork.title, "artist": artwork.artist}})
+            else:
+                logging.info("Artwork %s by %s already exists with ID %s (%s)", artwork.title,
+                             artwork.artist, artwork_id, policy,
+                             extra={"audit": {"action": action, "id": artwork_id,
+                                              "title": artwork.title, "artist": artwork.artist}})
+            return artwork_id
         except sqlite3.Error as e:
             raise DatabaseError(f"Ошибка добавления произведения: {e}")
     
-    def get_all_artworks(self):
+    @instrumented("add_artworks", rows_written=len)
+    def add_artworks(self, artworks, chunk_size=DEFAULT_CHUNK_SIZE, skip_failed_chunks=False,
+                     duplicates=None):
+        # Возвращает id строк, в которых оказались работы: новых, а при upsert и обновлённых;
+        # пропущенные дубликаты в список не попадают
+        policy = duplicates or self.duplicates
+        ids = []
+        chunks = 0
+        skipped = 0
+        duplicate_count = 0
+        now = datetime.now()
+        current_time = now.strftime(TIMESTAMP_FORMAT)
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, title, artist, year, style, price, created_at 
-                    FROM artworks ORDER BY id DESC
-                ''')
-                rows = cursor.fetchall()
+            with self.transaction() as conn:
+                for chunk in _chunked(artworks, chunk_size):
+                    first_row = chunks * chunk_size
+                    chunks += 1
+                    conn.execute("SAVEPOINT artworks_chunk")
+                    try:
+                        checked = validate_columns([a.title for a in chunk],
+                                                   [a.artist for a in chunk],
+                                                   [a.year for a in chunk],
+                                                   [a.price for a in chunk],
+                                                   current_year=now.year)
+                        for offset, message in checked.errors():
+                            raise ValidationError(f"Строка {first_row + offset + 1}: {message}")
+                        
+                        keys = [content_key(a.title, a.artist, a.year) for a in chunk]
+                        hashes = {key: content_hash(key) for key in keys}
+                        existing = self._find_duplicates(conn, hashes)
+                        inserts = []
+                        positions = {}
+                        updates = []
+                        # (True, позиция среди вставляемых) или (False, id существующей строки)
+                        stored = []
+                        chunk_duplicates = 0
+                        for offset, (artwork, key) in enumerate(zip(chunk, keys)):
+                            duplicate_id = existing.get(key)
+                            if duplicate_id is None and key not in positions:
+                                positions[key] = len(inserts)
+                                inserts.append((artwork, key))
+                                stored.append((True, positions[key]))
+                                continue
+                            if policy == "reject":
+                                raise self._duplicate_error(artwork, duplicate_id,
+                                                            f"Строка {first_row + offset + 1}: ")
+                            chunk_duplicates += 1
+                            if policy == "skip":
+                                continue
+                            if duplicate_id is None:
+                                # Повтор внутри пачки: вставится последняя версия
+                                inserts[positions[key]] = (artwork, key)
+                                stored.append((True, positions[key]))
+                            else:
+                                updates.append((artwork, duplicate_id))
+                                stored.append((False, duplicate_id))
+                        
+                        conn.executemany('''
+                            INSERT INTO artworks (title, artist, year, style, price, created_at,
+                                                  content_key)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ''', [(a.title, a.artist, a.year, a.style, a.price, current_time,
+                               hashes[key]) for a, key in inserts])
+                        self._update_duplicates(conn, updates)
+                        # Вставка идёт внутри одной транзакции с блокировкой записи,
+                        # поэтому AUTOINCREMENT выдаёт чанку непрерывный диапазон id
+                        first_id = 0
+                        if inserts:
+                            first_id = conn.execute(
+                                "SELECT last_insert_rowid()").fetchone()[0] - len(inserts) + 1
+                    except (ValidationError, DuplicateError, sqlite3.Error) as e:
+                        conn.execute("ROLLBACK TO artworks_chunk")
+                        conn.execute("RELEASE artworks_chunk")
+                        if not skip_failed_chunks:
+                            raise
+                        skipped += len(chunk)
+                        logging.warning("Skipped artworks chunk %d: %s", chunks, e)
+                        continue
+                    conn.execute("RELEASE artworks_chunk")
+                    duplicate_count += chunk_duplicates
+                    ids.extend(first_id + value if new else value for new, value in stored)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка пакетного добавления (часть {chunks}): {e}")
+        self.cache.invalidate()
+        
+        logging.info("Added %d artworks in %d chunks, skipped %d, duplicates %d (%s)", len(ids),
+                     chunks, skipped, duplicate_count, policy,
+                     extra={"audit": {"action": "bulk_add", "count": len(ids),
+                                      "skipped": skipped, "duplicates": duplicate_count}})
+        return ids
+    
+    @instrumented("get_all_artworks", rows_read=len)
+    @cached
+    def get_all_artworks(self, include_archive=False):
+        include_archive = include_archive and self.pool.enable_archive()
+        try:
+            with self.pool.connection() as conn:
+                rows = _select_artworks(conn, include_archive=include_archive).fetchall()
                 return [Artwork(*row) for row in rows]
         except sqlite3.Error as e:
             raise DatabaseError(f"Ошибка получения данных: {e}")
     
+    @instrumented("get_artwork", rows_read=lambda artwork: artwork is not None)
+    def get_artwork(self, artwork_id, include_archive=False):
+        include_archive = include_archive and self.pool.enable_archive()
+        try:
+            with self.pool.connection() as conn:
+                row = _select_artworks(conn, "WHERE id = ?", (artwork_id,),
+                                       include_archive=include_archive).fetchone()
+                return None if row is None else Artwork(*row)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения данных: {e}")
+    
+    def iter_artworks(self, batch_size=DEFAULT_CHUNK_SIZE, include_archive=False):
+        include_archive = include_archive and self.pool.enable_archive()
+        try:
+            with self.pool.connection() as conn:
+                cursor = _select_artworks(conn, order="id", include_archive=include_archive)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield from rows
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения данных: {e}")
+    
+    @instrumented("get_artworks_frame", rows_read=len)
+    def get_artworks_frame(self, batch_size=DEFAULT_CHUNK_SIZE, include_archive=False):
+        # Вся коллекция в колоннах: без объекта Artwork и кортежа на каждую строку
+        return ArtworkFrame(self.iter_artworks(batch_size, include_archive))
+    
+    @instrumented("get_artworks_page", rows_read=len)
+    @cached
+    def get_artworks_page(self, after_id=None, limit=500, include_archive=False):
+        include_archive = include_archive and self.pool.enable_archive()
+        try:
+            with self.pool.connection() as conn:
+                if after_id is None:
+                    cursor = _select_artworks(conn, limit=limit, include_archive=include_archive)
+                else:
+                    cursor = _select_artworks(conn, "WHERE id < ?", (after_id,), limit=limit,
+                                              include_archive=include_archive)
+                return cursor.fetchall()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения данных: {e}")
+    
+    @instrumented("query_artworks", rows_read=len)
+    @cached
+    def query_artworks(self, artist=None, style=None, year_from=None, year_to=None,
+                       price_from=None, price_to=None, created_from=None, created_to=None,
+                       order_by="id", descending=True, after=None, limit=500,
+                       include_archive=False):
+        include_archive = include_archive and self.pool.enable_archive()
+        if order_by not in ARTWORK_COLUMNS:
+            raise DatabaseError(f"Неизвестный столбец сортировки: {order_by}")
+        
+        conditions = []
+        params = []
+        # Точное совпадение: индекс по одному столбцу хранит строки в порядке id,
+        # поэтому ORDER BY id идёт по нему без временной сортировки; неполное имя — это поиск
+        for column, value in (("artist", artist), ("style", style)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        for column, operator, value in (("year", ">=", year_from), ("year", "<=", year_to),
+                                        ("price", ">=", price_from), ("price", "<=", price_to),
+                                        ("created_at", ">=", created_from),
+                                        ("created_at", "<=", created_to)):
+            if isinstance(value, datetime):
+                value = value.strftime(TIMESTAMP_FORMAT)
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        
+        direction = "DESC" if descending else "ASC"
+        if after is not None:
+            conditions.append(f"({order_by}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "id " + direction if order_by == "id" else f"{order_by} {direction}, id {direction}"
+        try:
+            with self.pool.connection() as conn:
+                return _select_artworks(conn, where, params, order, limit,
+                                        include_archive).fetchall()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения данных: {e}")
+    
+    @instrumented("search", rows_read=len)
+    @cached
+    def search(self, text, limit=SEARCH_LIMIT, include_archive=False):
+        terms = re.findall(r"\w+", text.replace("ё", "е").replace("Ё", "Е"))
+        if not terms:
+            return []
+        include_archive = include_archive and self.pool.enable_archive()
+        conditions = " AND ".join("(title LIKE ? OR artist LIKE ? OR style LIKE ?)" for _ in terms)
+        params = [f"%{term}%" for term in terms for _ in range(3)]
+        try:
+            with self.pool.connection() as conn:
+                if self.fts_available:
+                    match = " ".join(f'"{term}"*' for term in terms)
+                    cursor = conn.execute('''
+                        SELECT a.id, a.title, a.artist, a.year, a.style, a.price, a.created_at,
+                               snippet(artworks_fts, -1, '[', ']', '…', 10)
+                        FROM artworks_fts JOIN artworks a ON a.id = artworks_fts.rowid
+                        WHERE artworks_fts MATCH ?
+                        ORDER BY bm25(artworks_fts) LIMIT ?
+                    ''', (match, limit))
+                else:
+                    cursor = conn.execute(f'''
+                        SELECT id, title, artist, year, style, price, created_at, title
+                        FROM artworks WHERE {conditions} ORDER BY id DESC LIMIT ?
+                    ''', params + [limit])
+                rows = cursor.fetchall()
+                if include_archive and len(rows) < limit:
+                    # У архива нет полнотекстового индекса: его строки ищутся перебором
+                    # и идут после найденных в горячей таблице
+                    rows.extend(conn.execute(f'''
+                        SELECT id, title, artist, year, style, price, created_at, title
+                        FROM archive.artworks WHERE {conditions} ORDER BY id DESC LIMIT ?
+                    ''', params + [limit - len(rows)]))
+                return rows
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка поиска: {e}")
+    
+    def get_import_checkpoint(self, source):
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute('''
+                    SELECT line, imported, rejected FROM import_checkpoints WHERE source = ?
+                ''', (source,)).fetchone()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения данных: {e}")
+    
+    def save_import_checkpoint(self, source, line, imported, rejected):
+        try:
+            with self.transaction() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO import_checkpoints (source, line, imported, rejected)
+                    VALUES (?, ?, ?, ?)
+                ''', (source, line, imported, rejected))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка сохранения контрольной точки: {e}")
+    
+    def clear_import_checkpoint(self, source):
+        try:
+            with self.transaction() as conn:
+                conn.execute('DELETE FROM import_checkpoints WHERE source = ?', (source,))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка сохранения контрольной точки: {e}")
+    
+    @instrumented("set_artwork_image", rows_written=lambda updated: updated)
+    def set_artwork_image(self, artwork_id, image_hash):
+        try:
+            with self.transaction() as conn:
+                cursor = conn.execute('UPDATE artworks SET image_hash = ? WHERE id = ?',
+                                      (image_hash, artwork_id))
+            self.cache.invalidate()
+            logging.info("Set image %s for artwork %s", image_hash, artwork_id,
+                         extra={"audit": {"action": "set_image", "id": artwork_id,
+                                          "image": image_hash}})
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка сохранения изображения: {e}")
+    
+    @instrumented("get_image_hashes", rows_read=len)
+    def get_image_hashes(self, artwork_ids):
+        # Только работы с изображением: отсутствие id в ответе означает «без изображения»
+        hashes = {}
+        try:
+            with self.pool.connection() as conn:
+                for chunk in _chunked(artwork_ids, 500):
+                    hashes.update(conn.execute(f'''
+                        SELECT id, image_hash FROM artworks
+                        WHERE id IN ({",".join("?" * len(chunk))}) AND image_hash IS NOT NULL
+                    ''', chunk).fetchall())
+            return hashes
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения данных: {e}")
+    
+    def get_change_seq(self):
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute(
+                    'SELECT COALESCE(MAX(seq), 0) FROM artwork_changes').fetchone()[0]
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения данных: {e}")
+    
+    def get_data_version(self):
+        # Меняется после каждого коммита в базу, в том числе из других процессов
+        return self.cache.data_version()
+    
+    @instrumented("get_changes_since",
+                  rows_read=lambda changes: len(changes[1]) if changes else 0)
+    def get_changes_since(self, seq, limit=None, include_archive=False):
+        include_archive = include_archive and self.pool.enable_archive()
+        try:
+            with self.read_transaction() as conn:
+                first_seq, last_seq = conn.execute(
+                    'SELECT MIN(seq), MAX(seq) FROM artwork_changes').fetchone()
+                # Журнал «отмотан назад» — база восстановлена из резервной копии
+                if (last_seq or 0) < seq:
+                    return None
+                if last_seq is None or last_seq == seq:
+                    return seq, [], []
+                # Журнал уже обрезан — наверстать изменения инкрементально нельзя
+                if seq < first_seq - 1:
+                    return None
+                
+                changed_ids = [row[0] for row in conn.execute('''
+                    SELECT DISTINCT artwork_id FROM artwork_changes
+                    WHERE seq > ? AND seq <= ?
+                ''', (seq, last_seq))]
+                if limit is not None and len(changed_ids) > limit:
+                    return None
+                
+                rows = []
+                # Перенос в архив удаляет строку из горячей таблицы; в режиме с архивом
+                # она не пропадает из окна, а находится во второй таблице
+                tables = ("artworks", "archive.artworks") if include_archive else ("artworks",)
+                for table in tables:
+                    for chunk in _chunked(changed_ids, 500):
+                        rows.extend(conn.execute(f'''
+                            SELECT id, title, artist, year, style, price, created_at
+                            FROM {table} WHERE id IN ({",".join("?" * len(chunk))})
+                        ''', chunk).fetchall())
+                rows.sort(key=lambda row: row[0], reverse=True)
+                existing = {row[0] for row in rows}
+                deleted_ids = [artwork_id for artwork_id in changed_ids
+                               if artwork_id not in existing]
+                return last_seq, rows, deleted_ids
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка получения изменений: {e}")
+    
+    def _delete_archived(self, conn, artwork_ids):
+        # У архива нет триггеров журнала, поэтому удаление из него записывается здесь,
+        # иначе окна в режиме с архивом не узнали бы о нём
+        if not getattr(conn, "archive_attached", False):
+            return 0
+        archived_ids = [row[0] for row in conn.execute(f'''
+            SELECT id FROM archive.artworks WHERE id IN ({",".join("?" * len(artwork_ids))})
+        ''', artwork_ids)]
+        if archived_ids:
+            conn.executemany('DELETE FROM archive.artworks WHERE id = ?',
+                             [(artwork_id,) for artwork_id in archived_ids])
+            conn.executemany('''
+                INSERT INTO artwork_changes (artwork_id, operation) VALUES (?, 'delete')
+            ''', [(artwork_id,) for artwork_id in archived_ids])
+        return len(archived_ids)
+    
+    @instrumented("delete_artwork", rows_written=lambda deleted: deleted)
     def delete_artwork(self, artwork_id: int):
+        self.pool.enable_archive()
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM artworks WHERE id = ?', (artwork_id,))
-                conn.commit()
-                logging.info(f"Deleted artwork with ID: {artwork_id}")
+            with self.transaction() as conn:
+                cursor = conn.execute('DELETE FROM artworks WHERE id = ?', (artwork_id,))
+                deleted = cursor.rowcount + self._delete_archived(conn, [artwork_id])
+            self.cache.invalidate()
+            logging.info("Deleted artwork with ID: %s", artwork_id,
+                         extra={"audit": {"action": "delete", "id": artwork_id}})
+            return deleted
         except sqlite3.Error as e:
             raise DatabaseError(f"Ошибка удаления произведения: {e}")
-   
\ No newline at end of file
+    
+    @instrumented("delete_artworks", rows_written=lambda deleted: deleted)
+    def delete_artworks(self, artwork_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.pool.enable_archive()
+        deleted = 0
+        chunks = 0
+        try:
+            with self.transaction() as conn:
+                for chunk in _chunked(artwork_ids, chunk_size):
+                    chunks += 1
+                    cursor = conn.executemany('DELETE FROM artworks WHERE id = ?',
+                                              [(artwork_id,) for artwork_id in chunk])
+                    deleted += cursor.rowcount + self._delete_archived(conn, chunk)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка пакетного удаления (часть {chunks}): {e}")
+        self.cache.invalidate()
+        
+        logging.info("Deleted %d artworks in %d chunks", deleted, chunks,
+                     extra={"audit": {"action": "bulk_delete", "count": deleted}})
+        return deleted
+    
+    @instrumented("merge_duplicates", rows_written=lambda merged: merged[1])
+    def merge_duplicates(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Один проход по индексу content_key: GROUP BY читает только индекс, затем по нему же
+        # достаются строки повторяющихся ключей. Из группы остаётся самая старая запись
+        # с данными самой новой, остальные удаляются
+        try:
+            with self.transaction() as conn:
+                rows = conn.execute('''
+                    SELECT id, title, artist, year, style, price, image_hash FROM artworks
+                    WHERE content_key IN (
+                        SELECT content_key FROM artworks
+                        GROUP BY content_key HAVING COUNT(*) > 1
+                    )
+                    ORDER BY id
+                ''').fetchall()
+                groups = {}
+                for row in rows:
+                    groups.setdefault(content_key(row[1], row[2], row[3]), []).append(row)
+                
+                updates = []
+                deleted_ids = []
+                for group in groups.values():
+                    # Одна строка на ключ — совпал только хеш, это не дубликат
+                    if len(group) < 2:
+                        continue
+                    survivor, newest = group[0], group[-1]
+                    image_hash = next((row[6] for row in reversed(group) if row[6] is not None),
+                                      None)
+                    updates.append(newest[1:6] + (image_hash, survivor[0]))
+                    deleted_ids.extend(row[0] for row in group[1:])
+                
+                conn.executemany('''
+                    UPDATE artworks
+                    SET title = ?, artist = ?, year = ?, style = ?, price = ?, image_hash = ?
+                    WHERE id = ?
+                ''', updates)
+                for chunk in _chunked(deleted_ids, chunk_size):
+                    conn.executemany('DELETE FROM artworks WHERE id = ?',
+                                     [(artwork_id,) for artwork_id in chunk])
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка объединения дубликатов: {e}")
+        self.cache.invalidate()
+        
+        logging.info("Merged %d groups of duplicate artworks, deleted %d rows", len(updates),
+                     len(deleted_ids),
+                     extra={"audit": {"action": "merge_duplicates", "groups": len(updates),
+                                      "count": len(deleted_ids)}})
+        return len(updates), len(deleted_ids)
+    
+    @instrumented("mark_archived", rows_written=lambda marked: marked)
+    def mark_archived(self, artwork_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Только отметка: строки переедут в архив при следующем archive_artworks
+        marked = 0
+        try:
+            with self.transaction() as conn:
+                for chunk in _chunked(artwork_ids, chunk_size):
+                    cursor = conn.executemany('UPDATE artworks SET archived = 1 WHERE id = ?',
+                                              [(artwork_id,) for artwork_id in chunk])
+                    marked += cursor.rowcount
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка отметки для архива: {e}")
+        return marked
+    
+    @instrumented("archive_artworks", rows_written=lambda moved: moved)
+    def archive_artworks(self, before=None, batch_size=DEFAULT_CHUNK_SIZE):
+        # Переносит в архив отмеченные работы и, если задан before, добавленные раньше него.
+        # Каждая пачка — отдельная транзакция, так что писатели ждут не дольше одной пачки.
+        # В режиме WAL основная база и архив коммитятся по отдельности: если процесс упадёт
+        # между коммитами, строка останется и в основной таблице, и повторный перенос
+        # перезапишет её копию в архиве
+        if isinstance(before, str):
+            # Строка сравнивается с created_at как текст: опечатка в дате перенесла бы
+            # в архив всю коллекцию
+            try:
+                before = datetime.fromisoformat(before)
+            except ValueError:
+                raise DatabaseError(f"Некорректная дата: {before}")
+        if isinstance(before, datetime):
+            before = before.strftime(TIMESTAMP_FORMAT)
+        self.pool.enable_archive(create=True)
+        archived_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        query = "SELECT id FROM artworks WHERE archived = 1"
+        params = []
+        if before is not None:
+            query += " UNION SELECT id FROM artworks WHERE created_at < ?"
+            params.append(before)
+        moved = 0
+        batches = 0
+        try:
+            while True:
+                with self.transaction() as conn:
+                    ids = [row[0] for row in conn.execute(f"{query} LIMIT ?",
+                                                          params + [batch_size])]
+                    if ids:
+                        placeholders = ",".join("?" * len(ids))
+                        conn.execute(f'''
+                            INSERT OR REPLACE INTO archive.artworks ({columns}, archived_at)
+                            SELECT {columns}, ? FROM artworks WHERE id IN ({placeholders})
+                        ''', [archived_at] + ids)
+                        conn.execute(f'DELETE FROM artworks WHERE id IN ({placeholders})', ids)
+                moved += len(ids)
+                batches += 1
+                if len(ids) < batch_size:
+                    break
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка переноса в архив (пачка {batches + 1}): {e}")
+        self.cache.invalidate()
+        
+        logging.info("Archived %d artworks in %d batches", moved, batches,
+                     extra={"audit": {"action": "archive", "count": moved, "before": before}})
+        return moved
+    
+    @instrumented("restore_artworks", rows_written=lambda restored: restored)
+    def restore_artworks(self, artwork_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Возврат из архива идёт через триггеры основной таблицы: поиск, сводки и журнал
+        # изменений снова учитывают работу. Строка, чей id уже занят в основной таблице,
+        # остаётся в архиве и попадает в отчёт, а не теряется
+        if not self.pool.enable_archive():
+            return 0
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        restored = 0
+        skipped = []
+        chunks = 0
+        try:
+            for chunk in _chunked(artwork_ids, chunk_size):
+                chunks += 1
+                placeholders = ",".join("?" * len(chunk))
+                with self.transaction() as conn:
+                    ids = [row[0] for row in conn.execute(f'''
+                        SELECT id FROM archive.artworks WHERE id IN ({placeholders})
+                        AND id NOT IN (SELECT id FROM artworks WHERE id IN ({placeholders}))
+                    ''', chunk + chunk)]
+                    skipped.extend(row[0] for row in conn.execute(f'''
+                        SELECT id FROM artworks
+                        WHERE id IN ({placeholders}) AND id IN (SELECT id FROM archive.artworks)
+                    ''', chunk))
+                    if not ids:
+                        continue
+                    placeholders = ",".join("?" * len(ids))
+                    conn.execute(f'''
+                        INSERT INTO artworks ({columns})
+                        SELECT {columns} FROM archive.artworks WHERE id IN ({placeholders})
+                    ''', ids)
+                    conn.execute(f'DELETE FROM archive.artworks WHERE id IN ({placeholders})',
+                                 ids)
+                    restored += len(ids)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Ошибка возврата из архива (часть {chunks}): {e}")
+        self.cache.invalidate()
+        
+        if skipped:
+            logging.warning("Skipped %d archived artworks whose id is already in use: %s",
+                            len(skipped), skipped)
+        logging.info("Restored %d artworks from archive", restored,
+                     extra={"audit": {"action": "unarchive", "count": restored,
+                                      "skipped": skipped}})
+        return restored
@@ -0,0 +1,17 @@
+from PySide6.QtWidgets import QDialog, QDialogButtonBox, QLabel, QVBoxLayout
+
+class DeleteConfirmationDialog(QDialog):
+    def __init__(self, artwork_title, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Подтверждение удаления")
+        self.setModal(True)
+        
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f"Вы уверены, что хотите удалить произведение:\n\"{artwork_title}\"?"))
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Yes | QDialogButtonBox.No)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        
+        layout.addWidget(button_box)
+        self.setLayout(layout)
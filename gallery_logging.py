@@ -0,0 +1,87 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler,
+                              TimedRotatingFileHandler)
+
+LOG_FILE = "gallery_activity.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+MAX_LOG_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+AUDIT_ENV = "GALLERY_AUDIT_LOG"
+
+_listener = None
+_lock = threading.Lock()
+
+class _DeferredQueueHandler(QueueHandler):
+    # Стандартный QueueHandler форматирует сообщение в потоке вызывающего; здесь запись
+    # уходит в очередь как есть, и %-подстановка выполняется уже в потоке слушателя
+    def prepare(self, record):
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "audit", {}))
+        return json.dumps(entry, ensure_ascii=False)
+
+class _AuditFilter(logging.Filter):
+    def filter(self, record):
+        return hasattr(record, "audit")
+
+def _file_handler(path, rotation, max_bytes, backup_count):
+    if rotation == "time":
+        return TimedRotatingFileHandler(path, when="midnight", backupCount=backup_count,
+                                        encoding="utf-8", delay=True)
+    return RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                               encoding="utf-8", delay=True)
+
+def setup_logging(log_file=LOG_FILE, level=logging.INFO, rotation="size",
+                  max_bytes=MAX_LOG_BYTES, backup_count=BACKUP_COUNT, audit_file=None):
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        
+        activity_handler = _file_handler(log_file, rotation, max_bytes, backup_count)
+        activity_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers = [activity_handler]
+        
+        audit_file = audit_file or os.environ.get(AUDIT_ENV)
+        if audit_file:
+            audit_handler = _file_handler(audit_file, rotation, max_bytes, backup_count)
+            audit_handler.setFormatter(JsonFormatter())
+            audit_handler.addFilter(_AuditFilter())
+            handlers.append(audit_handler)
+        
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.addHandler(_DeferredQueueHandler(log_queue))
+        root.setLevel(level)
+        
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+def shutdown_logging():
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, _DeferredQueueHandler):
+                root.removeHandler(handler)
+        _listener = None
@@ -0,0 +1,99 @@
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+
+THUMBNAIL_SIZE = 48
+# Добавляемые файлы меньше этого читаются обычным read(), крупные — через mmap
+MMAP_THRESHOLD = 1024 * 1024
+
+class ImageError(Exception):
+    pass
+
+@contextmanager
+def _mapped(path):
+    # Содержимое файла как буфер: крупные файлы отображаются в память и не копируются
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def _write_atomically(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class ImageStore:
+    # Оригиналы лежат по SHA-256 содержимого: одинаковые файлы хранятся один раз,
+    # а в artworks.image_hash записывается только хеш
+    def __init__(self, root):
+        self.root = root
+    
+    @classmethod
+    def for_database(cls, db_name):
+        return cls(os.path.splitext(os.path.abspath(db_name))[0] + ".images")
+    
+    def _sharded(self, kind, digest, suffix=""):
+        return os.path.join(self.root, kind, digest[:2], digest + suffix)
+    
+    def original_path(self, digest):
+        return self._sharded("originals", digest)
+    
+    def thumbnail_path(self, digest, size=THUMBNAIL_SIZE):
+        return self._sharded(os.path.join("thumbnails", str(size)), digest, ".png")
+    
+    def has_thumbnail(self, digest, size=THUMBNAIL_SIZE):
+        return os.path.exists(self.thumbnail_path(digest, size))
+    
+    def add(self, path):
+        # Формат проверяем до копирования, чтобы в хранилище не попадали произвольные файлы
+        from PySide6.QtGui import QImageReader
+        if not QImageReader.imageFormat(path):
+            raise ImageError(f"Файл не является изображением: {path}")
+        try:
+            with _mapped(path) as data:
+                if not len(data):
+                    raise ImageError(f"Пустой файл: {path}")
+                digest = hashlib.sha256(data).hexdigest()
+                target = self.original_path(digest)
+                if not os.path.exists(target):
+                    _write_atomically(target, data)
+        except OSError as e:
+            raise ImageError(f"Ошибка сохранения изображения: {e}")
+        return digest
+
+def make_thumbnail(original_path, thumbnail_path, size=THUMBNAIL_SIZE):
+    # Выполняется в отдельном процессе пула. QImageReader со scaled size для JPEG
+    # декодирует сразу в уменьшенном разрешении, не разворачивая оригинал целиком.
+    # Оригинал читается потоком из файла, а не через mmap: PySide передаёт в Qt только bytes,
+    # так что отображённый файл всё равно был бы скопирован в память целиком
+    from PySide6.QtCore import Qt
+    from PySide6.QtGui import QImageReader
+    reader = QImageReader(original_path)
+    reader.setAutoTransform(True)
+    original_size = reader.size()
+    if original_size.isValid() and max(original_size.width(), original_size.height()) > size:
+        reader.setScaledSize(original_size.scaled(size, size, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise ImageError(f"Не удалось прочитать изображение: {reader.errorString()}")
+    if max(image.width(), image.height()) > size:
+        image = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    tmp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+    if not image.save(tmp_path, "PNG"):
+        raise ImageError(f"Не удалось сохранить миниатюру: {thumbnail_path}")
+    os.replace(tmp_path, thumbnail_path)
+    return thumbnail_path
+
+def attach_image(db, store, artwork_id, path):
+    digest = store.add(path)
+    if not db.set_artwork_image(artwork_id, digest):
+        raise ImageError(f"Произведение {artwork_id} не найдено")
+    return digest
@@ -0,0 +1,189 @@
+import cProfile
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+
+# Верхние границы корзин гистограммы, мс
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+SLOW_QUERY_MS = float(os.environ.get("GALLERY_SLOW_QUERY_MS", "200"))
+PROFILE_ENV = "GALLERY_PROFILE"
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def add(self, elapsed_ms):
+        self.counts[bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+    
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return min(BUCKETS_MS[bucket], self.max_ms) if bucket < len(BUCKETS_MS) \
+                    else self.max_ms
+        return self.max_ms
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+    
+    def _clear(self):
+        self._operations = {}
+        self._rows_read = {}
+        self._rows_written = {}
+        self.connection_wait = LatencyHistogram()
+        self.slow_queries = 0
+        self.busy_retries = 0
+    
+    def reset(self):
+        with self._lock:
+            self._clear()
+    
+    def record(self, operation, elapsed, rows_read=0, rows_written=0):
+        with self._lock:
+            histogram = self._operations.get(operation)
+            if histogram is None:
+                histogram = self._operations[operation] = LatencyHistogram()
+            histogram.add(elapsed * 1000)
+            self._rows_read[operation] = self._rows_read.get(operation, 0) + rows_read
+            self._rows_written[operation] = self._rows_written.get(operation, 0) + rows_written
+    
+    def record_wait(self, elapsed):
+        with self._lock:
+            self.connection_wait.add(elapsed * 1000)
+    
+    def record_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+    
+    def record_busy_retry(self):
+        with self._lock:
+            self.busy_retries += 1
+    
+    def snapshot(self):
+        with self._lock:
+            operations = {
+                name: {
+                    "count": histogram.count,
+                    "avg_ms": histogram.total_ms / histogram.count,
+                    "p50_ms": histogram.percentile(0.5),
+                    "p95_ms": histogram.percentile(0.95),
+                    "max_ms": histogram.max_ms,
+                    "rows_read": self._rows_read[name],
+                    "rows_written": self._rows_written[name],
+                }
+                for name, histogram in self._operations.items()
+            }
+            return {
+                "operations": operations,
+                "connection_wait_p95_ms": self.connection_wait.percentile(0.95),
+                "connection_wait_max_ms": self.connection_wait.max_ms,
+                "slow_queries": self.slow_queries,
+                "busy_retries": self.busy_retries,
+            }
+
+METRICS = Metrics()
+
+def instrumented(operation, rows_read=None, rows_written=None):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            METRICS.record(operation, time.perf_counter() - started,
+                           rows_read(result) if rows_read else 0,
+                           rows_written(result) if rows_written else 0)
+            return result
+        return wrapper
+    return decorator
+
+class InstrumentedConnection(sqlite3.Connection):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        cursor = super().execute(sql, parameters)
+        self._check_slow(sql, parameters, time.perf_counter() - started)
+        return cursor
+    
+    def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        cursor = super().executemany(sql, parameters)
+        self._check_slow(sql, None, time.perf_counter() - started)
+        return cursor
+    
+    def _check_slow(self, sql, parameters, elapsed):
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < SLOW_QUERY_MS:
+            return
+        METRICS.record_slow_query()
+        statement = " ".join(sql.split())
+        plan = ""
+        if parameters is not None and statement.split(" ", 1)[0].upper() in ("SELECT", "UPDATE",
+                                                                              "DELETE", "WITH"):
+            try:
+                rows = super().execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+                plan = "; ".join(row[-1] for row in rows)
+            except sqlite3.Error:
+                pass
+        logging.warning("Slow query (%.1f ms): %s | plan: %s", elapsed_ms, statement, plan)
+
+_profiler = None
+
+def start_profiling():
+    global _profiler
+    mode = os.environ.get(PROFILE_ENV, "").lower()
+    if mode == "cprofile":
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    elif mode == "tracemalloc":
+        tracemalloc.start(25)
+    return mode
+
+def stop_profiling(output_prefix="gallery_profile"):
+    global _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(f"{output_prefix}.prof")
+        logging.info("cProfile stats written to %s.prof", output_prefix)
+        _profiler = None
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        with open(f"{output_prefix}.tracemalloc.txt", "w", encoding="utf-8") as report:
+            for stat in snapshot.statistics("lineno")[:50]:
+                report.write(f"{stat}\n")
+        logging.info("tracemalloc top allocations written to %s.tracemalloc.txt", output_prefix)
+
+def format_summary(snapshot):
+    operations = snapshot["operations"]
+    count = sum(stats["count"] for stats in operations.values())
+    slowest = max(operations.items(), key=lambda item: item[1]["p95_ms"], default=None)
+    text = f"БД: {count} оп., медленных запросов: {snapshot['slow_queries']}"
+    if slowest is not None:
+        text += f", p95 {slowest[0]}: {slowest[1]['p95_ms']:g} мс"
+    return text
+
+def format_details(snapshot):
+    lines = ["Операция: вызовов, сред./p95/макс. мс, строк прочитано/записано"]
+    for name, stats in sorted(snapshot["operations"].items()):
+        lines.append(f"{name}: {stats['count']}, {stats['avg_ms']:.2f}/{stats['p95_ms']:g}/"
+                     f"{stats['max_ms']:.2f}, {stats['rows_read']}/{stats['rows_written']}")
+    lines.append(f"Ожидание соединения p95/макс.: {snapshot['connection_wait_p95_ms']:g}/"
+                 f"{snapshot['connection_wait_max_ms']:.2f} мс")
+    lines.append(f"Повторов из-за блокировки записи: {snapshot['busy_retries']}")
+    return "\n".join(lines)
@@ -1,19 +1,61 @@
+import argparse
 import sys
+from PySide6.QtCore import QEvent, QObject, QTimer
 from PySide6.QtWidgets import QApplication
-from widgets import MainWindow
+from widgets import MainWindow, BACKUP_INTERVAL_MIN
+from instrumentation import start_profiling, stop_profiling
+from gallery_logging import setup_logging
+
+class StartupProbe(QObject):
+    # Для замера запуска: печатает события первой отрисовки окна и прихода первой страницы
+    # таблицы, после чего завершает программу
+    def __init__(self, app, window):
+        super().__init__(window)
+        self.app = app
+        self.window = window
+        self.painted = False
+        window.installEventFilter(self)
+        window.table_widget.model.first_page_loaded.connect(self.on_first_page)
+    
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and not self.painted:
+            self.painted = True
+            print("painted", flush=True)
+        return False
+    
+    def on_first_page(self):
+        print("loaded", flush=True)
+        QTimer.singleShot(0, self.quit)
+    
+    def quit(self):
+        self.window.worker.wait_for_done()
+        self.app.exit(0)
 
 def main():
+    parser = argparse.ArgumentParser(description="Виртуальная галерея искусства")
+    parser.add_argument("--backup-interval", type=int, default=BACKUP_INTERVAL_MIN, metavar="MIN",
+                        help="делать снимок базы каждые MIN минут (0 — не делать)")
+    parser.add_argument("--startup-probe", action="store_true",
+                        help="сообщить о первой отрисовке окна и первой странице и выйти")
+    # Остальные аргументы достаются Qt
+    args, qt_args = parser.parse_known_args()
     try:
-        app = QApplication(sys.argv)
+        setup_logging()
+        start_profiling()
+        app = QApplication(sys.argv[:1] + qt_args)
         
-        window = MainWindow()
+        window = MainWindow(backup_interval=args.backup_interval)
+        if args.startup_probe:
+            probe = StartupProbe(app, window)
         window.show()
         
-        sys.exit(app.exec())
+        exit_code = app.exec()
+        stop_profiling()
+        sys.exit(exit_code)
         
     except Exception as e:
         print(f"Неожиданная ошибка: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
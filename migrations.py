@@ -0,0 +1,294 @@
+import sqlite3
+from contextlib import contextmanager
+from models import content_key, content_hash
+
+INDEXED_COLUMNS = ("artist", "style", "year", "price", "created_at")
+MIGRATION_BATCH_SIZE = 10000
+
+def _fold_yo(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+def _create_search_index(conn):
+    # unicode61 не считает «ё» буквой с диакритикой, поэтому сворачиваем её сами
+    conn.execute(f'''
+        CREATE VIEW IF NOT EXISTS artworks_fts_source AS
+        SELECT id, {_fold_yo("title")} AS title, {_fold_yo("artist")} AS artist,
+               {_fold_yo("style")} AS style
+        FROM artworks
+    ''')
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS artworks_fts USING fts5(
+                title, artist, style,
+                content='artworks_fts_source', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite собран без FTS5 — поиск работает через LIKE
+        return
+    
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS artworks_fts_insert AFTER INSERT ON artworks
+        BEGIN
+            INSERT INTO artworks_fts (rowid, title, artist, style)
+            VALUES (NEW.id, {_fold_yo("NEW.title")}, {_fold_yo("NEW.artist")},
+                    {_fold_yo("NEW.style")});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS artworks_fts_delete AFTER DELETE ON artworks
+        BEGIN
+            INSERT INTO artworks_fts (artworks_fts, rowid, title, artist, style)
+            VALUES ('delete', OLD.id, {_fold_yo("OLD.title")}, {_fold_yo("OLD.artist")},
+                    {_fold_yo("OLD.style")});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS artworks_fts_update
+        AFTER UPDATE OF title, artist, style ON artworks
+        BEGIN
+            INSERT INTO artworks_fts (artworks_fts, rowid, title, artist, style)
+            VALUES ('delete', OLD.id, {_fold_yo("OLD.title")}, {_fold_yo("OLD.artist")},
+                    {_fold_yo("OLD.style")});
+            INSERT INTO artworks_fts (rowid, title, artist, style)
+            VALUES (NEW.id, {_fold_yo("NEW.title")}, {_fold_yo("NEW.artist")},
+                    {_fold_yo("NEW.style")});
+        END
+    ''')
+    conn.execute("INSERT INTO artworks_fts (artworks_fts) VALUES ('rebuild')")
+
+def _has_column(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+def _add_column(conn, table, column, definition):
+    # ALTER TABLE ADD COLUMN не поддерживает IF NOT EXISTS; столбец мог добавить другой процесс
+    # или прерванный запуск старой версии без журнала миграций
+    if not _has_column(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def create_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS artworks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            artist TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            style TEXT NOT NULL,
+            price REAL NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS artwork_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            artwork_id INTEGER NOT NULL,
+            operation TEXT NOT NULL
+        )
+    ''')
+    for operation, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS artworks_log_{operation}
+            AFTER {operation.upper()} ON artworks
+            BEGIN
+                INSERT INTO artwork_changes (artwork_id, operation)
+                VALUES ({row}.id, '{operation}');
+            END
+        ''')
+    for column in INDEXED_COLUMNS:
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_artworks_{column}
+            ON artworks ({column})
+        ''')
+    _create_search_index(conn)
+
+def convert_created_at_to_iso(conn):
+    # "%d.%m.%Y %H:%M" -> "%Y-%m-%d %H:%M:00". Схема не меняется, строки переписываются
+    # пачками; уже сконвертированные не подходят под GLOB
+    return ("created_at = substr(created_at, 7, 4) || '-' || substr(created_at, 4, 2) || '-' "
+            "|| substr(created_at, 1, 2) || ' ' || substr(created_at, 12, 5) || ':00'",
+            "created_at GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9] [0-9][0-9]:[0-9][0-9]'")
+
+def create_import_checkpoints(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            line INTEGER NOT NULL,
+            imported INTEGER NOT NULL,
+            rejected INTEGER NOT NULL
+        )
+    ''')
+
+# Сводная таблица -> ключ группы для строки artworks
+SUMMARY_TABLES = {
+    "style_stats": "{row}style",
+    "artist_stats": "{row}artist",
+    "decade_stats": "{row}year / 10 * 10",
+}
+
+def fill_summary_tables(conn):
+    for table, expression in SUMMARY_TABLES.items():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f'''
+            INSERT INTO {table} (key, count, total_price)
+            SELECT {expression.format(row="")}, COUNT(*), SUM(price) FROM artworks GROUP BY 1
+        ''')
+
+def create_summary_tables(conn):
+    # Счётчик и сумма по группе обновляются триггерами, поэтому чтение сводки не зависит
+    # от размера artworks; пустые группы удаляются, чтобы не копились после удалений
+    for table, expression in SUMMARY_TABLES.items():
+        key_type = "INTEGER" if "year" in expression else "TEXT"
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                key {key_type} PRIMARY KEY,
+                count INTEGER NOT NULL,
+                total_price REAL NOT NULL
+            )
+        ''')
+        add = f'''
+            INSERT INTO {table} (key, count, total_price)
+            VALUES ({expression.format(row="NEW.")}, 1, NEW.price)
+            ON CONFLICT (key) DO UPDATE SET count = count + 1,
+                                            total_price = total_price + excluded.total_price;
+        '''
+        remove = f'''
+            UPDATE {table} SET count = count - 1, total_price = total_price - OLD.price
+            WHERE key = {expression.format(row="OLD.")};
+            DELETE FROM {table}
+            WHERE key = {expression.format(row="OLD.")} AND count <= 0;
+        '''
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON artworks "
+                     f"BEGIN {add} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON artworks "
+                     f"BEGIN {remove} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_update "
+                     f"AFTER UPDATE OF artist, style, year, price ON artworks "
+                     f"BEGIN {remove} {add} END")
+    fill_summary_tables(conn)
+
+def add_image_column(conn):
+    # Изображение хранится в файловом хранилище по хешу содержимого, в строке — только ссылка;
+    # ADD COLUMN с NULL по умолчанию не переписывает существующие строки
+    _add_column(conn, "artworks", "image_hash", "TEXT")
+
+def _content_hash(title, artist, year):
+    return content_hash(content_key(title, artist, year))
+
+def add_content_key(conn):
+    # Хеш нормализованных названия, художника и года для поиска дубликатов. Новые строки
+    # получают ключ от DatabaseManager, здесь он заполняется для уже существующих
+    _add_column(conn, "artworks", "content_key", "INTEGER")
+    # Служебный ключ не виден в окнах: его заполнение не должно попадать в журнал изменений
+    conn.execute("DROP TRIGGER IF EXISTS artworks_log_update")
+    conn.execute('''
+        CREATE TRIGGER artworks_log_update
+        AFTER UPDATE OF title, artist, year, style, price, created_at, image_hash ON artworks
+        BEGIN
+            INSERT INTO artwork_changes (artwork_id, operation) VALUES (NEW.id, 'update');
+        END
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_artworks_content_key ON artworks (content_key)")
+    conn.create_function("gallery_content_hash", 3, _content_hash, deterministic=True)
+    return "content_key = gallery_content_hash(title, artist, year)", "content_key IS NULL"
+
+def add_archived_flag(conn):
+    # Отмеченные работы переезжают в архив при следующем archive_artworks; частичный индекс
+    # содержит только отмеченные строки и почти ничего не стоит, пока их нет
+    _add_column(conn, "artworks", "archived", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_artworks_archived ON artworks (id) "
+                 "WHERE archived = 1")
+
+def create_archive_schema(conn, schema="archive"):
+    # Архив — отдельный файл со своей схемой вне user_version основной базы, поэтому таблица
+    # создаётся при каждом подключении, если её ещё нет. Триггеров журнала и сводок здесь нет:
+    # архив не участвует в обновлении окон и статистике
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.artworks (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            artist TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            style TEXT NOT NULL,
+            price REAL NOT NULL,
+            created_at TEXT NOT NULL,
+            image_hash TEXT,
+            content_key INTEGER,
+            archived_at TEXT NOT NULL
+        )
+    ''')
+    for column in INDEXED_COLUMNS:
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS {schema}.idx_archive_{column}
+            ON artworks ({column})
+        ''')
+
+MIGRATIONS = (
+    create_base_schema,
+    convert_created_at_to_iso,
+    create_import_checkpoints,
+    create_summary_tables,
+    add_image_column,
+    add_content_key,
+    add_archived_flag,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+@contextmanager
+def _immediate(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def _bump_version(conn, target):
+    # Номер только растёт: другой процесс мог уже уйти дальше
+    if conn.execute("PRAGMA user_version").fetchone()[0] < target:
+        conn.execute(f"PRAGMA user_version = {target}")
+
+def run_backfill(conn, assignment, condition):
+    # Строки переписываются пачками по диапазону id, каждая в своей короткой транзакции,
+    # чтобы блокировка записи не держалась на всю таблицу. Обработанные строки перестают
+    # подходить под condition, поэтому прерванное заполнение продолжается с оставшихся
+    last_id = 0
+    while True:
+        with _immediate(conn):
+            batch_end = conn.execute(f'''
+                SELECT MAX(id) FROM (
+                    SELECT id FROM artworks WHERE id > ? AND ({condition}) ORDER BY id LIMIT ?
+                )
+            ''', (last_id, MIGRATION_BATCH_SIZE)).fetchone()[0]
+            if batch_end is None:
+                return
+            conn.execute(f'''
+                UPDATE artworks SET {assignment}
+                WHERE id IN (SELECT id FROM artworks
+                             WHERE id > ? AND id <= ? AND ({condition}))
+            ''', (last_id, batch_end))
+        last_id = batch_end
+
+def migrate(conn):
+    # Каждая миграция и запись её номера — транзакция с блокировкой записи: процессы,
+    # открывшие базу одновременно, выполняют миграцию по очереди, а опоздавший заново читает
+    # user_version и пропускает уже сделанное. Сбой посередине откатывает миграцию целиком.
+    # Миграция, которой нужно переписать строки, возвращает (SET, условие): схема фиксируется
+    # сразу, строки заполняются пачками, а номер версии записывается после последней пачки.
+    # При актуальной схеме блокировка не берётся вовсе
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        backfill = None
+        with _immediate(conn):
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= target:
+                continue
+            backfill = migration(conn)
+            if backfill is None:
+                _bump_version(conn, target)
+        if backfill is not None:
+            run_backfill(conn, *backfill)
+            with _immediate(conn):
+                _bump_version(conn, target)
+    return version
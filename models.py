@@ -1,12 +1,103 @@
+import hashlib
+import sys
+from array import array
 from dataclasses import dataclass
 from datetime import datetime
+from itertools import compress
 from typing import Optional
 
+def _is_ndarray(values):
+    # numpy импортируется только по требованию: если модуль ещё не загружен,
+    # NumPy-массивов в программе быть не может, а запуск не платит за его импорт
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
 class ValidationError(Exception):
     pass
 
+VALID = 0
+EMPTY_TITLE = 1
+EMPTY_ARTIST = 2
+INVALID_YEAR = 3
+NEGATIVE_PRICE = 4
+
+VALIDATION_MESSAGES = {
+    EMPTY_TITLE: "Название не может быть пустым",
+    EMPTY_ARTIST: "Имя художника не может быть пустым",
+    INVALID_YEAR: "Некорректный год создания",
+    NEGATIVE_PRICE: "Цена не может быть отрицательной",
+}
+
+class BatchValidation:
+    __slots__ = ("codes", "vectorized")
+    
+    def __init__(self, codes, vectorized=False):
+        self.codes = codes
+        self.vectorized = vectorized
+    
+    @property
+    def mask(self):
+        if self.vectorized:
+            import numpy as np
+            return np.frombuffer(self.codes, dtype=np.int8) == VALID
+        return [code == VALID for code in self.codes]
+    
+    @property
+    def messages(self):
+        return [VALIDATION_MESSAGES.get(code) for code in self.codes]
+    
+    def errors(self):
+        for index, code in enumerate(self.codes):
+            if code != VALID:
+                yield index, VALIDATION_MESSAGES[code]
+
+def _blank(values):
+    return [not value.strip() for value in values]
+
+def _flags(values, test):
+    # NumPy-массив проверяется одним векторным выражением, список — поэлементно
+    if _is_ndarray(values):
+        return test(values)
+    return [test(value) for value in values]
+
+def validate_columns(titles, artists, years, prices, current_year=None):
+    if current_year is None:
+        current_year = datetime.now().year
+    codes = array("b", bytes(len(titles)))
+    # Проверки идут от младшей к старшей: у строки остаётся код первого нарушенного
+    # правила, как и у исключения из Artwork.validate()
+    checks = (
+        (NEGATIVE_PRICE, _flags(prices, lambda price: price < 0)),
+        (INVALID_YEAR, _flags(years, lambda year: (year < 100) | (year > current_year))),
+        (EMPTY_ARTIST, _blank(artists)),
+        (EMPTY_TITLE, _blank(titles)),
+    )
+    for code, flags in checks:
+        if _is_ndarray(flags):
+            failed = flags.nonzero()[0].tolist()
+        else:
+            failed = compress(range(len(flags)), flags)
+        for index in failed:
+            codes[index] = code
+    return BatchValidation(codes, vectorized=_is_ndarray(years) or _is_ndarray(prices))
+
+def normalize_text(value):
+    # Регистр, лишние пробелы и «ё» не делают работу из другого каталога новой
+    return " ".join(value.casefold().replace("ё", "е").split())
+
+def content_key(title, artist, year):
+    return f"{normalize_text(title)}\x1f{normalize_text(artist)}\x1f{int(year)}"
+
+def content_hash(key):
+    # 64-битный хеш ключа: индекс по INTEGER компактнее индекса по тексту,
+    # а редкие коллизии отсекает сравнение самих ключей
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big",
+                          signed=True)
+
 @dataclass
 class Artwork:
+    __slots__ = ("id", "title", "artist", "year", "style", "price", "created_at")
+    
     id: Optional[int]
     title: str
     artist: str
@@ -16,11 +107,140 @@ class Artwork:
     created_at: str
     
     def validate(self):
-        if not self.title.strip():
-            raise ValidationError("Название не может быть пустым")
-        if not self.artist.strip():
-            raise ValidationError("Имя художника не может быть пустым")
-        if self.year < 100 or self.year > datetime.now().year:
-            raise ValidationError("Некорректный год создания")
-        if self.price < 0:
-            raise ValidationError("Цена не может быть отрицательной")
\ No newline at end of file
+        code = validate_columns([self.title], [self.artist], [self.year], [self.price]).codes[0]
+        if code != VALID:
+            raise ValidationError(VALIDATION_MESSAGES[code])
+
+class ArtworkView:
+    __slots__ = ("frame", "index")
+    
+    def __init__(self, frame, index):
+        self.frame = frame
+        self.index = index
+    
+    def __getitem__(self, column):
+        return self.frame.value(self.index, column)
+    
+    def __len__(self):
+        return 7 if self.frame.extras is None else 8
+    
+    id = property(lambda self: self.frame.ids[self.index])
+    title = property(lambda self: self.frame.titles[self.index])
+    artist = property(lambda self: self.frame.artists[self.index])
+    year = property(lambda self: self.frame.years[self.index])
+    style = property(lambda self: self.frame.styles[self.index])
+    price = property(lambda self: self.frame.prices[self.index])
+    created_at = property(lambda self: self.frame.created_at[self.index])
+    
+    def to_artwork(self):
+        return self.frame.artwork(self.index)
+
+class ArtworkFrame:
+    # Колонки вместо объекта на строку: id, год и цена лежат в array, повторяющиеся
+    # имена художников и стилей интернируются и хранятся один раз
+    __slots__ = ("ids", "titles", "artists", "years", "styles", "prices", "created_at", "extras")
+    
+    def __init__(self, rows=()):
+        self.ids = array("q")
+        self.titles = []
+        self.artists = []
+        self.years = array("q")
+        self.styles = []
+        self.prices = array("d")
+        self.created_at = []
+        self.extras = None
+        self.extend(rows)
+    
+    def _columns(self):
+        return (self.ids, self.titles, self.artists, self.years, self.styles, self.prices,
+                self.created_at)
+    
+    def append(self, row):
+        self.ids.append(row[0])
+        self.titles.append(row[1])
+        self.artists.append(sys.intern(row[2]))
+        self.years.append(row[3])
+        self.styles.append(sys.intern(row[4]))
+        self.prices.append(row[5])
+        self.created_at.append(row[6])
+        if len(row) > 7:
+            if self.extras is None:
+                self.extras = [None] * (len(self.ids) - 1)
+            self.extras.append(row[7])
+        elif self.extras is not None:
+            self.extras.append(None)
+    
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+    
+    def _replace(self, start, stop, rows):
+        # Срез каждой колонки заменяется одной операцией array/list, без поэлементного сдвига
+        replacement = ArtworkFrame(rows)
+        if self.extras is not None or replacement.extras is not None:
+            extras = self.extras if self.extras is not None else [None] * len(self.ids)
+            extras[start:stop] = (replacement.extras if replacement.extras is not None
+                                  else [None] * len(replacement))
+            self.extras = extras
+        for column, new_values in zip(self._columns(), replacement._columns()):
+            column[start:stop] = new_values
+    
+    def insert_rows(self, index, rows):
+        self._replace(index, index, rows)
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError(index)
+        return ArtworkView(self, index)
+    
+    def __setitem__(self, index, row):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.ids))
+            if step != 1:
+                raise ValueError("ArtworkFrame поддерживает только срезы с шагом 1")
+            self._replace(start, max(start, stop), row)
+            return
+        self.ids[index] = row[0]
+        self.titles[index] = row[1]
+        self.artists[index] = sys.intern(row[2])
+        self.years[index] = row[3]
+        self.styles[index] = sys.intern(row[4])
+        self.prices[index] = row[5]
+        self.created_at[index] = row[6]
+        if self.extras is not None:
+            self.extras[index] = row[7] if len(row) > 7 else None
+    
+    def __delitem__(self, index):
+        for column in self._columns():
+            del column[index]
+        if self.extras is not None:
+            del self.extras[index]
+    
+    def value(self, index, column):
+        if column == 7:
+            return None if self.extras is None else self.extras[index]
+        return self._columns()[column][index]
+    
+    def row(self, index):
+        return tuple(column[index] for column in self._columns())
+    
+    def artwork(self, index):
+        return Artwork(*self.row(index))
+    
+    def as_numpy(self):
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("Для as_numpy() нужен пакет numpy")
+        # Копии, а не frombuffer-представления: пока живо представление, array нельзя
+        # менять (BufferError), а страницы модели таблицы правятся на месте
+        return {
+            "id": np.array(self.ids, dtype=np.int64),
+            "year": np.array(self.years, dtype=np.int64),
+            "price": np.array(self.prices, dtype=np.float64),
+        }
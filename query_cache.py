@@ -0,0 +1,124 @@
+import functools
+import inspect
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 128
+# Суммарный лимит строк в кэше; результат крупнее целиком не кэшируется
+DEFAULT_MAX_ROWS = 200000
+
+class QueryCache:
+    def __init__(self, db_name, max_entries=DEFAULT_MAX_ENTRIES, max_rows=DEFAULT_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+        # PRAGMA data_version меняется после любого коммита из другого соединения, поэтому
+        # отдельное соединение, которое само ничего не пишет, замечает и чужие процессы,
+        # и остальные соединения пула. У ":memory:" других соединений нет.
+        self._probe = None
+        if db_name != ":memory:":
+            self._probe = sqlite3.connect(db_name, check_same_thread=False)
+        self._data_version = self._read_data_version()
+    
+    def _read_data_version(self):
+        if self._probe is None:
+            return 0
+        try:
+            return self._probe.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            # Без проверки версии кэшу нельзя доверять — считаем, что база изменилась
+            return None
+    
+    def data_version(self):
+        with self._lock:
+            return self._read_data_version()
+    
+    def _token(self):
+        with self._lock:
+            data_version = self._read_data_version()
+            if data_version is None or data_version != self._data_version:
+                self._data_version = data_version
+                self._invalidate()
+            return self.generation
+    
+    def _invalidate(self):
+        self.generation += 1
+        self.invalidations += 1
+        self._entries.clear()
+        self._rows = 0
+    
+    def invalidate(self):
+        with self._lock:
+            self._invalidate()
+    
+    def get(self, key):
+        generation = self._token()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return generation, entry[1]
+            self.misses += 1
+            return generation, None
+    
+    def put(self, key, generation, result):
+        size = len(result)
+        with self._lock:
+            # Запись за время выполнения запроса делает результат устаревшим
+            if generation != self.generation or size > self.max_rows:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._rows -= len(old[1])
+            self._entries[key] = (generation, result)
+            self._rows += size
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._rows -= len(evicted)
+                self.evictions += 1
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "rows": self._rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+    
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+            if self._probe is not None:
+                self._probe.close()
+                self._probe = None
+
+def cached(fn):
+    # Ключ — имя метода и аргументы, приведённые к полной форме со значениями по умолчанию:
+    # query_artworks(artist="X") и query_artworks("X") попадают в одну запись
+    signature = inspect.signature(fn)
+    
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (fn.__name__,) + tuple(bound.arguments.items())[1:]
+        generation, result = self.cache.get(key)
+        if result is None:
+            result = fn(self, *args, **kwargs)
+            self.cache.put(key, generation, result)
+        # Копия списка, чтобы вызывающий код не испортил закэшированный результат
+        return list(result)
+    return wrapper
@@ -0,0 +1,403 @@
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from urllib.parse import urlsplit, parse_qs
+from gallery_logging import setup_logging
+from analytics import GalleryAnalytics
+from database import DatabaseManager, DatabaseError, ARTWORK_COLUMNS, SEARCH_LIMIT
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+# Большие страницы уходят кусками по столько строк, не собирая весь ответ в памяти
+STREAM_BATCH = 500
+KEEP_ALIVE_TIMEOUT = 15
+# Целые вне этого диапазона sqlite3 не может передать в запрос (OverflowError)
+SQLITE_INT_MIN = -2 ** 63
+SQLITE_INT_MAX = 2 ** 63 - 1
+
+FILTERS = {
+    "artist": str,
+    "style": str,
+    "year_from": int,
+    "year_to": int,
+    "price_from": float,
+    "price_to": float,
+    "created_from": str,
+    "created_to": str,
+}
+
+STATUS_TEXT = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _fits_sqlite(value):
+    return not isinstance(value, int) or SQLITE_INT_MIN <= value <= SQLITE_INT_MAX
+
+def _number(params, name, number_type, default=None, minimum=None, maximum=None):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        value = number_type(value)
+    except ValueError:
+        raise HttpError(400, f"Параметр {name} должен быть числом")
+    if (not _fits_sqlite(value) or minimum is not None and value < minimum
+            or maximum is not None and value > maximum):
+        raise HttpError(400, f"Параметр {name} вне допустимого диапазона")
+    return value
+
+def _row_to_dict(row, columns=ARTWORK_COLUMNS):
+    return dict(zip(columns, row))
+
+class _Request:
+    __slots__ = ("method", "path", "params", "headers", "keep_alive")
+    
+    def __init__(self, method, target, version, headers):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path.rstrip("/") or "/"
+        self.params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self.headers = headers
+        # Чанки есть только в HTTP/1.1; для 1.0 соединение закрывается после ответа
+        self.keep_alive = (version == "HTTP/1.1"
+                           and headers.get("connection", "").lower() != "close")
+
+class GalleryServer:
+    def __init__(self, db, max_workers=DEFAULT_WORKERS):
+        self.db = db
+        self.analytics = GalleryAnalytics(db)
+        # Запросы к базе идут в ограниченном пуле потоков, цикл событий их только ждёт
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="gallery-db")
+        self.server = None
+    
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        address = self.server.sockets[0].getsockname()
+        logging.info("HTTP service listening on %s:%d", address[0], address[1])
+        return address[1]
+    
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+    
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+    
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._send_json(writer, None, e.status, {"error": str(e)})
+                    break
+                if request is None:
+                    break
+                
+                started = time.perf_counter()
+                try:
+                    status = await self._dispatch(request, writer)
+                except HttpError as e:
+                    status = e.status
+                    await self._send_json(writer, request, status, {"error": str(e)})
+                except DatabaseError as e:
+                    status = 500
+                    logging.error("HTTP %s %s failed: %s", request.method, request.path, e)
+                    await self._send_json(writer, request, status, {"error": str(e)})
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    # Любая другая ошибка — тоже ответ 500, а не молча закрытое соединение
+                    status = 500
+                    logging.exception("HTTP %s %s crashed", request.method, request.path)
+                    await self._send_json(writer, request, status,
+                                          {"error": "Внутренняя ошибка сервера"})
+                logging.debug("HTTP %s %s -> %d in %.1f ms", request.method, request.path,
+                              status, (time.perf_counter() - started) * 1000)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _read_request(self, reader):
+        try:
+            line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        if not line.strip():
+            return None
+        
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise HttpError(400, "Некорректная строка запроса")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = headers.get("content-length")
+        if length and length.isdigit():
+            await reader.readexactly(int(length))
+        return _Request(*parts, headers)
+    
+    async def _dispatch(self, request, writer):
+        if request.method not in ("GET", "HEAD"):
+            raise HttpError(405, "Сервис только читает данные: поддерживаются GET и HEAD")
+        
+        # Номер изменения читается до данных: если запись пройдёт между ними, клиент
+        # получит более старый ETag и просто перезапросит ресурс
+        seq = await self._run(self.db.get_change_seq)
+        etag = f'"{seq}"'
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match == "*" or etag in (tag.strip() for tag in if_none_match.split(",")):
+            await self._send(writer, request, 304, [("ETag", etag)], b"")
+            return 304
+        
+        parts = request.path.strip("/").split("/")
+        if parts == ["artworks"]:
+            await self._list_artworks(request, writer, etag)
+        elif len(parts) == 2 and parts[0] == "artworks":
+            await self._get_artwork(request, writer, etag, parts[1])
+        elif parts == ["search"]:
+            await self._search(request, writer, etag)
+        elif parts == ["stats"]:
+            await self._stats(request, writer, etag)
+        else:
+            raise HttpError(404, f"Неизвестный адрес: {request.path}")
+        return 200
+    
+    async def _list_artworks(self, request, writer, etag):
+        params = request.params
+        filters = {name: _number(params, name, cast) if cast is not str else params.get(name)
+                   for name, cast in FILTERS.items()}
+        order_by = params.get("order_by", "id")
+        if order_by not in ARTWORK_COLUMNS:
+            raise HttpError(400, f"Неизвестный столбец сортировки: {order_by}")
+        descending = params.get("descending", "1").lower() not in ("0", "false", "no")
+        limit = _number(params, "limit", int, DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        after = None
+        if params.get("after"):
+            try:
+                after = json.loads(params["after"])
+            except ValueError:
+                after = None
+            # Курсор попадает в ключ кэша и в параметры SQL: только пара скалярных значений
+            if not (isinstance(after, list) and len(after) == 2
+                    and all(isinstance(value, (str, int, float)) and _fits_sqlite(value)
+                            for value in after)):
+                raise HttpError(400, "Параметр after должен быть курсором из поля next")
+            after = tuple(after)
+        
+        rows = await self._run(self.db.query_artworks, **filters, order_by=order_by,
+                               descending=descending, after=after, limit=limit)
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = json.dumps([last[ARTWORK_COLUMNS.index(order_by)], last[0]],
+                                     ensure_ascii=False, separators=(",", ":"))
+        await self._send_items(writer, request, etag, rows, ARTWORK_COLUMNS,
+                               {"next": next_cursor})
+    
+    async def _get_artwork(self, request, writer, etag, artwork_id):
+        if not (artwork_id.isascii() and artwork_id.isdigit()):
+            raise HttpError(404, f"Неизвестный адрес: {request.path}")
+        if not _fits_sqlite(int(artwork_id)):
+            raise HttpError(400, f"ID {artwork_id} вне допустимого диапазона")
+        artwork = await self._run(self.db.get_artwork, int(artwork_id))
+        if artwork is None:
+            raise HttpError(404, f"Произведение с ID {artwork_id} не найдено")
+        await self._send_json(writer, request, 200, asdict(artwork), etag)
+    
+    async def _search(self, request, writer, etag):
+        text = request.params.get("q", "").strip()
+        if not text:
+            raise HttpError(400, "Не задан поисковый запрос q")
+        limit = _number(request.params, "limit", int, SEARCH_LIMIT, 1, MAX_PAGE_SIZE)
+        rows = await self._run(self.db.search, text, limit)
+        await self._send_items(writer, request, etag, rows, ARTWORK_COLUMNS + ("snippet",), {})
+    
+    async def _stats(self, request, writer, etag):
+        limit = _number(request.params, "limit", int, 10, 1, MAX_PAGE_SIZE)
+        report = await self._run(self.analytics.report, limit)
+        count, value = report["totals"]
+        await self._send_json(writer, request, 200, {
+            "count": count,
+            "value": value,
+            "styles": [{"style": style, "count": count, "value": total}
+                       for style, count, total in report["styles"]],
+            "artists": [{"artist": artist, "count": count, "average_price": average}
+                        for artist, count, average in report["artists"]],
+            "decades": [{"decade": decade, "count": count}
+                        for decade, count in report["decades"]],
+        }, etag)
+    
+    async def _send(self, writer, request, status, headers, body):
+        keep_alive = request is not None and request.keep_alive
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if body and request is not None and request.method != "HEAD":
+            writer.write(body)
+        await writer.drain()
+    
+    async def _send_json(self, writer, request, status, payload, etag=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = [("Content-Type", "application/json; charset=utf-8")]
+        if etag is not None:
+            headers.append(("ETag", etag))
+        await self._send(writer, request, status, headers, body)
+    
+    async def _send_items(self, writer, request, etag, rows, columns, extra):
+        if len(rows) <= STREAM_BATCH:
+            await self._send_json(writer, request, 200,
+                                  {"items": [_row_to_dict(row, columns) for row in rows], **extra},
+                                  etag)
+            return
+        
+        headers = [("Content-Type", "application/json; charset=utf-8"), ("ETag", etag)]
+        if request.keep_alive:
+            headers.append(("Transfer-Encoding", "chunked"))
+        await self._send(writer, request, 200, headers, None)
+        if request.method == "HEAD":
+            return
+        
+        def write(text):
+            data = text.encode("utf-8")
+            if request.keep_alive:
+                data = b"%x\r\n%s\r\n" % (len(data), data)
+            writer.write(data)
+        
+        write('{"items": [')
+        for start in range(0, len(rows), STREAM_BATCH):
+            batch = rows[start:start + STREAM_BATCH]
+            items = ", ".join(json.dumps(_row_to_dict(row, columns), ensure_ascii=False)
+                              for row in batch)
+            write(items if start == 0 else ", " + items)
+            # Медленный клиент придерживает отправку, а не копит ответ в буфере
+            await writer.drain()
+        tail = json.dumps(extra, ensure_ascii=False)[1:]
+        write("]" + (", " + tail if extra else "}"))
+        if request.keep_alive:
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+async def _fetch(reader, writer, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int(await reader.readline(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+async def load_test(host, port, paths, requests, concurrency):
+    # Простой генератор нагрузки: concurrency соединений keep-alive по кругу запрашивают paths
+    counter = iter(range(requests))
+    statuses = {}
+    
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for number in counter:
+                status = await _fetch(reader, writer, paths[number % len(paths)])
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, statuses
+
+async def serve(db, host, port, workers):
+    server = GalleryServer(db, workers)
+    port = await server.start(host, port)
+    print(f"Сервис запущен: http://{host}:{port}/artworks")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+async def run_load_test(db, requests, concurrency, workers):
+    server = GalleryServer(db, workers)
+    port = await server.start(DEFAULT_HOST, 0)
+    try:
+        return await load_test(DEFAULT_HOST, port, ["/artworks", "/stats", "/artworks?limit=1000"],
+                               requests, concurrency)
+    finally:
+        await server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP-сервис каталога галереи (только чтение)")
+    parser.add_argument("--db", default="art_gallery.db", help="файл базы данных")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="потоков для запросов к базе")
+    parser.add_argument("--load-test", type=int, metavar="N",
+                        help="вместо работы отправить N запросов на временный порт и выйти")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+    
+    setup_logging()
+    try:
+        db = DatabaseManager(args.db, pool_size=args.workers)
+        try:
+            if args.load_test:
+                elapsed, statuses = asyncio.run(run_load_test(db, args.load_test,
+                                                              args.concurrency, args.workers))
+                print(f"Запросов: {args.load_test} за {elapsed:.2f} с "
+                      f"({args.load_test / elapsed:.0f} в секунду), ответы: {statuses}")
+            else:
+                asyncio.run(serve(db, args.host, args.port, args.workers))
+        finally:
+            db.close()
+    except KeyboardInterrupt:
+        pass
+    except (DatabaseError, OSError) as e:
+        print(f"Ошибка: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+from database import ARTWORK_COLUMNS
+from models import ArtworkFrame
+from instrumentation import METRICS
+
+COLUMNS = ["ID", "Название", "Художник", "Год", "Стиль", "Цена (€)", "Дата добавления",
+           "Изображение"]
+# Столбец миниатюр не входит в строки запроса: картинка берётся из ThumbnailLoader по id
+IMAGE_COLUMN = len(ARTWORK_COLUMNS)
+PAGE_SIZE = 500
+MAX_CACHED_PAGES = 20
+# Пустые строки-заготовки, пока асинхронно грузится первая страница
+SKELETON_ROWS = 20
+
+def format_timestamp(value):
+    # В базе хранится "ГГГГ-ММ-ДД чч:мм:сс"; срезы дешевле strptime на каждую ячейку
+    if len(value) < 16 or value[4] != "-":
+        return value
+    return f"{value[8:10]}.{value[5:7]}.{value[0:4]} {value[11:16]}"
+
+class _Page:
+    # id строк храним всегда (8 байт на строку), сами строки — колонками ArtworkFrame
+    # и только для страниц в кэше
+    __slots__ = ("anchor", "ids", "rows")
+    
+    def __init__(self, anchor, rows):
+        self.anchor = anchor
+        self.ids = array("q", (row[0] for row in rows))
+        self.rows = rows
+
+class ArtworkTableModel(QAbstractTableModel):
+    load_failed = Signal(str)
+    first_page_loaded = Signal()
+    
+    def __init__(self, db, worker=None, page_size=PAGE_SIZE, max_cached_pages=MAX_CACHED_PAGES,
+                 thumbnails=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.worker = worker
+        self.thumbnails = None
+        self.set_thumbnails(thumbnails)
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        self.filters = {}
+        self.search_text = ""
+        self.order_by = "id"
+        self.descending = True
+        # Архив подмешивается только по запросу: обычный просмотр читает активную коллекцию
+        self.include_archive = False
+        self._generation = 0
+        self._skeleton = 0
+        self._clear()
+    
+    def _clear(self):
+        self._pages = []
+        self._starts = []
+        self._cached = OrderedDict()
+        self._row_count = 0
+        self._last_key = None
+        self._sync_seq = None
+        self._exhausted = False
+        self._fetching = False
+        self._loading_pages = set()
+    
+    def _reindex(self):
+        self._starts = []
+        total = 0
+        for page in self._pages:
+            self._starts.append(total)
+            total += len(page.ids)
+        self._row_count = total
+    
+    def _request(self, key, description, fn, *args, callback):
+        if self.worker is None:
+            callback(fn(*args))
+            return
+        
+        generation = self._generation
+        
+        def on_result(result):
+            if generation == self._generation:
+                callback(result)
+        
+        def on_error(error):
+            if generation == self._generation:
+                self._fetching = False
+                self._loading_pages.clear()
+                self._set_skeleton(0)
+                self.load_failed.emit(str(error))
+        
+        self.worker.read(fn, *args, description=description, key=key,
+                         on_result=on_result, on_error=on_error)
+    
+    def _timed(self, operation, callback):
+        # Время от запроса до применения результата, включая ожидание в очереди воркера
+        started = time.perf_counter()
+        
+        def wrapper(result):
+            callback(result)
+            METRICS.record(operation, time.perf_counter() - started)
+        
+        return wrapper
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count or self._skeleton
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return super().headerData(section, orientation, role)
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column >= len(ARTWORK_COLUMNS):
+            return
+        order_by = ARTWORK_COLUMNS[column]
+        descending = order == Qt.DescendingOrder
+        if (order_by, descending) == (self.order_by, self.descending):
+            return
+        self.order_by = order_by
+        self.descending = descending
+        self.reload()
+    
+    def set_filters(self, search="", **filters):
+        self.search_text = search.strip()
+        self.filters = {name: value for name, value in filters.items()
+                        if value not in (None, "")}
+        self.reload()
+    
+    def set_include_archive(self, include_archive):
+        if include_archive == self.include_archive:
+            return
+        self.include_archive = include_archive
+        self.reload()
+    
+    def is_default_order(self):
+        return (not self.filters and not self.search_text
+                and self.order_by == "id" and self.descending)
+    
+    def _query(self, after, limit):
+        if self.search_text:
+            # Результаты поиска упорядочены по релевантности и умещаются в одну страницу
+            return [] if after is not None else self.db.search(self.search_text, limit,
+                                                                self.include_archive)
+        return self.db.query_artworks(**self.filters, order_by=self.order_by,
+                                      descending=self.descending, after=after, limit=limit,
+                                      include_archive=self.include_archive)
+    
+    def _sort_key(self, row):
+        return row[ARTWORK_COLUMNS.index(self.order_by)], row[0]
+    
+    def flags(self, index):
+        if self._skeleton:
+            return Qt.NoItemFlags
+        return super().flags(index)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if index.column() == IMAGE_COLUMN:
+            if role != Qt.DecorationRole or self._skeleton or self.thumbnails is None:
+                return None
+            # id есть и у страниц, вытесненных из кэша, так что строки для этого не нужны
+            return self.thumbnails.pixmap(self.artwork_id(index.row()))
+        if role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        if self._skeleton:
+            return "…" if role == Qt.DisplayRole else None
+        
+        row = self.row_at(index.row())
+        if role == Qt.ToolTipRole:
+            # В режиме поиска восьмой столбец — фрагмент с подсвеченным совпадением
+            return row[7] if row is not None and len(row) > 7 else None
+        if row is None:
+            return "…"
+        value = row[index.column()]
+        if index.column() == 5:
+            return f"{value:,.2f}"
+        if index.column() == 6:
+            return format_timestamp(value)
+        return str(value)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted or self._fetching:
+            return
+        
+        self._fetching = True
+        if self._sync_seq is None:
+            self._request(("page", id(self)), "Загрузка коллекции", self._fetch_first_page,
+                          callback=self._timed("ui.reload", self._append_first_page))
+        else:
+            self._request(("page", id(self)), "Загрузка коллекции", self._query,
+                          self._last_key, self.page_size,
+                          callback=self._timed("ui.fetch_more", self._append_page))
+    
+    def _fetch_first_page(self):
+        # Номер изменения читается до страницы: всё, что придёт позже, применит refresh()
+        seq = self.db.get_change_seq()
+        return seq, self._query(None, self.page_size)
+    
+    def _append_first_page(self, result):
+        self._sync_seq, rows = result
+        self._set_skeleton(0)
+        self._append_page(rows)
+        self.first_page_loaded.emit()
+    
+    def _set_skeleton(self, rows):
+        if rows == self._skeleton:
+            return
+        self.beginResetModel()
+        self._skeleton = rows
+        self.endResetModel()
+    
+    def _append_page(self, rows):
+        self._fetching = False
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if not rows:
+            return
+        
+        self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + len(rows) - 1)
+        page = _Page(self._last_key, ArtworkFrame(rows))
+        self._pages.append(page)
+        self._touch(page)
+        self._reindex()
+        self._last_key = self._sort_key(rows[-1])
+        self.endInsertRows()
+    
+    def reload(self):
+        # Результаты запросов предыдущего поколения отбрасываются
+        self._generation += 1
+        self.beginResetModel()
+        self._clear()
+        # Без воркера первая страница придёт прямо в fetchMore(), заготовка не нужна
+        self._skeleton = 0 if self.worker is None else SKELETON_ROWS
+        self.endResetModel()
+        self.fetchMore()
+    
+    def refresh(self):
+        if self._sync_seq is None:
+            self.reload()
+            return
+        self._request(("changes", id(self)), "Обновление коллекции", self.db.get_changes_since,
+                      self._sync_seq, self.page_size, self.include_archive,
+                      callback=self._timed("ui.refresh", self._apply_changes))
+    
+    def _apply_changes(self, changes):
+        if changes is None:
+            self.reload()
+            return
+        
+        seq, rows, deleted_ids = changes
+        for artwork_id in deleted_ids:
+            self.remove_artwork(artwork_id)
+        
+        self._merge_rows(rows)
+        self._sync_seq = seq
+    
+    def _merge_rows(self, rows):
+        top_id = self._pages[0].ids[0] if self._pages else None
+        new_rows = []
+        # Строки со старым id, которых нет в окне, — например, возвращённые из архива
+        missing_rows = []
+        for row in rows:
+            if top_id is None or row[0] > top_id:
+                new_rows.append(row)
+            elif not self.update_row(row):
+                missing_rows.append(row)
+        if not new_rows and not missing_rows:
+            return
+        # Место строки по id известно только в порядке по умолчанию, иначе его определяет
+        # сам запрос
+        if not self.is_default_order():
+            self.reload()
+            return
+        if new_rows:
+            self.prepend_rows(new_rows)
+        for row in missing_rows:
+            self._insert_row(row)
+    
+    def insert_artwork(self, artwork_id):
+        def merge(rows):
+            self._merge_rows([row for row in rows if row[0] == artwork_id])
+        
+        self._request(("insert", id(self), artwork_id), "Обновление коллекции",
+                      self.db.get_artworks_page, artwork_id + 1, 1, callback=merge)
+    
+    def _locate(self, row):
+        page_index = bisect_right(self._starts, row) - 1
+        return page_index, row - self._starts[page_index]
+    
+    def _find(self, artwork_id):
+        for page_index, page in enumerate(self._pages):
+            if artwork_id in page.ids:
+                return page_index, page.ids.index(artwork_id)
+        return None
+    
+    def row_at(self, row):
+        page_index, offset = self._locate(row)
+        page = self._pages[page_index]
+        if page.rows is None:
+            self._load_page(page)
+            if page.rows is None:
+                return None
+        self._touch(page)
+        return page.rows[offset]
+    
+    def _load_page(self, page):
+        if page in self._loading_pages:
+            return
+        self._loading_pages.add(page)
+        
+        def store(rows):
+            self._loading_pages.discard(page)
+            if page not in self._pages:
+                return
+            by_id = {row[0]: row for row in rows}
+            if len(by_id) == len(page.ids):
+                page.rows = ArtworkFrame(by_id[artwork_id] for artwork_id in page.ids)
+            else:
+                # Строки, удалённые другим процессом, остаются пустыми до ближайшего refresh()
+                page.rows = [by_id.get(artwork_id) for artwork_id in page.ids]
+            self._touch(page)
+            if self.worker is None:
+                return
+            first = self._starts[self._pages.index(page)]
+            self.dataChanged.emit(self.index(first, 0),
+                                  self.index(first + len(page.ids) - 1, len(COLUMNS) - 1))
+        
+        self._request(("page", id(self), id(page)), "Загрузка коллекции",
+                      self._query, page.anchor, len(page.ids),
+                      callback=self._timed("ui.page_reload", store))
+    
+    def prepend_rows(self, rows):
+        if not self._pages:
+            if self._fetching or not self._exhausted:
+                self.reload()
+                return
+            self._append_page(rows)
+            return
+        
+        page = self._pages[0]
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        page.ids[0:0] = array("q", (row[0] for row in rows))
+        if page.rows is not None:
+            page.rows[0:0] = rows
+        self._reindex()
+        self.endInsertRows()
+    
+    def _insert_row(self, row):
+        # Страницы идут по убыванию id: строка встаёт перед первым меньшим id
+        artwork_id = row[0]
+        for page_index, page in enumerate(self._pages):
+            if page.ids[-1] < artwork_id:
+                offset = next(index for index, other_id in enumerate(page.ids)
+                              if other_id < artwork_id)
+                break
+        else:
+            # Ниже границы загруженного её подхватит очередная догрузка
+            if not self._pages or (not self._exhausted and artwork_id < self._last_key[-1]):
+                return
+            page_index = len(self._pages) - 1
+            page = self._pages[page_index]
+            offset = len(page.ids)
+        
+        model_row = self._starts[page_index] + offset
+        self.beginInsertRows(QModelIndex(), model_row, model_row)
+        page.ids.insert(offset, artwork_id)
+        if page.rows is not None:
+            page.rows[offset:offset] = [row]
+        self._reindex()
+        self.endInsertRows()
+    
+    def remove_artwork(self, artwork_id):
+        found = self._find(artwork_id)
+        if found is None:
+            return False
+        
+        page_index, offset = found
+        page = self._pages[page_index]
+        row = self._starts[page_index] + offset
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del page.ids[offset]
+        if page.rows is not None:
+            del page.rows[offset]
+        if not page.ids:
+            del self._pages[page_index]
+            self._cached.pop(page, None)
+        self._reindex()
+        self.endRemoveRows()
+        return True
+    
+    def update_row(self, row):
+        if self.thumbnails is not None:
+            self.thumbnails.forget(row[0])
+        found = self._find(row[0])
+        if found is None:
+            return False
+        
+        page_index, offset = found
+        page = self._pages[page_index]
+        if page.rows is not None:
+            page.rows[offset] = row
+            model_row = self._starts[page_index] + offset
+            self.dataChanged.emit(self.index(model_row, 0),
+                                  self.index(model_row, len(COLUMNS) - 1))
+        return True
+    
+    def artwork_id(self, row):
+        page_index, offset = self._locate(row)
+        return self._pages[page_index].ids[offset]
+    
+    def artwork_title(self, row):
+        row = self.row_at(row)
+        return None if row is None else row[1]
+    
+    def set_thumbnails(self, thumbnails):
+        self.thumbnails = thumbnails
+        if thumbnails is not None:
+            thumbnails.ready.connect(self._on_thumbnails_ready)
+            self._on_thumbnails_ready()
+    
+    def _on_thumbnails_ready(self):
+        # Один сигнал на весь столбец: представление перерисует только видимые ячейки
+        if self._row_count:
+            self.dataChanged.emit(self.index(0, IMAGE_COLUMN),
+                                  self.index(self._row_count - 1, IMAGE_COLUMN),
+                                  [Qt.DecorationRole])
+    
+    def _touch(self, page):
+        self._cached[page] = None
+        self._cached.move_to_end(page)
+        while len(self._cached) > self.max_cached_pages:
+            evicted, _ = self._cached.popitem(last=False)
+            evicted.rows = None
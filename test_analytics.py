@@ -0,0 +1,77 @@
+import pytest
+import tempfile
+import os
+import sqlite3
+from analytics import GalleryAnalytics
+from database import DatabaseManager
+from models import Artwork
+
+class TestGalleryAnalytics:
+    
+    def make_artworks(self):
+        return [
+            Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Постимпрессионизм", 300.0, ""),
+            Artwork(None, "Звездная ночь", "Ван Гог", 1889, "Постимпрессионизм", 500.0, ""),
+            Artwork(None, "Впечатление", "Моне", 1872, "Импрессионизм", 200.0, ""),
+            Artwork(None, "Кувшинки", "Моне", 1906, "Импрессионизм", 100.0, ""),
+        ]
+    
+    def test_aggregates_follow_inserts_and_deletes(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            analytics = GalleryAnalytics(db)
+            
+            assert analytics.totals() == (0, 0)
+            ids = db.add_artworks(self.make_artworks())
+            
+            assert analytics.totals() == (4, 1100.0)
+            assert analytics.value_by_style() == [("Постимпрессионизм", 2, 800.0),
+                                                  ("Импрессионизм", 2, 300.0)]
+            assert analytics.average_price_by_artist(limit=1) == [("Ван Гог", 2, 400.0)]
+            assert analytics.counts_by_decade() == [(1870, 1), (1880, 2), (1900, 1)]
+            
+            db.delete_artworks(ids[2:])
+            
+            assert analytics.value_by_style() == [("Постимпрессионизм", 2, 800.0)]
+            assert analytics.counts_by_decade() == [(1880, 2)]
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_update_moves_row_between_groups(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            analytics = GalleryAnalytics(db)
+            ids = db.add_artworks(self.make_artworks())
+            
+            conn = sqlite3.connect(db_path)
+            conn.execute("UPDATE artworks SET style = 'Модерн', price = 50 WHERE id = ?",
+                         (ids[3],))
+            conn.commit()
+            conn.close()
+            
+            assert ("Модерн", 1, 50.0) in analytics.value_by_style()
+            assert ("Импрессионизм", 1, 200.0) in analytics.value_by_style()
+            
+            totals = analytics.totals()
+            analytics.rebuild()
+            assert analytics.totals() == totals
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
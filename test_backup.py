@@ -0,0 +1,241 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+import pytest
+import tempfile
+import shutil
+import sqlite3
+import threading
+from database import DatabaseManager, archive_path
+from backup import BackupManager, BackupError, backup_database, verify_backup
+from models import Artwork
+import widgets
+
+class TestBackup:
+    
+    def create_artworks(self, db, count):
+        return db.add_artworks(Artwork(None, f"Работа {i}", "Художник", 1900 + i % 100, "Стиль",
+                                       float(i), "") for i in range(count))
+    
+    def test_snapshot_is_consistent_copy(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        backup_dir = tempfile.mkdtemp()
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            self.create_artworks(db, 2000)
+            backups = BackupManager(db, backup_dir, pages=4, sleep=0)
+            progress = []
+            
+            path = backups.snapshot(progress=lambda copied, total: progress.append((copied, total)))
+            
+            verify_backup(path)
+            assert len(progress) > 1
+            assert progress[-1][0] == progress[-1][1]
+            conn = sqlite3.connect(path)
+            try:
+                assert conn.execute("SELECT COUNT(*) FROM artworks").fetchone()[0] == 2000
+                assert conn.execute("SELECT SUM(count) FROM style_stats").fetchone()[0] == 2000
+            finally:
+                conn.close()
+            db.close()
+            
+        finally:
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_snapshot_completes_under_concurrent_writes(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        backup_dir = tempfile.mkdtemp()
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            self.create_artworks(db, 5000)
+            stop = threading.Event()
+            
+            def writer():
+                number = 0
+                while not stop.is_set():
+                    number += 1
+                    db.add_artwork(Artwork(None, f"Новая {number}", "Художник", 2000, "Стиль",
+                                           1.0, ""))
+            
+            thread = threading.Thread(target=writer)
+            thread.start()
+            try:
+                path = backup_database(db_path, os.path.join(backup_dir, "copy.db"), pages=8)
+            finally:
+                stop.set()
+                thread.join()
+            
+            # Снимок фиксирует состояние на начало копирования, писатель при этом не ждёт
+            conn = sqlite3.connect(path)
+            try:
+                assert conn.execute("SELECT COUNT(*) FROM artworks").fetchone()[0] >= 5000
+                assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+            finally:
+                conn.close()
+            db.close()
+            
+        finally:
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_retention_keeps_newest_snapshots(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        backup_dir = tempfile.mkdtemp()
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            backups = BackupManager(db, backup_dir, retention=2)
+            paths = [backups.snapshot() for _ in range(4)]
+            
+            assert backups.snapshots() == paths[2:]
+            assert backups.prune() == []
+            
+            # Снимок безопасности при восстановлении не вытесняет восстанавливаемый снимок,
+            # лишние удаляются уже после восстановления
+            safety = backups.restore(paths[2])
+            assert backups.snapshots() == [paths[3], safety]
+            db.close()
+            
+        finally:
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_restore_replaces_data_and_forces_reload(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        backup_dir = tempfile.mkdtemp()
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = self.create_artworks(db, 100)
+            backups = BackupManager(db, backup_dir)
+            path = backups.snapshot()
+            db.delete_artworks(ids[:40])
+            seq = db.get_change_seq()
+            assert len(db.get_all_artworks()) == 60
+            
+            safety = backups.restore(path)
+            
+            assert len(db.get_all_artworks()) == 100
+            # Журнал изменений вернулся к состоянию снимка — окна должны перечитать всё
+            assert db.get_changes_since(seq) is None
+            conn = sqlite3.connect(safety)
+            try:
+                assert conn.execute("SELECT COUNT(*) FROM artworks").fetchone()[0] == 60
+            finally:
+                conn.close()
+            db.close()
+            
+        finally:
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_snapshot_and_restore_include_archive(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        backup_dir = tempfile.mkdtemp()
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = self.create_artworks(db, 5)
+            backups = BackupManager(db, backup_dir, retention=2)
+            before_archive = backups.snapshot()
+            db.mark_archived(ids[:2])
+            db.archive_artworks()
+            with_archive = backups.snapshot()
+            assert os.path.exists(archive_path(with_archive))
+            
+            # Снимок без архива: текущий архив очищается, работы не задваиваются
+            backups.restore(before_archive)
+            assert [a.id for a in db.get_all_artworks(include_archive=True)] == ids[::-1]
+            assert len(db.get_all_artworks()) == 5
+            
+            backups.restore(with_archive)
+            assert [a.id for a in db.get_all_artworks(include_archive=True)] == ids[::-1]
+            assert sorted(a.id for a in db.get_all_artworks()) == ids[2:]
+            
+            # Копия архива удаляется вместе со своим снимком и отдельным снимком не считается
+            assert with_archive not in backups.snapshots()
+            assert not os.path.exists(archive_path(with_archive))
+            assert len(backups.snapshots()) == 2
+            db.close()
+            
+        finally:
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_restore_rejects_damaged_snapshot(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        backup_dir = tempfile.mkdtemp()
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            self.create_artworks(db, 10)
+            backups = BackupManager(db, backup_dir)
+            damaged = os.path.join(backup_dir, "gallery-damaged.db")
+            with open(damaged, "wb") as f:
+                f.write(b"SQLite format 3\x00" + b"\xff" * 4096)
+            
+            with pytest.raises(BackupError):
+                backups.restore(damaged)
+            
+            assert len(db.get_all_artworks()) == 10
+            assert backups.snapshots() == [damaged]
+            db.close()
+            
+        finally:
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestBackupSchedule:
+    
+    def test_snapshots_are_scheduled_only_on_request(self, app, tmp_path, monkeypatch):
+        # Окно открывает art_gallery.db в текущем каталоге
+        monkeypatch.chdir(tmp_path)
+        
+        def window_timer(**kwargs):
+            window = widgets.MainWindow(**kwargs)
+            active, interval = window.backup_timer.isActive(), window.backup_timer.interval()
+            window.change_notifier.stop()
+            window.worker.wait_for_done()
+            window.db.close()
+            return active, interval
+        
+        assert window_timer()[0] is False
+        assert window_timer(backup_interval=30) == (True, 30 * 60 * 1000)
+        
+        assert not widgets.backup_schedule_allowed(":memory:")
+        assert widgets.backup_schedule_allowed("art_gallery.db")
+        monkeypatch.setattr(widgets.os, "access", lambda path, mode: False)
+        assert window_timer(backup_interval=30)[0] is False
+        app.processEvents()
@@ -0,0 +1,59 @@
+import pytest
+import tempfile
+import os
+import json
+from database import DatabaseManager
+from benchmark import generate_artworks, compare, bench_startup, check_startup_budget, \
+    bench_import_widgets, check_deferred_imports, STARTUP_BUDGET, BASELINE_FILE, SIZES
+
+class TestBenchmarkHelpers:
+    
+    def test_generator_is_reproducible_and_valid(self):
+        first = list(generate_artworks(200, seed=7))
+        second = list(generate_artworks(200, seed=7))
+        
+        assert first == second
+        for artwork in first:
+            artwork.validate()
+        assert len({artwork.artist for artwork in first}) > 5
+    
+    def test_compare_reports_only_slowdowns(self):
+        baseline = {"db.full_load.1000": 1.0, "db.first_page.1000": 1.0}
+        results = {"db.full_load.1000": 1.6, "db.first_page.1000": 1.4, "db.new.1000": 9.0}
+        
+        assert compare(results, baseline, tolerance=0.5) == [("db.full_load.1000", 1.0, 1.6)]
+    
+    def test_startup_within_budget(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "startup.db")
+            db = DatabaseManager(db_path)
+            db.add_artworks(generate_artworks(2000))
+            db.close()
+            
+            first_paint, first_page = bench_startup(db_path)
+            
+            assert first_paint <= first_page
+            assert check_startup_budget({"gui.startup_first_paint.2000": first_paint}) == []
+            assert check_startup_budget({"gui.startup_first_paint.1": STARTUP_BUDGET + 1}) != []
+    
+    def test_baseline_covers_every_scenario_and_size(self):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+        
+        scenarios = {name.rsplit(".", 1)[0] for name in baseline
+                     if name.rsplit(".", 1)[-1].isdigit()}
+        missing = [f"{scenario}.{size}" for scenario in sorted(scenarios) for size in SIZES
+                   if f"{scenario}.{size}" not in baseline]
+        assert missing == []
+        assert "gui.import_widgets" in baseline
+    
+    def test_widgets_import_defers_heavy_modules(self):
+        seconds, modules = bench_import_widgets()
+        
+        assert seconds > 0
+        assert "table_model" in modules
+        assert check_deferred_imports(modules) == []
+        assert check_deferred_imports(["widgets", "backup"]) == ["backup"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
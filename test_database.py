@@ -2,8 +2,17 @@ import pytest
 import tempfile
 import os
 import sqlite3
-from database import DatabaseManager
-from models import Artwork
+import threading
+import time
+from datetime import datetime
+from database import DatabaseManager, DatabaseError, DuplicateError, archive_path
+import migrations
+from migrations import SCHEMA_VERSION, add_content_key, run_backfill
+from instrumentation import METRICS
+from benchmark import run_stress
+from table_model import ArtworkTableModel
+from models import Artwork, ArtworkFrame, ValidationError, validate_columns, VALID, \
+    EMPTY_TITLE, EMPTY_ARTIST, INVALID_YEAR, NEGATIVE_PRICE
 
 class TestDatabaseAddition:
     
@@ -237,5 +246,1218 @@ class TestDatabaseEdgeCases:
             except PermissionError:
                 pass
 
+class TestBulkOperations:
+    
+    def make_artworks(self, count, start=0):
+        return [
+            Artwork(None, f"Картина {i}", f"Художник {i % 7}", 1900 + i % 100,
+                    "Стиль", float(i), "")
+            for i in range(start, start + count)
+        ]
+    
+    def test_add_artworks_returns_assigned_ids(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            ids = db.add_artworks(self.make_artworks(25), chunk_size=10)
+            
+            assert len(ids) == 25
+            artworks = {artwork.id: artwork for artwork in db.get_all_artworks()}
+            assert sorted(artworks) == ids
+            assert artworks[ids[0]].title == "Картина 0"
+            assert artworks[ids[-1]].title == "Картина 24"
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_invalid_row_rolls_back_whole_batch(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            artworks = self.make_artworks(30)
+            artworks[22].title = "  "
+            
+            with pytest.raises(ValidationError, match="Строка 23"):
+                db.add_artworks(artworks, chunk_size=10)
+            
+            assert db.get_all_artworks() == []
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_failed_chunk_skipped(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            artworks = self.make_artworks(30)
+            artworks[12].price = -1
+            
+            ids = db.add_artworks(artworks, chunk_size=10, skip_failed_chunks=True)
+            
+            assert len(ids) == 20
+            titles = {artwork.title for artwork in db.get_all_artworks()}
+            assert "Картина 9" in titles
+            assert "Картина 15" not in titles
+            assert "Картина 20" in titles
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_delete_artworks(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            ids = db.add_artworks(self.make_artworks(15))
+            
+            deleted = db.delete_artworks(ids[:10] + [999], chunk_size=4)
+            
+            assert deleted == 10
+            assert sorted(artwork.id for artwork in db.get_all_artworks()) == ids[10:]
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+    def test_artworks_page_keyset(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            ids = db.add_artworks(self.make_artworks(12))
+            
+            first = db.get_artworks_page(limit=5)
+            second = db.get_artworks_page(after_id=first[-1][0], limit=5)
+            third = db.get_artworks_page(after_id=second[-1][0], limit=5)
+            
+            page_ids = [row[0] for row in first + second + third]
+            assert page_ids == sorted(ids, reverse=True)
+            assert len(third) == 2
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+    def test_artworks_frame_is_columnar(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            ids = db.add_artworks(self.make_artworks(30), chunk_size=10)
+            frame = db.get_artworks_frame(batch_size=7)
+            
+            assert len(frame) == 30
+            assert list(frame.ids) == ids
+            assert sum(frame.prices) == sum(float(i) for i in range(30))
+            assert frame.artists[0] is frame.artists[7]
+            assert frame[3].title == "Картина 3"
+            assert frame[3][3] == 1903
+            assert frame.artwork(3) == db.get_all_artworks()[-4]
+            
+            del frame[0]
+            frame[0:0] = [(0, "Новая", "Художник 0", 2000, "Стиль", 1.0, "")]
+            assert frame.row(0) == (0, "Новая", "Художник 0", 2000, "Стиль", 1.0, "")
+            assert len(frame) == 30
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestBatchValidation:
+    
+    def test_batch_matches_single_row_rules(self):
+        artworks = [
+            Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Стиль", 300.0, ""),
+            Artwork(None, "  ", "", 50, "Стиль", -1.0, ""),
+            Artwork(None, "Без автора", " ", 1900, "Стиль", 1.0, ""),
+            Artwork(None, "Из будущего", "Автор", datetime.now().year + 1, "Стиль", 1.0, ""),
+            Artwork(None, "Долг", "Автор", 1900, "Стиль", -0.01, ""),
+        ]
+        
+        checked = validate_columns([a.title for a in artworks], [a.artist for a in artworks],
+                                   [a.year for a in artworks], [a.price for a in artworks])
+        
+        assert list(checked.codes) == [VALID, EMPTY_TITLE, EMPTY_ARTIST, INVALID_YEAR,
+                                       NEGATIVE_PRICE]
+        assert list(checked.mask) == [True, False, False, False, False]
+        for artwork, message in zip(artworks, checked.messages):
+            if message is None:
+                artwork.validate()
+            else:
+                with pytest.raises(ValidationError, match=message):
+                    artwork.validate()
+    
+    def test_numpy_columns_match_lists(self):
+        np = pytest.importorskip("numpy")
+        titles = ["Подсолнухи", "  ", "Без автора", "Из будущего", "Долг", "Эскиз"]
+        artists = ["Ван Гог", "", " ", "Автор", "Автор", "Автор"]
+        years = [1888, 50, 1900, datetime.now().year + 1, 1900, 100]
+        prices = [300.0, -1.0, 1.0, 1.0, -0.01, 0.0]
+        
+        expected = validate_columns(titles, artists, years, prices)
+        checked = validate_columns(np.array(titles), np.array(artists),
+                                   np.array(years, dtype=np.int64),
+                                   np.array(prices, dtype=np.float64))
+        
+        assert list(checked.codes) == list(expected.codes)
+        assert checked.messages == expected.messages
+        assert isinstance(checked.mask, np.ndarray)
+        assert checked.mask.tolist() == expected.mask
+        assert list(checked.errors()) == list(expected.errors())
+
+class TestArtworkFrame:
+    
+    def test_as_numpy_matches_columns(self):
+        np = pytest.importorskip("numpy")
+        rows = [
+            (3, "Подсолнухи", "Ван Гог", 1888, "Постимпрессионизм", 300.0, "2024-01-01 10:00:00"),
+            (2, "Черный квадрат", "Малевич", 1915, "Супрематизм", 400.5, "2024-01-02 10:00:00"),
+            (1, "Кувшинки", "Моне", 1906, "Импрессионизм", 100.25, "2024-01-03 10:00:00"),
+        ]
+        frame = ArtworkFrame(rows)
+        del frame[1]
+        
+        columns = frame.as_numpy()
+        
+        assert columns["id"].dtype == np.int64
+        assert columns["price"].dtype == np.float64
+        assert columns["id"].tolist() == [row[0] for row in (rows[0], rows[2])]
+        assert columns["year"].tolist() == [frame.value(index, 3) for index in range(len(frame))]
+        assert columns["price"].tolist() == [frame.value(index, 5) for index in range(len(frame))]
+        # Векторный фильтр по колонкам выбирает те же строки, что и обход списка
+        expensive = np.nonzero(columns["price"] > 200)[0].tolist()
+        assert [frame.artwork(index).title for index in expensive] == ["Подсолнухи"]
+        
+        # Массивы — копии: рамку можно менять дальше, они остаются прежними
+        frame.append(rows[1])
+        frame[0:1] = [rows[1]]
+        del frame[0]
+        assert columns["id"].tolist() == [3, 1]
+        assert [frame.value(index, 0) for index in range(len(frame))] == [1, 2]
+    
+    def test_slice_assignment_matches_list(self):
+        rows = [(i, f"Картина {i}", "Автор", 1900 + i, "Стиль", float(i), "") for i in range(6)]
+        extra = (10, "Со сниппетом", "Автор", 2000, "Стиль", 1.0, "", "[сниппет]")
+        for start, stop, replacement in ((1, 3, [extra]), (2, 2, rows[:2]), (4, 1, [rows[5]]),
+                                         (0, 6, [])):
+            frame = ArtworkFrame(rows)
+            expected = list(rows)
+            frame[start:stop] = replacement
+            expected[start:stop] = replacement
+            assert [frame.row(index) for index in range(len(frame))] == \
+                [row[:7] for row in expected]
+            assert [frame.value(index, 7) for index in range(len(frame))] == \
+                [row[7] if len(row) > 7 else None for row in expected]
+
+class TestQueryArtworks:
+    
+    def make_artworks(self):
+        return [
+            Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Постимпрессионизм", 300.0, ""),
+            Artwork(None, "Звездная ночь", "Ван Гог", 1889, "Постимпрессионизм", 500.0, ""),
+            Artwork(None, "Черный квадрат", "Малевич", 1915, "Супрематизм", 400.0, ""),
+            Artwork(None, "Композиция VIII", "Кандинский", 1923, "Абстракционизм", 200.0, ""),
+            Artwork(None, "Красный квадрат", "Малевич", 1915, "Супрематизм", 100.0, ""),
+        ]
+    
+    def test_filters(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            db.add_artworks(self.make_artworks())
+            
+            titles = lambda rows: [row[1] for row in rows]
+            assert titles(db.query_artworks(artist="Ван Гог")) == ["Звездная ночь", "Подсолнухи"]
+            assert db.query_artworks(artist="Ван") == []
+            assert titles(db.query_artworks(style="Супрематизм", price_from=200)) == ["Черный квадрат"]
+            assert len(db.query_artworks(year_from=1889, year_to=1915)) == 3
+            assert db.query_artworks(artist="Пикассо") == []
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_sort_and_keyset_pagination(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            db.add_artworks(self.make_artworks())
+            
+            first = db.query_artworks(order_by="year", descending=False, limit=2)
+            after = (first[-1][3], first[-1][0])
+            second = db.query_artworks(order_by="year", descending=False, after=after, limit=2)
+            third = db.query_artworks(order_by="year", descending=False,
+                                      after=(second[-1][3], second[-1][0]), limit=2)
+            
+            years = [row[3] for row in first + second + third]
+            assert years == [1888, 1889, 1915, 1915, 1923]
+            assert len({row[0] for row in first + second + third}) == 5
+            
+            with pytest.raises(DatabaseError):
+                db.query_artworks(order_by="title; DROP TABLE artworks")
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_filter_uses_index(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            with db.pool.connection() as conn:
+                plan = conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT id FROM artworks WHERE year >= ? AND year <= ?",
+                    (1900, 1950)).fetchall()
+            assert "idx_artworks_year" in plan[0][3]
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_artist_and_style_filters_skip_sort(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            db.add_artworks(self.make_artworks())
+            
+            with db.pool.connection() as conn:
+                statements = []
+                conn.set_trace_callback(statements.append)
+                db.query_artworks(artist="Малевич")
+                db.query_artworks(style="Супрематизм", year_from=1900)
+                conn.set_trace_callback(None)
+                plans = [conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+                         for statement in statements if statement.lstrip().startswith("SELECT")]
+            assert len(plans) == 2
+            for plan in plans:
+                details = " ".join(row[3] for row in plan)
+                assert "TEMP B-TREE" not in details
+                assert "USING INDEX" in details
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestSearch:
+    
+    def test_search_cyrillic_and_latin(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            db.add_artworks([
+                Artwork(None, "Звёздная ночь", "Винсент Ван Гог", 1889, "Постимпрессионизм", 1.0, ""),
+                Artwork(None, "Café Terrace", "Van Gogh", 1888, "Post-Impressionism", 1.0, ""),
+                Artwork(None, "Черный квадрат", "Малевич", 1915, "Супрематизм", 1.0, ""),
+            ])
+            
+            assert [row[1] for row in db.search("ван гог")] == ["Звёздная ночь"]
+            assert [row[1] for row in db.search("VAN")] == ["Café Terrace"]
+            assert [row[1] for row in db.search("звезд")] == ["Звёздная ночь"]
+            assert [row[1] for row in db.search("cafe")] == ["Café Terrace"]
+            assert "[" in db.search("квадрат")[0][7]
+            assert db.search("   ") == []
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_search_index_follows_changes(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            artwork_id = db.add_artwork(
+                Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Постимпрессионизм", 1.0, ""))
+            
+            assert len(db.search("подсолн")) == 1
+            
+            db.delete_artwork(artwork_id)
+            
+            assert db.search("подсолн") == []
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_existing_rows_indexed_on_upgrade(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            conn = sqlite3.connect(db_path)
+            conn.execute('''
+                CREATE TABLE artworks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    artist TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    style TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute("INSERT INTO artworks (title, artist, year, style, price, created_at) "
+                         "VALUES ('Мона Лиза', 'Леонардо', 1503, 'Ренессанс', 1.0, '01.01.2024 10:00')")
+            conn.commit()
+            conn.close()
+            
+            db = DatabaseManager(db_path)
+            
+            assert [row[1] for row in db.search("леонардо")] == ["Мона Лиза"]
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestChangeTracking:
+    
+    def test_changes_since(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            first_id = db.add_artwork(Artwork(None, "Первая", "Художник", 2000, "Стиль", 1.0, ""))
+            seq = db.get_change_seq()
+            
+            second_id = db.add_artwork(Artwork(None, "Вторая", "Художник", 2001, "Стиль", 2.0, ""))
+            db.delete_artwork(first_id)
+            
+            last_seq, rows, deleted_ids = db.get_changes_since(seq)
+            
+            assert last_seq == db.get_change_seq()
+            assert [row[0] for row in rows] == [second_id]
+            assert rows[0][1] == "Вторая"
+            assert deleted_ids == [first_id]
+            assert db.get_changes_since(last_seq) == (last_seq, [], [])
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_changes_over_limit_require_reload(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            seq = db.get_change_seq()
+            for i in range(5):
+                db.add_artwork(Artwork(None, f"Картина {i}", "Художник", 2000, "Стиль", 1.0, ""))
+            
+            assert db.get_changes_since(seq, limit=3) is None
+            assert len(db.get_changes_since(seq, limit=5)[1]) == 5
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_changes_read_does_not_wait_for_writer(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            artwork_id = db.add_artwork(Artwork(None, "Первая", "Художник", 2000, "Стиль", 1.0, ""))
+            writer = sqlite3.connect(db_path, isolation_level=None)
+            try:
+                writer.execute("BEGIN IMMEDIATE")
+                writer.execute("DELETE FROM artworks")
+                
+                # Чтение журнала не берёт блокировку записи и не видит незафиксированное
+                started = time.perf_counter()
+                _, rows, deleted_ids = db.get_changes_since(0)
+                assert time.perf_counter() - started < 1.0
+                assert [row[0] for row in rows] == [artwork_id]
+                assert deleted_ids == []
+                writer.execute("ROLLBACK")
+            finally:
+                writer.close()
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestMigrations:
+    
+    def create_legacy_database(self, db_path, rows):
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE artworks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                style TEXT NOT NULL,
+                price REAL NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        conn.executemany("INSERT INTO artworks (title, artist, year, style, price, created_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+    
+    def test_legacy_timestamps_converted_to_iso(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            self.create_legacy_database(db_path, [
+                ("Первая", "Художник", 2000, "Стиль", 1.0, "06.11.2025 15:29"),
+                ("Вторая", "Художник", 2000, "Стиль", 1.0, "18.01.2024 09:05"),
+            ])
+            
+            db = DatabaseManager(db_path)
+            
+            created = {artwork.title: artwork.created_at for artwork in db.get_all_artworks()}
+            assert created == {"Первая": "2025-11-06 15:29:00", "Вторая": "2024-01-18 09:05:00"}
+            with db.pool.connection() as conn:
+                assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+            db.close()
+            
+            db = DatabaseManager(db_path)
+            assert len(db.get_all_artworks()) == 2
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_created_at_range_uses_index(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            self.create_legacy_database(db_path, [
+                ("Старая", "Художник", 2000, "Стиль", 1.0, "31.12.2023 23:59"),
+                ("Новая", "Художник", 2000, "Стиль", 1.0, "01.01.2024 00:00"),
+            ])
+            
+            db = DatabaseManager(db_path)
+            
+            rows = db.query_artworks(created_from=datetime(2024, 1, 1), order_by="created_at")
+            assert [row[1] for row in rows] == ["Новая"]
+            
+            with db.pool.connection() as conn:
+                plan = conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT id FROM artworks "
+                    "ORDER BY created_at DESC, id DESC LIMIT 10").fetchall()
+            assert "idx_artworks_created_at" in plan[0][3]
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_failed_migration_is_rolled_back(self, monkeypatch):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            self.create_legacy_database(db_path, [
+                ("Первая", "Художник", 2000, "Стиль", 1.0, "06.11.2025 15:29"),
+            ])
+            
+            def failing_migration(conn):
+                conn.execute("ALTER TABLE artworks ADD COLUMN broken TEXT")
+                raise sqlite3.OperationalError("disk I/O error")
+            
+            monkeypatch.setattr(migrations, "MIGRATIONS",
+                                migrations.MIGRATIONS[:4] + (failing_migration,))
+            with pytest.raises(DatabaseError):
+                DatabaseManager(db_path)
+            
+            conn = sqlite3.connect(db_path)
+            try:
+                assert conn.execute("PRAGMA user_version").fetchone()[0] == 4
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(artworks)")]
+                assert "broken" not in columns
+            finally:
+                conn.close()
+            
+            # Сбой не оставляет базу в промежуточном состоянии: следующий запуск дописывает схему
+            monkeypatch.undo()
+            db = DatabaseManager(db_path)
+            assert db.get_all_artworks()[0].created_at == "2025-11-06 15:29:00"
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_backfill_resumes_after_interruption(self, monkeypatch):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            self.create_legacy_database(db_path, [
+                (f"Картина {i}", "Художник", 2000, "Стиль", 1.0, "06.11.2025 15:29")
+                for i in range(25)
+            ])
+            monkeypatch.setattr(migrations, "MIGRATION_BATCH_SIZE", 10)
+            content_hash = migrations._content_hash
+            calls = []
+            
+            def failing_hash(title, artist, year):
+                calls.append(title)
+                if len(calls) > 10:
+                    raise OSError("процесс прерван")
+                return content_hash(title, artist, year)
+            
+            monkeypatch.setattr(migrations, "_content_hash", failing_hash)
+            with pytest.raises(DatabaseError):
+                DatabaseManager(db_path)
+            
+            conn = sqlite3.connect(db_path)
+            try:
+                # Первая пачка уже зафиксирована, но номер версии ещё не записан
+                version = migrations.MIGRATIONS.index(migrations.add_content_key)
+                assert conn.execute("PRAGMA user_version").fetchone()[0] == version
+                assert conn.execute("SELECT COUNT(*) FROM artworks "
+                                    "WHERE content_key IS NOT NULL").fetchone()[0] == 10
+                assert conn.execute("SELECT COUNT(*) FROM artworks "
+                                    "WHERE created_at LIKE '2025-%'").fetchone()[0] == 25
+            finally:
+                conn.close()
+            
+            monkeypatch.setattr(migrations, "_content_hash", content_hash)
+            db = DatabaseManager(db_path)
+            with db.pool.connection() as conn:
+                assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+                assert conn.execute("SELECT COUNT(*) FROM artworks "
+                                    "WHERE content_key IS NULL").fetchone()[0] == 0
+            assert len(db.get_all_artworks()) == 25
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestDuplicates:
+    
+    def test_insert_policies(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            artwork_id = db.add_artwork(
+                Artwork(None, "Звёздная ночь", "Ван Гог", 1889, "Постимпрессионизм", 100.0, ""))
+            # Регистр, пробелы и «ё» ключ не меняют
+            same = Artwork(None, "  звездная   НОЧЬ ", "ван гог", 1889, "Импрессионизм", 250.0, "")
+            
+            with pytest.raises(DuplicateError) as error:
+                db.add_artwork(same)
+            assert error.value.artwork_id == artwork_id
+            assert db.add_artwork(same, duplicates="skip") == artwork_id
+            assert db.get_artwork(artwork_id).price == 100.0
+            assert db.add_artwork(same, duplicates="upsert") == artwork_id
+            assert db.get_artwork(artwork_id).price == 250.0
+            assert len(db.get_all_artworks()) == 1
+            
+            other_year = Artwork(None, "Звёздная ночь", "Ван Гог", 1890, "Стиль", 1.0, "")
+            assert db.add_artwork(other_year) != artwork_id
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_bulk_insert_handles_duplicates_in_batch_and_table(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            existing_id = db.add_artwork(Artwork(None, "Старая", "Художник", 2000, "Стиль", 1.0, ""))
+            batch = [
+                Artwork(None, "Новая", "Художник", 2000, "Стиль", 2.0, ""),
+                Artwork(None, "СТАРАЯ", "Художник", 2000, "Стиль", 3.0, ""),
+                Artwork(None, "новая", "Художник", 2000, "Стиль", 4.0, ""),
+            ]
+            
+            with pytest.raises(DuplicateError):
+                db.add_artworks(batch)
+            assert len(db.get_all_artworks()) == 1
+            
+            ids = db.add_artworks(batch, duplicates="skip")
+            assert len(ids) == 1
+            assert db.get_artwork(ids[0]).price == 2.0
+            
+            ids = db.add_artworks(batch + [Artwork(None, "Третья", "Художник", 2000, "Стиль",
+                                                   5.0, "")], duplicates="upsert")
+            assert ids[1:3] == [existing_id, ids[0]]
+            prices = {artwork.title: artwork.price for artwork in db.get_all_artworks()}
+            assert prices == {"СТАРАЯ": 3.0, "новая": 4.0, "Третья": 5.0}
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_merge_duplicates(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = db.add_artworks([
+                Artwork(None, "Пейзаж", "Художник", 1900, "Стиль", 1.0, ""),
+                Artwork(None, "Портрет", "Художник", 1900, "Стиль", 2.0, ""),
+            ])
+            # Дубликаты, накопившиеся в обход проверки при вставке
+            with db.pool.connection() as conn:
+                conn.execute("UPDATE artworks SET title = 'ПЕЙЗАЖ', image_hash = 'abc' "
+                             "WHERE id = ?", (ids[1],))
+                conn.execute("UPDATE artworks SET content_key = (SELECT content_key FROM artworks "
+                             "WHERE id = ?) WHERE id = ?", (ids[0], ids[1]))
+            db.cache.invalidate()
+            
+            assert db.merge_duplicates() == (1, 1)
+            
+            artworks = db.get_all_artworks()
+            assert [(a.id, a.title, a.price) for a in artworks] == [(ids[0], "ПЕЙЗАЖ", 2.0)]
+            assert db.get_image_hashes(ids) == {ids[0]: "abc"}
+            assert db.merge_duplicates() == (0, 0)
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_content_key_backfilled_for_legacy_rows(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            TestMigrations().create_legacy_database(db_path, [
+                ("Пейзаж", "Художник", 1900, "Стиль", 1.0, "06.11.2025 15:29"),
+                ("пейзаж ", "Художник", 1900, "Стиль", 2.0, "07.11.2025 15:29"),
+            ])
+            
+            db = DatabaseManager(db_path)
+            
+            with db.pool.connection() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM artworks "
+                                    "WHERE content_key IS NULL").fetchone()[0] == 0
+                # Заполнение служебного ключа не попадает в журнал изменений окон
+                seq = db.get_change_seq()
+                conn.execute("UPDATE artworks SET content_key = NULL")
+                run_backfill(conn, *add_content_key(conn))
+                assert db.get_change_seq() == seq
+            assert db.merge_duplicates() == (1, 1)
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestArchive:
+    
+    def create_artworks(self, db, count):
+        return db.add_artworks(Artwork(None, f"Работа {i}", "Художник", 1900 + i, "Стиль",
+                                       float(i), "") for i in range(count))
+    
+    def test_archive_moves_flagged_and_old_rows(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = self.create_artworks(db, 10)
+            with db.transaction() as conn:
+                conn.execute("UPDATE artworks SET created_at = '2001-01-01 00:00:00' "
+                             "WHERE id IN (?, ?, ?)", ids[:3])
+            assert db.mark_archived(ids[8:]) == 2
+            
+            assert db.archive_artworks(before=datetime(2010, 1, 1), batch_size=2) == 5
+            
+            assert sorted(a.id for a in db.get_all_artworks()) == ids[3:8]
+            assert [a.id for a in db.get_all_artworks(include_archive=True)] == ids[::-1]
+            assert db.get_artwork(ids[0]) is None
+            assert db.get_artwork(ids[0], include_archive=True).title == "Работа 0"
+            # Сводки и поиск описывают только активную коллекцию
+            with db.pool.connection() as conn:
+                assert conn.execute("SELECT SUM(count) FROM style_stats").fetchone()[0] == 5
+            assert db.search("Работа 9") == []
+            assert [row[0] for row in db.search("Работа 9", include_archive=True)] == [ids[9]]
+            # Повторный перенос ничего не находит
+            assert db.archive_artworks(before="2010-01-01") == 0
+            # Опечатка в дате — ошибка, а не перенос всей коллекции
+            for before in ("yesterday", "2024/01/01"):
+                with pytest.raises(DatabaseError):
+                    db.archive_artworks(before=before)
+            assert sorted(a.id for a in db.get_all_artworks()) == ids[3:8]
+            db.close()
+            
+        finally:
+            for path in (db_path, archive_path(db_path)):
+                try:
+                    if os.path.exists(path):
+                        os.unlink(path)
+                except PermissionError:
+                    pass
+    
+    def test_archive_file_created_on_first_use(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = self.create_artworks(db, 3)
+            assert len(db.get_all_artworks(include_archive=True)) == 3
+            assert db.delete_artwork(ids[2]) == 1
+            assert not os.path.exists(archive_path(db_path))
+            
+            # Соединение, выданное до появления архива, подключает его при следующем запросе
+            db.mark_archived(ids[:1])
+            assert db.archive_artworks() == 1
+            assert os.path.exists(archive_path(db_path))
+            assert len(db.get_all_artworks(include_archive=True)) == 2
+            db.close()
+            
+            other = DatabaseManager(db_path)
+            assert [a.id for a in other.get_all_artworks(include_archive=True)] == ids[1::-1]
+            other.close()
+            
+        finally:
+            for path in (db_path, archive_path(db_path)):
+                try:
+                    if os.path.exists(path):
+                        os.unlink(path)
+                except PermissionError:
+                    pass
+    
+    def test_include_archive_pages_merge_both_tables(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = self.create_artworks(db, 20)
+            db.mark_archived(ids[::3])
+            db.archive_artworks()
+            
+            pages = []
+            after = None
+            while True:
+                rows = db.query_artworks(order_by="price", descending=False, after=after,
+                                         limit=6, include_archive=True)
+                if not rows:
+                    break
+                pages.extend(row[0] for row in rows)
+                after = (rows[-1][5], rows[-1][0])
+            
+            assert pages == ids
+            assert len(db.query_artworks(limit=100)) == 20 - len(ids[::3])
+            assert [row[0] for row in db.get_artworks_page(ids[5], 3, include_archive=True)] == \
+                [ids[4], ids[3], ids[2]]
+            db.close()
+            
+        finally:
+            for path in (db_path, archive_path(db_path)):
+                try:
+                    if os.path.exists(path):
+                        os.unlink(path)
+                except PermissionError:
+                    pass
+    
+    def test_restore_and_delete_archived_rows(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = self.create_artworks(db, 5)
+            db.mark_archived(ids[:3])
+            db.archive_artworks()
+            seq = db.get_change_seq()
+            
+            # Перенос в архив для окна с архивом — изменение строки, а не удаление
+            changes = db.get_changes_since(seq - 3, include_archive=True)
+            assert sorted(row[0] for row in changes[1]) == ids[:3]
+            assert changes[2] == []
+            
+            assert db.restore_artworks([ids[0]]) == 1
+            assert db.search("Работа 0")[0][0] == ids[0]
+            assert db.delete_artwork(ids[1]) == 1
+            assert db.delete_artworks([ids[2], ids[3]]) == 2
+            
+            assert [a.id for a in db.get_all_artworks(include_archive=True)] == [ids[4], ids[0]]
+            _, rows, deleted_ids = db.get_changes_since(seq, include_archive=True)
+            assert sorted(deleted_ids) == ids[1:4]
+            db.close()
+            
+        finally:
+            for path in (db_path, archive_path(db_path)):
+                try:
+                    if os.path.exists(path):
+                        os.unlink(path)
+                except PermissionError:
+                    pass
+    
+    def test_restore_keeps_rows_whose_id_is_taken(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = self.create_artworks(db, 3)
+            db.mark_archived(ids)
+            db.archive_artworks()
+            # Сбой между коммитами оставляет строку и в основной таблице, и в архиве
+            with db.transaction() as conn:
+                conn.execute("INSERT INTO artworks (id, title, artist, year, style, price, "
+                             "created_at) VALUES (?, 'Копия', 'Автор', 2000, 'Стиль', 1, "
+                             "'2024-01-01 00:00:00')", (ids[1],))
+            
+            assert db.restore_artworks(ids) == 2
+            
+            assert sorted(a.id for a in db.get_all_artworks()) == ids
+            assert db.get_artwork(ids[1]).title == "Копия"
+            with db.pool.connection() as conn:
+                archived = [row[0] for row in conn.execute("SELECT id FROM archive.artworks")]
+            assert archived == [ids[1]]
+            db.close()
+            
+        finally:
+            for path in (db_path, archive_path(db_path)):
+                try:
+                    if os.path.exists(path):
+                        os.unlink(path)
+                except PermissionError:
+                    pass
+    
+    def test_restored_rows_reappear_in_table_model(self):
+        db = DatabaseManager(":memory:")
+        ids = self.create_artworks(db, 5)
+        db.mark_archived([ids[1]])
+        db.archive_artworks()
+        model = ArtworkTableModel(db, page_size=2)
+        model.reload()
+        while model.canFetchMore():
+            model.fetchMore()
+        assert [model.artwork_id(row) for row in range(model.rowCount())] == \
+            [ids[4], ids[3], ids[2], ids[0]]
+        
+        # Возвращённая строка сохраняет старый id и встаёт на своё место, а не вверх таблицы
+        db.restore_artworks([ids[1]])
+        model.refresh()
+        
+        assert [model.artwork_id(row) for row in range(model.rowCount())] == ids[::-1]
+        assert model.artwork_title(3) == "Работа 1"
+        db.close()
+
+class TestQueryCache:
+    
+    def test_repeated_query_served_from_cache(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            db.add_artwork(Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Стиль", 300.0, ""))
+            
+            first = db.query_artworks(artist="Ван Гог")
+            first.clear()
+            second = db.query_artworks("Ван Гог")
+            
+            assert len(second) == 1
+            stats = db.cache.stats()
+            assert stats["hits"] == 1
+            assert stats["misses"] == 1
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_writes_invalidate_cache(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            artwork_id = db.add_artwork(Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Стиль",
+                                                300.0, ""))
+            assert len(db.get_all_artworks()) == 1
+            
+            db.add_artwork(Artwork(None, "Кувшинки", "Моне", 1906, "Стиль", 100.0, ""))
+            assert len(db.get_all_artworks()) == 2
+            db.delete_artwork(artwork_id)
+            assert len(db.get_all_artworks()) == 1
+            
+            # Запись из другого процесса видна через PRAGMA data_version
+            conn = sqlite3.connect(db_path)
+            conn.execute("DELETE FROM artworks")
+            conn.commit()
+            conn.close()
+            assert db.get_all_artworks() == []
+            assert db.cache.stats()["hits"] == 0
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_lru_eviction(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path, cache_size=2)
+            
+            for year in (1900, 1901, 1902):
+                db.query_artworks(year_from=year)
+            db.query_artworks(year_from=1902)
+            db.query_artworks(year_from=1900)
+            
+            stats = db.cache.stats()
+            assert stats["entries"] == 2
+            assert stats["evictions"] == 2
+            assert stats["hits"] == 1
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestConcurrentWriters:
+    
+    def test_write_retries_while_database_is_locked(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path, pragmas={"journal_mode": "WAL", "busy_timeout": 10})
+            blocker = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+            blocker.execute("BEGIN IMMEDIATE")
+            release = threading.Timer(0.3, blocker.rollback)
+            release.start()
+            retries = METRICS.snapshot()["busy_retries"]
+            
+            artwork_id = db.add_artwork(Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Стиль",
+                                                300.0, ""))
+            
+            release.join()
+            blocker.close()
+            assert artwork_id == 1
+            assert METRICS.snapshot()["busy_retries"] > retries
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_parallel_processes_keep_integrity(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stress = run_stress(os.path.join(tmp_dir, "stress.db"), processes=4, operations=50)
+            
+            assert stress["integrity"] == "ok"
+            assert stress["rows"] == stress["expected_rows"]
+            assert stress["summarized_rows"] == stress["rows"]
+
+class TestConnectionPool:
+    
+    def test_connection_reused_between_operations(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            
+            with db.pool.connection() as first:
+                pass
+            db.add_artwork(Artwork(None, "Картина", "Художник", 2000, "Стиль", 10.0, ""))
+            db.get_all_artworks()
+            with db.pool.connection() as second:
+                pass
+            
+            assert first is second
+            assert db.pool._created == 1
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_pragmas_applied(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path, pragmas={"journal_mode": "WAL", "synchronous": "NORMAL"})
+            
+            with db.pool.connection() as conn:
+                assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+                assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_pool_is_bounded(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path, pool_size=1)
+            db.pool.timeout = 0.1
+            
+            conn = db.pool.checkout()
+            with pytest.raises(DatabaseError):
+                db.pool.checkout()
+            db.pool.checkin(conn)
+            
+            assert db.pool.checkout() is conn
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
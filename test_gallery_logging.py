@@ -0,0 +1,53 @@
+import pytest
+import tempfile
+import os
+import json
+import logging
+from database import DatabaseManager
+from gallery_logging import setup_logging, shutdown_logging
+from models import Artwork
+
+class TestLoggingPipeline:
+    
+    def test_activity_and_audit_logs_are_utf8(self):
+        tmp_dir = tempfile.mkdtemp()
+        log_file = os.path.join(tmp_dir, "activity.log")
+        audit_file = os.path.join(tmp_dir, "audit.jsonl")
+        
+        try:
+            setup_logging(log_file, audit_file=audit_file)
+            db = DatabaseManager(os.path.join(tmp_dir, "gallery.db"))
+            
+            artwork_id = db.add_artwork(
+                Artwork(None, "Звёздная ночь", "Ван Гог", 1889, "Постимпрессионизм", 1.0, ""))
+            db.delete_artwork(artwork_id)
+            logging.info("Not an audit event")
+            db.close()
+        finally:
+            shutdown_logging()
+        
+        with open(log_file, encoding="utf-8") as f:
+            activity = f.read()
+        assert "Added artwork: Звёздная ночь by Ван Гог" in activity
+        assert f"Deleted artwork with ID: {artwork_id}" in activity
+        
+        with open(audit_file, encoding="utf-8") as f:
+            events = [json.loads(line) for line in f]
+        assert [event["action"] for event in events] == ["add", "delete"]
+        assert events[0]["title"] == "Звёздная ночь"
+        assert events[1]["id"] == artwork_id
+    
+    def test_setup_is_idempotent(self):
+        tmp_dir = tempfile.mkdtemp()
+        
+        try:
+            first = setup_logging(os.path.join(tmp_dir, "first.log"))
+            second = setup_logging(os.path.join(tmp_dir, "second.log"))
+            assert first is second
+        finally:
+            shutdown_logging()
+        
+        assert not os.path.exists(os.path.join(tmp_dir, "second.log"))
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,109 @@
+import pytest
+import tempfile
+import os
+import hashlib
+import shutil
+from PySide6.QtGui import QImage, QColor
+from database import DatabaseManager
+from image_store import ImageStore, ImageError, MMAP_THRESHOLD, THUMBNAIL_SIZE, \
+    make_thumbnail, attach_image
+from models import Artwork
+
+class TestImageStore:
+    
+    def create_image(self, path, width, height, color="red"):
+        image = QImage(width, height, QImage.Format_RGB32)
+        image.fill(QColor(color))
+        assert image.save(path)
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    
+    def test_add_is_content_addressed(self):
+        root = tempfile.mkdtemp()
+        try:
+            store = ImageStore(os.path.join(root, "images"))
+            small = os.path.join(root, "small.png")
+            copy = os.path.join(root, "copy.png")
+            # BMP без сжатия больше порога и читается через mmap
+            large = os.path.join(root, "large.bmp")
+            small_digest = self.create_image(small, 40, 30)
+            shutil.copyfile(small, copy)
+            large_digest = self.create_image(large, 800, 600, "blue")
+            assert os.path.getsize(large) >= MMAP_THRESHOLD
+            
+            assert store.add(small) == small_digest
+            assert store.add(copy) == small_digest
+            assert store.add(large) == large_digest
+            
+            originals = os.path.join(root, "images", "originals")
+            assert sum(len(files) for _, _, files in os.walk(originals)) == 2
+            with open(store.original_path(large_digest), "rb") as f:
+                assert hashlib.sha256(f.read()).hexdigest() == large_digest
+            
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    
+    def test_add_rejects_non_images(self):
+        root = tempfile.mkdtemp()
+        try:
+            store = ImageStore(os.path.join(root, "images"))
+            path = os.path.join(root, "notes.png")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("не картинка")
+            
+            with pytest.raises(ImageError):
+                store.add(path)
+            assert not os.path.exists(os.path.join(root, "images"))
+            
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    
+    def test_thumbnail_keeps_aspect_ratio(self):
+        root = tempfile.mkdtemp()
+        try:
+            store = ImageStore(os.path.join(root, "images"))
+            path = os.path.join(root, "wide.jpg")
+            self.create_image(path, 1200, 600)
+            digest = store.add(path)
+            
+            assert not store.has_thumbnail(digest)
+            make_thumbnail(store.original_path(digest), store.thumbnail_path(digest))
+            assert store.has_thumbnail(digest)
+            
+            thumbnail = QImage(store.thumbnail_path(digest))
+            assert (thumbnail.width(), thumbnail.height()) == (THUMBNAIL_SIZE, THUMBNAIL_SIZE // 2)
+            
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    
+    def test_attach_image_references_hash(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        root = tempfile.mkdtemp()
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            store = ImageStore.for_database(db_path)
+            first, second = db.add_artworks([
+                Artwork(None, "Первая", "Художник", 2000, "Стиль", 1.0, ""),
+                Artwork(None, "Вторая", "Художник", 2000, "Стиль", 1.0, ""),
+            ])
+            path = os.path.join(root, "image.png")
+            self.create_image(path, 10, 10)
+            
+            digest = attach_image(db, store, first, path)
+            
+            assert db.get_image_hashes([first, second]) == {first: digest}
+            assert os.path.exists(store.original_path(digest))
+            with pytest.raises(ImageError):
+                attach_image(db, store, second + 100, path)
+            db.close()
+            
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+            shutil.rmtree(os.path.splitext(db_path)[0] + ".images", ignore_errors=True)
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
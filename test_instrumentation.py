@@ -0,0 +1,75 @@
+import pytest
+import tempfile
+import os
+import logging
+import instrumentation
+from database import DatabaseManager
+from instrumentation import METRICS, LatencyHistogram
+from models import Artwork
+
+class TestLatencyHistogram:
+    
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for elapsed_ms in [0.05] * 90 + [7] * 9 + [700]:
+            histogram.add(elapsed_ms)
+        
+        assert histogram.count == 100
+        assert histogram.percentile(0.5) == 0.1
+        assert histogram.percentile(0.95) == 10
+        assert histogram.percentile(1.0) == 700
+        assert histogram.max_ms == 700
+
+class TestDatabaseMetrics:
+    
+    def test_operations_recorded(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            METRICS.reset()
+            
+            db.add_artworks([Artwork(None, f"Картина {i}", "Художник", 2000, "Стиль", 1.0, "")
+                             for i in range(5)])
+            db.get_all_artworks()
+            
+            operations = METRICS.snapshot()["operations"]
+            assert operations["add_artworks"]["count"] == 1
+            assert operations["add_artworks"]["rows_written"] == 5
+            assert operations["get_all_artworks"]["rows_read"] == 5
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_slow_query_logged_with_plan(self, monkeypatch, caplog):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0)
+            
+            with caplog.at_level(logging.WARNING):
+                db.query_artworks(year_from=1900)
+            
+            messages = [record.getMessage() for record in caplog.records]
+            slow = [message for message in messages if message.startswith("Slow query")]
+            assert slow
+            assert "artworks" in slow[0].split("plan: ")[1]
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,170 @@
+import pytest
+import tempfile
+import os
+import json
+import asyncio
+import threading
+import http.client
+from urllib.parse import quote
+from database import DatabaseManager
+from models import Artwork
+from server import GalleryServer, STREAM_BATCH
+
+class TestGalleryServer:
+    
+    def start_server(self, db):
+        loop = asyncio.new_event_loop()
+        server = GalleryServer(db, max_workers=2)
+        port = loop.run_until_complete(server.start("127.0.0.1", 0))
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        
+        def stop():
+            asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        
+        return port, stop
+    
+    def request(self, connection, path, headers=None):
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        body = response.read()
+        return response, json.loads(body) if body else None
+    
+    def test_list_lookup_and_etag(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = db.add_artworks([
+                Artwork(None, f"Картина {i}", "Ван Гог", 1880 + i % 10, "Стиль", float(i), "")
+                for i in range(STREAM_BATCH + 20)
+            ])
+            port, stop = self.start_server(db)
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            
+            response, page = self.request(connection, "/artworks?limit=3")
+            assert response.status == 200
+            assert [item["id"] for item in page["items"]] == ids[-1:-4:-1]
+            etag = response.getheader("ETag")
+            
+            response, page = self.request(connection, "/artworks?limit=3&after=" + quote(page["next"]))
+            assert [item["id"] for item in page["items"]] == ids[-4:-7:-1]
+            
+            # Большая страница уходит чанками и остаётся корректным JSON
+            response, page = self.request(connection, f"/artworks?limit={STREAM_BATCH + 20}")
+            assert response.getheader("Transfer-Encoding") == "chunked"
+            assert len(page["items"]) == STREAM_BATCH + 20
+            assert page["next"] is not None
+            
+            response, artwork = self.request(connection, f"/artworks/{ids[0]}")
+            assert artwork["title"] == "Картина 0"
+            response, error = self.request(connection, "/artworks/999999")
+            assert response.status == 404
+            
+            response, _ = self.request(connection, "/artworks?limit=3",
+                                       {"If-None-Match": etag})
+            assert response.status == 304
+            db.delete_artwork(ids[0])
+            response, _ = self.request(connection, "/artworks?limit=3",
+                                       {"If-None-Match": etag})
+            assert response.status == 200
+            assert response.getheader("ETag") != etag
+            
+            connection.close()
+            stop()
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_search_stats_and_errors(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            db.add_artworks([
+                Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Постимпрессионизм", 300.0, ""),
+                Artwork(None, "Кувшинки", "Моне", 1906, "Импрессионизм", 100.0, ""),
+            ])
+            port, stop = self.start_server(db)
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            
+            response, found = self.request(connection, "/search?q=%D0%BF%D0%BE%D0%B4%D1%81")
+            assert [item["title"] for item in found["items"]] == ["Подсолнухи"]
+            
+            response, stats = self.request(connection, "/stats")
+            assert stats["count"] == 2
+            assert stats["value"] == 400.0
+            assert stats["decades"] == [{"decade": 1880, "count": 1},
+                                        {"decade": 1900, "count": 1}]
+            
+            response, error = self.request(connection, "/artworks?year_from=abc")
+            assert response.status == 400
+            response, error = self.request(connection, "/artworks?order_by=secret")
+            assert response.status == 400
+            for cursor in ("[[1],2]", "[1,{}]", "[1,2,3]", "12", "oops"):
+                response, error = self.request(connection, f"/artworks?after={quote(cursor)}")
+                assert response.status == 400
+            
+            connection.request("DELETE", "/artworks/1")
+            response = connection.getresponse()
+            response.read()
+            assert response.status == 405
+            
+            connection.close()
+            stop()
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+    
+    def test_out_of_range_numbers_and_crashes_get_a_response(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            db.add_artworks([Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Стиль", 1.0, "")])
+            port, stop = self.start_server(db)
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            
+            huge = "9" * 23
+            for path in (f"/artworks/{huge}", f"/artworks?year_from={huge}",
+                         f"/artworks?after={quote(f'[{huge},1]')}"):
+                response, error = self.request(connection, path)
+                assert response.status == 400
+                assert "error" in error
+            
+            def broken(artwork_id):
+                raise RuntimeError("сбой")
+            
+            db.get_artwork = broken
+            response, error = self.request(connection, "/artworks/1")
+            assert response.status == 500
+            # Соединение не оборвано: следующий запрос идёт по нему же
+            response, page = self.request(connection, "/artworks")
+            assert [item["title"] for item in page["items"]] == ["Подсолнухи"]
+            
+            connection.close()
+            stop()
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
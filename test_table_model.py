@@ -0,0 +1,226 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+import pytest
+import tempfile
+import threading
+import time
+from PySide6.QtCore import Qt
+from database import DatabaseManager
+from models import Artwork
+from table_model import ArtworkTableModel
+from workers import DatabaseWorker, ChangeNotifier
+from analytics import GalleryAnalytics
+from widgets import ArtworkTable
+
+def create_artworks(db, count):
+    return db.add_artworks([
+        Artwork(None, f"Работа {i}", "Автор", 2000, "Стиль", float(i), "")
+        for i in range(count)
+    ])
+
+def titles(model):
+    return [model.data(model.index(row, 1)) for row in range(model.rowCount())]
+
+def wait_for(worker, app, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while worker.pending() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.005)
+    app.processEvents()
+    assert worker.pending() == 0
+
+class TestTablePaging:
+    
+    def test_fetch_more_and_page_eviction(self, app):
+        db = DatabaseManager(":memory:")
+        ids = create_artworks(db, 12)
+        model = ArtworkTableModel(db, page_size=5, max_cached_pages=2)
+        model.reload()
+        
+        assert model.rowCount() == 5
+        assert model.canFetchMore()
+        assert model.data(model.index(0, 1)) == "Работа 11"
+        model.fetchMore()
+        assert model.rowCount() == 10
+        model.fetchMore()
+        assert model.rowCount() == 12
+        assert not model.canFetchMore()
+        
+        # В кэше только две последние страницы, у первой остались одни id
+        first_page = model._pages[0]
+        assert first_page.rows is None
+        assert model.artwork_id(0) == ids[-1]
+        # Вытесненная страница перечитывается при обращении к её строкам
+        assert titles(model) == [f"Работа {i}" for i in range(11, -1, -1)]
+        assert model.data(model.index(0, 5)) == "11.00"
+        assert sum(page.rows is not None for page in model._pages) == 2
+        db.close()
+    
+    def test_insert_and_remove(self, app):
+        db = DatabaseManager(":memory:")
+        ids = create_artworks(db, 7)
+        model = ArtworkTableModel(db, page_size=3)
+        model.reload()
+        model.fetchMore()
+        assert model.rowCount() == 6
+        
+        new_id = db.add_artwork(Artwork(None, "Новая", "Автор", 2000, "Стиль", 1.0, ""))
+        model.insert_artwork(new_id)
+        assert model.rowCount() == 7
+        assert model.data(model.index(0, 1)) == "Новая"
+        assert model.data(model.index(1, 1)) == "Работа 6"
+        
+        assert model.remove_artwork(ids[5])
+        assert model.rowCount() == 6
+        assert titles(model) == ["Новая", "Работа 6", "Работа 4", "Работа 3", "Работа 2",
+                                 "Работа 1"]
+        assert not model.remove_artwork(ids[5])
+        
+        # Догрузка продолжается с прежней границы и не теряет строк
+        model.fetchMore()
+        assert titles(model)[-1] == "Работа 0"
+        assert not model.canFetchMore()
+        db.close()
+    
+    def test_refresh_after_data_version_change(self, app):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            ids = create_artworks(db, 4)
+            model = ArtworkTableModel(db, page_size=10)
+            model.reload()
+            notifier = ChangeNotifier(db)
+            notifier.changed.connect(model.refresh)
+            notifier.poll()
+            assert model.rowCount() == 4
+            
+            # Другой процесс: изменения видны только через PRAGMA data_version
+            other = DatabaseManager(db_path)
+            new_id = other.add_artwork(Artwork(None, "Чужая", "Автор", 2000, "Стиль", 1.0, ""))
+            other.delete_artwork(ids[0])
+            with other.transaction() as conn:
+                conn.execute("UPDATE artworks SET title = 'Переименована' WHERE id = ?",
+                             (ids[2],))
+            other.close()
+            
+            notifier.poll()
+            
+            assert model.rowCount() == 4
+            assert model.artwork_id(0) == new_id
+            assert titles(model) == ["Чужая", "Работа 3", "Переименована", "Работа 1"]
+            notifier.stop()
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
+
+class TestDatabaseWorker:
+    
+    def test_replaced_request_never_delivers(self, app):
+        worker = DatabaseWorker(max_readers=1)
+        release = threading.Event()
+        results = []
+        
+        def slow(value):
+            release.wait(5)
+            return value
+        
+        worker.read(slow, "старый", key="page", on_result=results.append)
+        # Пока первый запрос выполняется, второй с тем же ключом отменяет его
+        worker.read(slow, "новый", key="page", on_result=results.append)
+        release.set()
+        wait_for(worker, app)
+        
+        assert results == ["новый"]
+    
+    def test_cancelled_queued_task_never_runs(self, app):
+        worker = DatabaseWorker(max_readers=1)
+        release = threading.Event()
+        calls = []
+        results = []
+        
+        def slow(value):
+            calls.append(value)
+            release.wait(5)
+            return value
+        
+        worker.read(slow, "первый", on_result=results.append)
+        queued = worker.read(slow, "в очереди", on_result=results.append)
+        worker.cancel(queued)
+        release.set()
+        wait_for(worker, app)
+        
+        assert results == ["первый"]
+        assert calls == ["первый"]
+    
+    def test_model_discards_results_of_previous_generation(self, app):
+        db = DatabaseManager(":memory:")
+        create_artworks(db, 5)
+        worker = DatabaseWorker()
+        model = ArtworkTableModel(db, worker=worker, page_size=10)
+        loaded = []
+        model.first_page_loaded.connect(lambda: loaded.append(model.rowCount()))
+        
+        model.reload()
+        assert model.rowCount() > 0
+        assert model.flags(model.index(0, 1)) == Qt.NoItemFlags
+        model.set_filters(year_from=3000)
+        wait_for(worker, app)
+        
+        # Первая загрузка отменена фильтром: применён только пустой результат
+        assert loaded == [0]
+        assert model.rowCount() == 0
+        db.close()
+
+class TestFilterBar:
+    
+    def test_artist_and_style_resolve_to_stored_spelling(self, app):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        try:
+            os.close(fd)
+            
+            db = DatabaseManager(db_path)
+            db.add_artworks([
+                Artwork(None, "Подсолнухи", "Ван Гог", 1888, "Постимпрессионизм", 300.0, ""),
+                Artwork(None, "Звездная ночь", "Ван Гог", 1889, "Постимпрессионизм", 500.0, ""),
+                Artwork(None, "Кувшинки", "Моне", 1906, "Импрессионизм", 100.0, ""),
+            ])
+            table = ArtworkTable(db)
+            assert GalleryAnalytics(db).filter_values() == {
+                "artist": ["Ван Гог", "Моне"],
+                "style": ["Импрессионизм", "Постимпрессионизм"],
+            }
+            table.load_filter_values()
+            wait_for(table.worker, app)
+            assert table.artist_filter.count() == 2
+            
+            table.artist_filter.setEditText("ван гог")
+            table.apply_filters()
+            wait_for(table.worker, app)
+            assert table.model.filters == {"artist": "Ван Гог"}
+            assert titles(table.model) == ["Звездная ночь", "Подсолнухи"]
+            
+            # Обновление списков не сбрасывает введённый текст
+            table.style_filter.setEditText("импрессионизм")
+            table.load_filter_values()
+            wait_for(table.worker, app)
+            assert table.style_filter.currentText() == "импрессионизм"
+            table.apply_filters()
+            wait_for(table.worker, app)
+            assert table.model.filters == {"artist": "Ван Гог", "style": "Импрессионизм"}
+            assert table.model.rowCount() == 0
+            table.deleteLater()
+            db.close()
+            
+        finally:
+            try:
+                if os.path.exists(db_path):
+                    os.unlink(db_path)
+            except PermissionError:
+                pass
@@ -0,0 +1,212 @@
+import pytest
+import tempfile
+import os
+import csv
+import json
+from database import DatabaseManager, DatabaseError
+from models import Artwork
+import transfer
+from transfer import import_file, export_file, main
+
+CSV_ROWS = [
+    "title,artist,year,style,price",
+    "Звездная ночь,Ван Гог,1889,Постимпрессионизм,100",
+    ",Без названия,1900,Стиль,10",
+    "Черный квадрат,Малевич,1915,Супрематизм,200",
+    "Подсолнухи,Ван Гог,не число,Постимпрессионизм,300",
+    "Композиция VIII,Кандинский,1923,Абстракционизм,400",
+]
+
+class TestImport:
+    
+    def test_import_csv_with_error_report(self):
+        tmp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(tmp_dir, "gallery.db")
+        source = os.path.join(tmp_dir, "catalogue.csv")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("\n".join(CSV_ROWS))
+        
+        db = DatabaseManager(db_path)
+        result = import_file(db, source, chunk_size=2)
+        
+        assert result.imported == 3
+        assert result.rejected == 2
+        titles = sorted(artwork.title for artwork in db.get_all_artworks())
+        assert titles == ["Звездная ночь", "Композиция VIII", "Черный квадрат"]
+        
+        with open(f"{source}.errors.csv", encoding="utf-8") as f:
+            report = list(csv.reader(f))
+        assert [row[0] for row in report[1:]] == ["3", "5"]
+        assert "числами" in report[2][1]
+        db.close()
+    
+    def test_import_resumes_from_checkpoint(self):
+        tmp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(tmp_dir, "gallery.db")
+        source = os.path.join(tmp_dir, "catalogue.jsonl")
+        with open(source, "w", encoding="utf-8") as f:
+            for i in range(10):
+                f.write(json.dumps({"title": f"Картина {i}", "artist": "Художник",
+                                    "year": 2000, "style": "Стиль", "price": i}) + "\n")
+        
+        db = DatabaseManager(db_path)
+        original = db.add_artworks
+        calls = []
+        
+        def failing_add(artworks, **kwargs):
+            calls.append(len(artworks))
+            if len(calls) == 3:
+                raise DatabaseError("database is locked")
+            return original(artworks, **kwargs)
+        
+        db.add_artworks = failing_add
+        with pytest.raises(DatabaseError):
+            import_file(db, source, chunk_size=3)
+        assert len(db.get_all_artworks()) == 6
+        
+        db.add_artworks = original
+        result = import_file(db, source, chunk_size=3)
+        
+        assert result.resumed_from == 6
+        assert result.imported == 10
+        titles = sorted(artwork.title for artwork in db.get_all_artworks())
+        assert titles == sorted(f"Картина {i}" for i in range(10))
+        db.close()
+    
+    def test_import_skips_duplicates(self):
+        tmp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(tmp_dir, "gallery.db")
+        source = os.path.join(tmp_dir, "catalogue.csv")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("\n".join(CSV_ROWS + ["звездная ночь,Ван  Гог,1889,Постимпрессионизм,150"]))
+        
+        db = DatabaseManager(db_path)
+        result = import_file(db, source, chunk_size=2, duplicates="skip")
+        
+        assert result.imported == 3
+        assert result.duplicates == 1
+        
+        result = import_file(db, source, restart=True, duplicates="skip")
+        assert (result.imported, result.duplicates) == (0, 4)
+        assert len(db.get_all_artworks()) == 3
+        db.close()
+    
+    def test_import_reports_rejected_duplicates_per_line(self):
+        tmp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(tmp_dir, "gallery.db")
+        source = os.path.join(tmp_dir, "catalogue.csv")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("\n".join(CSV_ROWS + ["звездная ночь,Ван  Гог,1889,Постимпрессионизм,150",
+                                          "Черный квадрат,Малевич,1915,Супрематизм,250",
+                                          "Утро,Шишкин,1889,Реализм,50"]))
+        
+        db = DatabaseManager(db_path)
+        db.add_artwork(Artwork(None, "Композиция VIII", "Кандинский", 1923, "Стиль", 1.0, ""))
+        result = import_file(db, source, chunk_size=4, duplicates="reject")
+        
+        assert (result.imported, result.rejected, result.duplicates) == (3, 5, 0)
+        titles = sorted(artwork.title for artwork in db.get_all_artworks())
+        assert titles == ["Звездная ночь", "Композиция VIII", "Утро", "Черный квадрат"]
+        with open(f"{source}.errors.csv", encoding="utf-8") as f:
+            report = list(csv.reader(f))
+        assert [row[0] for row in report[1:]] == ["3", "5", "6", "7", "8"]
+        assert "уже есть в коллекции" in report[3][1]
+        db.close()
+    
+    def test_import_rejects_non_object_jsonl_records(self):
+        tmp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(tmp_dir, "gallery.db")
+        source = os.path.join(tmp_dir, "catalogue.jsonl")
+        record = {"title": "Картина", "artist": "Художник", "year": 2000, "style": "Стиль",
+                  "price": 1}
+        with open(source, "w", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.write("[1, 2, 3]\n")
+            f.write('"строка"\n')
+            f.write(json.dumps(dict(record, title="Другая", year=float("inf"))) + "\n")
+        
+        db = DatabaseManager(db_path)
+        result = import_file(db, source)
+        
+        assert (result.imported, result.rejected) == (1, 3)
+        with open(f"{source}.errors.csv", encoding="utf-8") as f:
+            report = list(csv.reader(f))
+        assert [row[0] for row in report[1:]] == ["2", "3", "4"]
+        assert "объектом" in report[1][1]
+        db.close()
+    
+    def test_import_rejects_non_finite_numbers(self):
+        tmp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(tmp_dir, "gallery.db")
+        source = os.path.join(tmp_dir, "catalogue.csv")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("\n".join(CSV_ROWS[:2] + ["Пейзаж,Левитан,1895,Реализм,nan",
+                                              "Море,Айвазовский,1850,Романтизм,inf",
+                                              "Березы,Куинджи,1879,Реализм,50"]))
+        
+        db = DatabaseManager(db_path)
+        result = import_file(db, source, chunk_size=2)
+        
+        assert (result.imported, result.rejected) == (2, 2)
+        titles = sorted(artwork.title for artwork in db.get_all_artworks())
+        assert titles == ["Березы", "Звездная ночь"]
+        with open(f"{source}.errors.csv", encoding="utf-8") as f:
+            report = list(csv.reader(f))
+        assert [row[0] for row in report[1:]] == ["3", "4"]
+        assert all("конечными" in row[1] for row in report[1:])
+        db.close()
+
+class TestArchiveCommand:
+    
+    def test_archive_rejects_malformed_date(self, capsys, monkeypatch):
+        # Журнал приложения в рабочем каталоге тестам не нужен
+        monkeypatch.setattr(transfer, "setup_logging", lambda: None)
+        tmp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(tmp_dir, "gallery.db")
+        db = DatabaseManager(db_path)
+        db.add_artworks([Artwork(None, "Картина", "Художник", 2000, "Стиль", 1.0, "")])
+        db.close()
+        
+        for before in ("yesterday", "2024/01/01"):
+            with pytest.raises(SystemExit):
+                main(["--db", db_path, "archive", "--before", before])
+            assert "ГГГГ-ММ-ДД" in capsys.readouterr().err
+        
+        db = DatabaseManager(db_path)
+        assert len(db.get_all_artworks()) == 1
+        db.close()
+        
+        assert main(["--db", db_path, "archive", "--before", "2000-01-01"]) == 0
+        db = DatabaseManager(db_path)
+        assert len(db.get_all_artworks()) == 1
+        db.close()
+
+class TestExport:
+    
+    def test_export_round_trip(self):
+        tmp_dir = tempfile.mkdtemp()
+        source = os.path.join(tmp_dir, "catalogue.csv")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("\n".join(CSV_ROWS))
+        
+        db = DatabaseManager(os.path.join(tmp_dir, "gallery.db"))
+        import_file(db, source)
+        
+        exported_csv = os.path.join(tmp_dir, "export.csv")
+        exported_jsonl = os.path.join(tmp_dir, "export.jsonl")
+        assert export_file(db, exported_csv, batch_size=2) == 3
+        assert export_file(db, exported_jsonl, batch_size=2) == 3
+        
+        copy = DatabaseManager(os.path.join(tmp_dir, "copy.db"))
+        result = import_file(copy, exported_jsonl)
+        
+        assert result.imported == 3
+        assert sorted(a.title for a in copy.get_all_artworks()) == \
+            sorted(a.title for a in db.get_all_artworks())
+        with open(exported_csv, encoding="utf-8") as f:
+            assert next(csv.reader(f))[0] == "id"
+        db.close()
+        copy.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,146 @@
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from PySide6.QtCore import QObject, QTimer, Signal
+from PySide6.QtGui import QImage, QPixmap
+from image_store import THUMBNAIL_SIZE, make_thumbnail
+
+# Около 9 КБ на миниатюру 48×48, то есть порядка 9 МБ на весь кэш
+MAX_PIXMAPS = 1000
+THUMBNAIL_PROCESSES = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+def _lower_priority():
+    # Генерация миниатюр не должна отнимать процессор у потока интерфейса
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+class ThumbnailLoader(QObject):
+    # data() модели вызывается на каждую видимую ячейку при каждой перерисовке, поэтому
+    # pixmap() только смотрит в LRU; промахи собираются в пачку и догружаются в фоне
+    ready = Signal()
+    _generated = Signal(str, object)
+    
+    def __init__(self, db, store, worker=None, size=THUMBNAIL_SIZE, max_pixmaps=MAX_PIXMAPS,
+                 processes=THUMBNAIL_PROCESSES, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.store = store
+        self.worker = worker
+        self.size = size
+        self.max_pixmaps = max_pixmaps
+        self.processes = processes
+        # artwork_id -> QPixmap или None для работ без изображения
+        self._pixmaps = OrderedDict()
+        self._pending = set()
+        self._requested = set()
+        # Хеш -> id работ, которые ждут генерации миниатюры
+        self._waiting = {}
+        self._pool = None
+        self._generated.connect(self._on_generated)
+        
+        self.batch_timer = QTimer(self)
+        self.batch_timer.setSingleShot(True)
+        self.batch_timer.setInterval(0)
+        self.batch_timer.timeout.connect(self._flush)
+    
+    def pixmap(self, artwork_id):
+        if artwork_id in self._pixmaps:
+            self._pixmaps.move_to_end(artwork_id)
+            return self._pixmaps[artwork_id]
+        if artwork_id not in self._requested:
+            self._requested.add(artwork_id)
+            self._pending.add(artwork_id)
+            self.batch_timer.start()
+        return None
+    
+    def forget(self, artwork_id):
+        self._pixmaps.pop(artwork_id, None)
+        self._requested.discard(artwork_id)
+        self.ready.emit()
+    
+    def _flush(self):
+        ids = list(self._pending)
+        self._pending.clear()
+        if not ids:
+            return
+        if self.worker is None:
+            self._on_lookup(self._lookup(ids))
+            return
+        self.worker.read(self._lookup, ids, on_result=self._on_lookup,
+                         on_error=lambda error: self._on_lookup_failed(ids, error))
+    
+    def _lookup(self, ids):
+        # Поток чтения: хеши одним запросом, готовые миниатюры с диска. QImage, в отличие
+        # от QPixmap, можно создавать вне потока интерфейса
+        hashes = self.db.get_image_hashes(ids)
+        images = {}
+        missing = []
+        for artwork_id, digest in hashes.items():
+            image = QImage(self.store.thumbnail_path(digest, self.size))
+            if image.isNull():
+                missing.append((artwork_id, digest))
+            else:
+                images[artwork_id] = image
+        return ids, images, missing
+    
+    def _on_lookup(self, result):
+        ids, images, missing = result
+        waiting = {artwork_id for artwork_id, _ in missing}
+        for artwork_id in ids:
+            if artwork_id in waiting or artwork_id not in self._requested:
+                continue
+            image = images.get(artwork_id)
+            self._store(artwork_id, None if image is None else QPixmap.fromImage(image))
+        for artwork_id, digest in missing:
+            self._generate(artwork_id, digest)
+        self.ready.emit()
+    
+    def _on_lookup_failed(self, ids, error):
+        logging.warning("Thumbnail lookup failed: %s", error)
+        self._requested.difference_update(ids)
+    
+    def _generate(self, artwork_id, digest):
+        if digest in self._waiting:
+            self._waiting[digest].add(artwork_id)
+            return
+        self._waiting[digest] = {artwork_id}
+        if self._pool is None:
+            # spawn: fork процесса с потоками Qt небезопасен
+            self._pool = ProcessPoolExecutor(self.processes,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_lower_priority)
+        future = self._pool.submit(make_thumbnail, self.store.original_path(digest),
+                                   self.store.thumbnail_path(digest, self.size), self.size)
+        # Колбэк приходит из служебного потока пула; сигнал доставит его в поток интерфейса
+        future.add_done_callback(
+            lambda future: self._generated.emit(
+                digest, None if future.cancelled() else future.exception()))
+    
+    def _on_generated(self, digest, error):
+        ids = self._waiting.pop(digest, set())
+        pixmap = None
+        if error is not None:
+            logging.warning("Thumbnail generation for %s failed: %s", digest, error)
+        else:
+            pixmap = QPixmap(self.store.thumbnail_path(digest, self.size))
+        for artwork_id in ids:
+            if artwork_id in self._requested:
+                self._store(artwork_id, None if pixmap is None or pixmap.isNull() else pixmap)
+        self.ready.emit()
+    
+    def _store(self, artwork_id, pixmap):
+        self._pixmaps[artwork_id] = pixmap
+        self._pixmaps.move_to_end(artwork_id)
+        while len(self._pixmaps) > self.max_pixmaps:
+            evicted, _ = self._pixmaps.popitem(last=False)
+            self._requested.discard(evicted)
+    
+    def pending(self):
+        return len(self._pending) + len(self._waiting)
+    
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
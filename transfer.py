@@ -0,0 +1,231 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from gallery_logging import setup_logging
+from database import DatabaseManager, DatabaseError, ARTWORK_COLUMNS, DEFAULT_CHUNK_SIZE, \
+    DUPLICATE_POLICIES
+from models import Artwork, ValidationError, validate_columns
+
+FORMATS = ("csv", "jsonl")
+IMPORT_FIELDS = ("title", "artist", "year", "style", "price")
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    rejected: int = 0
+    resumed_from: int = 0
+    duplicates: int = 0
+
+def detect_format(path, file_format=None):
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format not in FORMATS:
+        raise ValueError(f"Неизвестный формат файла: {path}")
+    return file_format
+
+def read_records(path, file_format):
+    with open(path, encoding="utf-8-sig", newline="") as source:
+        if file_format == "csv":
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, ValidationError(f"Некорректный JSON: {e}")
+
+def parse_records(records):
+    # Здесь только разбор полей; правила Artwork проверяются затем целым чанком
+    for line_number, record in records:
+        if isinstance(record, Exception):
+            yield line_number, record, None
+            continue
+        try:
+            if not isinstance(record, dict):
+                raise ValidationError("Запись должна быть объектом JSON")
+            missing = [field for field in IMPORT_FIELDS if record.get(field) in (None, "")]
+            if missing:
+                raise ValidationError(f"Не заполнены поля: {', '.join(missing)}")
+            try:
+                year = int(record["year"])
+                price = float(record["price"])
+            except (TypeError, ValueError, OverflowError):
+                raise ValidationError("Год и цена должны быть числами")
+            # nan и inf проходят float(), но до базы доходить не должны
+            if not (math.isfinite(year) and math.isfinite(price)):
+                raise ValidationError("Год и цена должны быть конечными числами")
+        except ValidationError as e:
+            yield line_number, e, record
+            continue
+        yield line_number, (str(record["title"]), str(record["artist"]), year,
+                            str(record["style"]), price), record
+
+def validate_chunk(chunk, current_year=None):
+    parsed = [(line_number, values, record) for line_number, values, record in chunk
+              if isinstance(values, tuple)]
+    errors = [(line_number, error, record) for line_number, error, record in chunk
+              if not isinstance(error, tuple)]
+    checked = validate_columns([values[0] for _, values, _ in parsed],
+                               [values[1] for _, values, _ in parsed],
+                               [values[2] for _, values, _ in parsed],
+                               [values[4] for _, values, _ in parsed],
+                               current_year=current_year)
+    accepted = []
+    for (line_number, values, record), message in zip(parsed, checked.messages):
+        if message is None:
+            accepted.append((line_number, Artwork(None, *values, ""), record))
+        else:
+            errors.append((line_number, ValidationError(message), record))
+    errors.sort(key=lambda error: error[0])
+    return accepted, errors
+
+def reject_duplicates(db, accepted, errors):
+    # При политике reject повтор отклоняется своей строкой, как и ошибка проверки,
+    # а не прерывает весь импорт исключением из add_artworks
+    found = db.find_duplicates([artwork for _, artwork, _ in accepted])
+    errors = errors + [(line_number, error, record)
+                       for (line_number, _, record), error in zip(accepted, found) if error]
+    errors.sort(key=lambda error: error[0])
+    return [item for item, error in zip(accepted, found) if error is None], errors
+
+def import_file(db, path, file_format=None, chunk_size=DEFAULT_CHUNK_SIZE, errors_path=None,
+                restart=False, duplicates=None):
+    file_format = detect_format(path, file_format)
+    source = os.path.abspath(path)
+    errors_path = errors_path or f"{path}.errors.csv"
+    
+    if restart:
+        db.clear_import_checkpoint(source)
+    checkpoint = db.get_import_checkpoint(source)
+    result = ImportResult()
+    if checkpoint is not None:
+        result.resumed_from, result.imported, result.rejected = checkpoint
+    
+    current_year = datetime.now().year
+    policy = duplicates or db.duplicates
+    rows = parse_records(
+        (line_number, record) for line_number, record in read_records(path, file_format)
+        if line_number > result.resumed_from
+    )
+    with open(errors_path, "a" if checkpoint else "w", encoding="utf-8", newline="") as report:
+        error_writer = csv.writer(report)
+        if not checkpoint:
+            error_writer.writerow(["line", "error", "record"])
+        
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            
+            accepted, errors = validate_chunk(chunk, current_year)
+            # Вставка и контрольная точка фиксируются одной транзакцией: после сбоя
+            # импорт продолжится ровно с первой незафиксированной строки
+            with db.transaction():
+                if policy == "reject":
+                    accepted, errors = reject_duplicates(db, accepted, errors)
+                artworks = [artwork for _, artwork, _ in accepted]
+                ids = db.add_artworks(artworks, chunk_size=chunk_size, duplicates=policy)
+                result.imported += len(ids)
+                result.duplicates += len(artworks) - len(ids)
+                result.rejected += len(errors)
+                db.save_import_checkpoint(source, chunk[-1][0], result.imported, result.rejected)
+            
+            for line_number, error, record in errors:
+                error_writer.writerow([line_number, str(error),
+                                       json.dumps(record, ensure_ascii=False)])
+            report.flush()
+    
+    logging.info("Imported %d artworks from %s, rejected %d, duplicates skipped %d",
+                 result.imported, path, result.rejected, result.duplicates)
+    return result
+
+def export_file(db, path, file_format=None, batch_size=DEFAULT_CHUNK_SIZE):
+    file_format = detect_format(path, file_format)
+    exported = 0
+    with open(path, "w", encoding="utf-8", newline="") as target:
+        if file_format == "csv":
+            writer = csv.writer(target)
+            writer.writerow(ARTWORK_COLUMNS)
+            for row in db.iter_artworks(batch_size):
+                writer.writerow(row)
+                exported += 1
+        else:
+            for row in db.iter_artworks(batch_size):
+                target.write(json.dumps(dict(zip(ARTWORK_COLUMNS, row)), ensure_ascii=False))
+                target.write("\n")
+                exported += 1
+    
+    logging.info("Exported %d artworks to %s", exported, path)
+    return exported
+
+def _date(value):
+    # Опечатка в дате не должна превращаться в «перенести всё»: разбираем до любых действий
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается дата ГГГГ-ММ-ДД: {value}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт и экспорт коллекции галереи")
+    parser.add_argument("--db", default="art_gallery.db", help="файл базы данных")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    import_parser = commands.add_parser("import", help="загрузить CSV или JSONL в базу")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=FORMATS)
+    import_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    import_parser.add_argument("--errors", help="файл отчёта об отклонённых строках")
+    import_parser.add_argument("--restart", action="store_true",
+                               help="начать заново, игнорируя контрольную точку")
+    import_parser.add_argument("--duplicates", choices=DUPLICATE_POLICIES, default="skip",
+                               help="что делать с работами, которые уже есть в коллекции")
+    
+    export_parser = commands.add_parser("export", help="выгрузить коллекцию в CSV или JSONL")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=FORMATS)
+    export_parser.add_argument("--batch-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    
+    commands.add_parser("dedupe", help="объединить уже накопившиеся дубликаты")
+    
+    archive_parser = commands.add_parser("archive",
+                                         help="перенести отмеченные и старые работы в архив")
+    archive_parser.add_argument("--before", type=_date,
+                                help="добавленные раньше даты ГГГГ-ММ-ДД")
+    archive_parser.add_argument("--batch-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    
+    args = parser.parse_args(argv)
+    setup_logging()
+    try:
+        db = DatabaseManager(args.db)
+        if args.command == "import":
+            result = import_file(db, args.path, args.format, args.chunk_size, args.errors,
+                                 args.restart, args.duplicates)
+            print(f"Импортировано: {result.imported}, отклонено: {result.rejected}, "
+                  f"дубликатов пропущено: {result.duplicates}")
+        elif args.command == "dedupe":
+            groups, removed = db.merge_duplicates()
+            print(f"Объединено групп: {groups}, удалено записей: {removed}")
+        elif args.command == "archive":
+            moved = db.archive_artworks(args.before, args.batch_size)
+            print(f"Перенесено в архив: {moved} ({db.archive_name})")
+        else:
+            exported = export_file(db, args.path, args.format, args.batch_size)
+            print(f"Экспортировано: {exported}")
+        db.close()
+    except (DatabaseError, ValueError, OSError) as e:
+        print(f"Ошибка: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
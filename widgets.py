@@ -1,34 +1,51 @@
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
-                              QTableWidgetItem, QLineEdit, QPushButton, QLabel, 
+import logging
+import os
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView, 
+                              QAbstractItemView, QLineEdit, QPushButton, QLabel, 
                               QMessageBox, QHeaderView, QFormLayout, QGroupBox,
-                              QMainWindow, QStatusBar, QDialog, QDialogButtonBox)
-from PySide6.QtCore import Qt
+                              QMainWindow, QStatusBar, QTabWidget, QTableWidget,
+                              QTableWidgetItem, QFileDialog, QProgressBar, QCheckBox,
+                              QComboBox, QCompleter)
+from PySide6.QtCore import Qt, QTimer, QSize, Signal
+from PySide6.QtGui import QIntValidator, QDoubleValidator
 from datetime import datetime
 from database import DatabaseManager
 from models import Artwork, ValidationError
+from table_model import ArtworkTableModel, IMAGE_COLUMN
+from workers import DatabaseWorker, ChangeNotifier
+from instrumentation import METRICS, format_summary, format_details
 
-class DeleteConfirmationDialog(QDialog):
-    def __init__(self, artwork_title, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Подтверждение удаления")
-        self.setModal(True)
-        
-        layout = QVBoxLayout()
-        layout.addWidget(QLabel(f"Вы уверены, что хотите удалить произведение:\n\"{artwork_title}\"?"))
-        
-        button_box = QDialogButtonBox(QDialogButtonBox.Yes | QDialogButtonBox.No)
-        button_box.accepted.connect(self.accept)
-        button_box.rejected.connect(self.reject)
-        
-        layout.addWidget(button_box)
-        self.setLayout(layout)
+FILTER_DEBOUNCE_MS = 300
+DIAGNOSTICS_INTERVAL_MS = 2000
+STATISTICS_DEBOUNCE_MS = 500
+STATISTICS_TOP = 10
+# Интервал плановых снимков базы, мин; по умолчанию расписание выключено
+BACKUP_INTERVAL_MIN = int(os.environ.get("GALLERY_BACKUP_INTERVAL_MIN", "0"))
+
+def backup_schedule_allowed(db_name):
+    # Базу в памяти некуда сохранять, а для базы только на чтение каталог снимков не создать
+    if db_name == ":memory:":
+        return False
+    path = os.path.abspath(db_name)
+    return os.access(path, os.W_OK) and os.access(os.path.dirname(path), os.W_OK)
 
 class ArtworkTable(QWidget):
-    def __init__(self):
+    def __init__(self, db, worker=None):
         super().__init__()
-        self.db = DatabaseManager()
+        self.db = db
+        self.worker = worker or DatabaseWorker(self)
+        # Хранилище изображений и загрузчик миниатюр создаются после показа окна
+        self.images = None
+        self.thumbnails = None
+        self.loaded = False
         self.init_ui()
-        self.load_data()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Первая страница запрашивается после показа окна: до её прихода видна заготовка таблицы
+        if not self.loaded:
+            self.loaded = True
+            QTimer.singleShot(0, self.load_data)
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -37,7 +54,7 @@ class ArtworkTable(QWidget):
         header_layout.addWidget(QLabel("Коллекция произведений:"))
         
         refresh_btn = QPushButton("Обновить")
-        refresh_btn.clicked.connect(self.load_data)
+        refresh_btn.clicked.connect(self.refresh_data)
         header_layout.addWidget(refresh_btn)
         
         self.delete_btn = QPushButton("Удалить выбранное")
@@ -45,38 +62,171 @@ class ArtworkTable(QWidget):
         self.delete_btn.setEnabled(False)
         header_layout.addWidget(self.delete_btn)
         
+        self.image_btn = QPushButton("Изображение…")
+        self.image_btn.clicked.connect(self.attach_image_to_selected)
+        self.image_btn.setEnabled(False)
+        header_layout.addWidget(self.image_btn)
+        
         header_layout.addStretch()
         
+        self.archive_check = QCheckBox("Показывать архив")
+        self.archive_check.toggled.connect(self.toggle_archive)
+        header_layout.addWidget(self.archive_check)
+        
         layout.addLayout(header_layout)
+        layout.addLayout(self.init_filter_bar())
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Название", "Художник", "Год", "Стиль", "Цена (€)", "Дата добавления"
-        ])
+        self.model = ArtworkTableModel(self.db, self.worker, parent=self)
+        self.model.load_failed.connect(self.on_load_failed)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.table.horizontalHeader().setSectionResizeMode(IMAGE_COLUMN, QHeaderView.Fixed)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         
         layout.addWidget(self.table)
         self.setLayout(layout)
     
+    def init_filter_bar(self):
+        filter_layout = QHBoxLayout()
+        
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.apply_filters)
+        
+        self.search_input = QLineEdit()
+        # Художник и стиль фильтруются точным совпадением (так запрос идёт по индексу без
+        # сортировки), поэтому значение выбирается из списка с подсказками
+        self.artist_filter = self.create_value_filter("Художник")
+        self.style_filter = self.create_value_filter("Стиль")
+        self.year_from_filter = QLineEdit()
+        self.year_to_filter = QLineEdit()
+        self.price_from_filter = QLineEdit()
+        self.price_to_filter = QLineEdit()
+        
+        self.search_input.setPlaceholderText("Поиск: название, художник, стиль")
+        self.year_from_filter.setPlaceholderText("Год с")
+        self.year_to_filter.setPlaceholderText("Год по")
+        self.price_from_filter.setPlaceholderText("Цена от")
+        self.price_to_filter.setPlaceholderText("Цена до")
+        
+        for year_input in (self.year_from_filter, self.year_to_filter):
+            year_input.setValidator(QIntValidator(0, 9999, year_input))
+        for price_input in (self.price_from_filter, self.price_to_filter):
+            price_input.setValidator(QDoubleValidator(0, 1e15, 2, price_input))
+        
+        self.search_input.textChanged.connect(self.filter_timer.start)
+        filter_layout.addWidget(self.search_input, 2)
+        filter_layout.addWidget(QLabel("Фильтр:"))
+        for filter_input in (self.artist_filter, self.style_filter):
+            filter_input.currentTextChanged.connect(self.filter_timer.start)
+            filter_layout.addWidget(filter_input)
+        for filter_input in (self.year_from_filter, self.year_to_filter,
+                             self.price_from_filter, self.price_to_filter):
+            filter_input.textChanged.connect(self.filter_timer.start)
+            filter_layout.addWidget(filter_input)
+        
+        return filter_layout
+    
+    def create_value_filter(self, placeholder):
+        combo = QComboBox()
+        combo.setEditable(True)
+        combo.setInsertPolicy(QComboBox.NoInsert)
+        combo.lineEdit().setPlaceholderText(placeholder)
+        combo.setMinimumContentsLength(12)
+        completer = combo.completer()
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        completer.setFilterMode(Qt.MatchContains)
+        completer.setCompletionMode(QCompleter.PopupCompletion)
+        return combo
+    
+    def init_thumbnails(self):
+        # Загрузчик тянет multiprocessing и нужен только для строк таблицы,
+        # поэтому импортируется после первой отрисовки окна
+        from image_store import ImageStore
+        from thumbnails import ThumbnailLoader
+        self.images = ImageStore.for_database(self.db.db_name)
+        self.thumbnails = ThumbnailLoader(self.db, self.images, self.worker, parent=self)
+        self.model.set_thumbnails(self.thumbnails)
+        # Размеры столбца и строк заданы заранее: ResizeToContents обошёл бы все строки модели
+        size = self.thumbnails.size
+        self.table.setColumnWidth(IMAGE_COLUMN, size + 8)
+        self.table.setIconSize(QSize(size, size))
+        self.table.verticalHeader().setDefaultSectionSize(size + 4)
+    
+    def load_filter_values(self):
+        from analytics import GalleryAnalytics
+        self.worker.read(GalleryAnalytics(self.db).filter_values,
+                         key=("filter_values", id(self)), on_result=self.set_filter_values)
+    
+    def set_filter_values(self, values):
+        for combo, items in ((self.artist_filter, values["artist"]),
+                             (self.style_filter, values["style"])):
+            text = combo.currentText()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItems(items)
+            combo.setCurrentIndex(-1)
+            combo.setEditText(text)
+            combo.blockSignals(False)
+    
+    def filter_value(self, combo):
+        # Введённое без учёта регистра приводится к написанию из базы: «ван гог» -> «Ван Гог»
+        text = combo.currentText().strip()
+        index = combo.findText(text, Qt.MatchFixedString)
+        return combo.itemText(index) if index >= 0 else text
+    
+    def filter_number(self, filter_input, number_type):
+        try:
+            return number_type(filter_input.text().replace(",", "."))
+        except ValueError:
+            return None
+    
+    def apply_filters(self):
+        self.model.set_filters(
+            search=self.search_input.text(),
+            artist=self.filter_value(self.artist_filter),
+            style=self.filter_value(self.style_filter),
+            year_from=self.filter_number(self.year_from_filter, int),
+            year_to=self.filter_number(self.year_to_filter, int),
+            price_from=self.filter_number(self.price_from_filter, float),
+            price_to=self.filter_number(self.price_to_filter, float)
+        )
+    
+    def toggle_archive(self, include_archive):
+        self.model.set_include_archive(include_archive)
+    
     def on_selection_changed(self):
-        has_selection = len(self.table.selectedItems()) > 0
+        has_selection = self.table.selectionModel().hasSelection()
         self.delete_btn.setEnabled(has_selection)
+        self.image_btn.setEnabled(has_selection)
+    
+    def get_selected_row(self):
+        selected_rows = self.table.selectionModel().selectedRows()
+        if not selected_rows:
+            return None
+        
+        return selected_rows[0].row()
     
     def get_selected_artwork_id(self):
-        selected_items = self.table.selectedItems()
-        if not selected_items:
+        row = self.get_selected_row()
+        if row is None:
             return None
         
-        return int(self.table.item(selected_items[0].row(), 0).text())
+        return self.model.artwork_id(row)
     
     def get_selected_artwork_title(self):
-        selected_items = self.table.selectedItems()
-        if not selected_items:
+        row = self.get_selected_row()
+        if row is None:
             return None
         
-        return self.table.item(selected_items[0].row(), 1).text()
+        return self.model.artwork_title(row)
     
     def delete_selected_artwork(self):
         artwork_id = self.get_selected_artwork_id()
@@ -86,37 +236,79 @@ class ArtworkTable(QWidget):
             QMessageBox.warning(self, "Предупреждение", "Не выбрано произведение для удаления")
             return
         
-        dialog = DeleteConfirmationDialog(artwork_title, self)
-        if dialog.exec() == QDialog.Accepted:
-            try:
-                self.db.delete_artwork(artwork_id)
-                self.load_data()
-                QMessageBox.information(self, "Успех", "Произведение успешно удалено!")
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Ошибка при удалении: {str(e)}")
+        # Диалоги нужны не при запуске, а только по действию пользователя
+        from dialogs import DeleteConfirmationDialog
+        dialog = DeleteConfirmationDialog(artwork_title or f"ID {artwork_id}", self)
+        if dialog.exec() == DeleteConfirmationDialog.Accepted:
+            self.delete_btn.setEnabled(False)
+            self.worker.write(self.db.delete_artwork, artwork_id,
+                              description="Удаление произведения",
+                              on_result=lambda _result: self.on_artwork_deleted(artwork_id),
+                              on_error=self.on_delete_failed)
+    
+    def on_artwork_deleted(self, artwork_id):
+        self.model.remove_artwork(artwork_id)
+        self.on_selection_changed()
+        QMessageBox.information(self, "Успех", "Произведение успешно удалено!")
+    
+    def on_delete_failed(self, error):
+        self.on_selection_changed()
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при удалении: {str(error)}")
+    
+    def attach_image_to_selected(self):
+        artwork_id = self.get_selected_artwork_id()
+        if artwork_id is None:
+            return
+        
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Выберите изображение", "",
+            "Изображения (*.png *.jpg *.jpeg *.bmp *.gif *.webp);;Все файлы (*)")
+        if not path:
+            return
+        
+        from image_store import attach_image
+        self.image_btn.setEnabled(False)
+        self.worker.write(attach_image, self.db, self.images, artwork_id, path,
+                          description="Сохранение изображения",
+                          on_result=lambda _digest: self.on_image_attached(artwork_id),
+                          on_error=self.on_attach_failed)
+    
+    def on_image_attached(self, artwork_id):
+        self.thumbnails.forget(artwork_id)
+        self.on_selection_changed()
+    
+    def on_attach_failed(self, error):
+        self.on_selection_changed()
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при сохранении изображения: {str(error)}")
     
     def load_data(self):
+        if self.thumbnails is None:
+            self.init_thumbnails()
         try:
-            artworks = self.db.get_all_artworks()
-            self.table.setRowCount(len(artworks))
-            
-            for row, artwork in enumerate(artworks):
-                self.table.setItem(row, 0, QTableWidgetItem(str(artwork.id)))
-                self.table.setItem(row, 1, QTableWidgetItem(artwork.title))
-                self.table.setItem(row, 2, QTableWidgetItem(artwork.artist))
-                self.table.setItem(row, 3, QTableWidgetItem(str(artwork.year)))
-                self.table.setItem(row, 4, QTableWidgetItem(artwork.style))
-                self.table.setItem(row, 5, QTableWidgetItem(f"{artwork.price:,.2f}"))
-                self.table.setItem(row, 6, QTableWidgetItem(artwork.created_at))
-                
+            self.model.reload()
+            self.load_filter_values()
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных: {str(e)}")
+            self.on_load_failed(str(e))
+    
+    def refresh_data(self):
+        try:
+            self.model.refresh()
+            self.load_filter_values()
+        except Exception as e:
+            self.on_load_failed(str(e))
+    
+    def on_artwork_added(self, artwork_id):
+        self.model.insert_artwork(artwork_id)
+    
+    def on_load_failed(self, message):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных: {message}")
 
 class InputForm(QWidget):
-    def __init__(self, table_widget):
+    def __init__(self, table_widget, db, worker=None):
         super().__init__()
         self.table_widget = table_widget
-        self.db = DatabaseManager()
+        self.db = db
+        self.worker = worker or table_widget.worker
         self.init_ui()
     
     def init_ui(self):
@@ -177,14 +369,26 @@ class InputForm(QWidget):
                 created_at=""
             )
             
-            self.db.add_artwork(artwork)
-            self.table_widget.load_data()
-            self.clear_form()
-            QMessageBox.information(self, "Успех", "Произведение успешно добавлено!")
+            artwork.validate()
+            self.add_btn.setEnabled(False)
+            self.worker.write(self.db.add_artwork, artwork,
+                              description="Добавление произведения",
+                              on_result=self.on_artwork_added,
+                              on_error=self.on_add_failed)
             
         except (ValidationError, Exception) as e:
             QMessageBox.critical(self, "Ошибка", str(e))
     
+    def on_artwork_added(self, artwork_id):
+        self.add_btn.setEnabled(True)
+        self.table_widget.on_artwork_added(artwork_id)
+        self.clear_form()
+        QMessageBox.information(self, "Успех", "Произведение успешно добавлено!")
+    
+    def on_add_failed(self, error):
+        self.add_btn.setEnabled(True)
+        QMessageBox.critical(self, "Ошибка", str(error))
+    
     def clear_form(self):
         self.title_input.clear()
         self.artist_input.clear()
@@ -192,13 +396,102 @@ class InputForm(QWidget):
         self.style_input.clear()
         self.price_input.clear()
 
+class StatisticsPanel(QWidget):
+    def __init__(self, db, worker):
+        super().__init__()
+        self.db = db
+        self.analytics = None
+        self.worker = worker
+        self.init_ui()
+        
+        # Несколько изменений подряд дают одно обновление сводки
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(STATISTICS_DEBOUNCE_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+    
+    def init_ui(self):
+        layout = QVBoxLayout()
+        
+        self.totals_label = QLabel("Загрузка статистики…")
+        layout.addWidget(self.totals_label)
+        
+        self.tabs = QTabWidget()
+        self.styles_table = self.create_table(["Стиль", "Работ", "Стоимость (€)"])
+        self.artists_table = self.create_table(["Художник", "Работ", "Средняя цена (€)"])
+        self.decades_table = self.create_table(["Десятилетие", "Работ"])
+        self.tabs.addTab(self.styles_table, "По стилям")
+        self.tabs.addTab(self.artists_table, "По художникам")
+        self.tabs.addTab(self.decades_table, "По десятилетиям")
+        layout.addWidget(self.tabs)
+        
+        group_box = QGroupBox("Статистика коллекции")
+        group_box.setLayout(layout)
+        
+        main_layout = QVBoxLayout()
+        main_layout.addWidget(group_box)
+        self.setLayout(main_layout)
+    
+    def create_table(self, headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        return table
+    
+    def schedule_refresh(self, *args):
+        self.refresh_timer.start()
+    
+    def refresh(self):
+        if self.analytics is None:
+            from analytics import GalleryAnalytics
+            self.analytics = GalleryAnalytics(self.db)
+        self.worker.read(self.analytics.report, STATISTICS_TOP,
+                         description="Обновление статистики", key=("statistics", id(self)),
+                         on_result=self.show_report, on_error=self.on_refresh_failed)
+    
+    def show_report(self, report):
+        count, value = report["totals"]
+        self.totals_label.setText(f"Всего работ: {count:,}, общая стоимость: {value:,.2f} €")
+        self.fill_table(self.styles_table, [(style, count, f"{total:,.2f}")
+                                            for style, count, total in report["styles"]])
+        self.fill_table(self.artists_table, [(artist, count, f"{average:,.2f}")
+                                             for artist, count, average in report["artists"]])
+        self.fill_table(self.decades_table, [(f"{decade}-е", count)
+                                             for decade, count in report["decades"]])
+    
+    def fill_table(self, table, rows):
+        table.setRowCount(len(rows))
+        for row_number, row in enumerate(rows):
+            for column, value in enumerate(row):
+                table.setItem(row_number, column, QTableWidgetItem(str(value)))
+    
+    def on_refresh_failed(self, error):
+        self.totals_label.setText(f"Статистика недоступна: {error}")
+
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    backup_progress = Signal(int, int)
+    
+    def __init__(self, backup_interval=BACKUP_INTERVAL_MIN):
         super().__init__()
         self.db = DatabaseManager()
+        self.backup_interval = backup_interval
+        self.worker = DatabaseWorker(self)
+        # Снимок идёт долго и не должен занимать потоки чтения таблицы и статистики
+        self.backup_worker = DatabaseWorker(self, max_readers=1)
+        self._backups = None
         self.init_ui()
     
+    @property
+    def backups(self):
+        # backup тянет urllib, http.client и ssl: модуль нужен только к первому снимку
+        if self._backups is None:
+            from backup import BackupManager
+            self._backups = BackupManager(self.db)
+        return self._backups
+    
     def init_ui(self):
         self.setWindowTitle("Виртуальная галерея искусства")
         self.setGeometry(100, 100, 1000, 800)
@@ -206,11 +499,27 @@ class MainWindow(QMainWindow):
         central_widget = QWidget()
         main_layout = QVBoxLayout()
         
-        self.table_widget = ArtworkTable()
+        self.table_widget = ArtworkTable(self.db, self.worker)
         main_layout.addWidget(self.table_widget)
         
-        self.input_form = InputForm(self.table_widget)
-        main_layout.addWidget(self.input_form)
+        bottom_layout = QHBoxLayout()
+        self.input_form = InputForm(self.table_widget, self.db, self.worker)
+        bottom_layout.addWidget(self.input_form)
+        
+        self.statistics_panel = StatisticsPanel(self.db, self.worker)
+        bottom_layout.addWidget(self.statistics_panel)
+        main_layout.addLayout(bottom_layout)
+        
+        # Сводку обновляем по любому изменению набора строк в таблице
+        model = self.table_widget.model
+        model.rowsInserted.connect(self.statistics_panel.schedule_refresh)
+        model.rowsRemoved.connect(self.statistics_panel.schedule_refresh)
+        model.modelReset.connect(self.statistics_panel.schedule_refresh)
+        
+        # Изменения из других окон и процессов подтягиваются инкрементально через журнал
+        self.change_notifier = ChangeNotifier(self.db, parent=self)
+        self.change_notifier.changed.connect(self.table_widget.refresh_data)
+        self.change_notifier.changed.connect(self.statistics_panel.schedule_refresh)
         
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
@@ -218,8 +527,108 @@ class MainWindow(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Готов к работе")
+        self.worker.progress.connect(self.on_worker_progress)
         
+        self.diagnostics_label = QLabel()
+        self.status_bar.addPermanentWidget(self.diagnostics_label)
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.setInterval(DIAGNOSTICS_INTERVAL_MS)
+        self.diagnostics_timer.timeout.connect(self.update_diagnostics)
+        self.diagnostics_timer.start()
+        self.update_diagnostics()
         
+        self.init_backups()
+    
+    def init_backups(self):
+        backup_menu = self.menuBar().addMenu("Резервные копии")
+        backup_menu.addAction("Создать снимок", self.start_snapshot)
+        backup_menu.addAction("Восстановить из снимка…", self.restore_snapshot)
+        
+        self.backup_progress_bar = QProgressBar()
+        self.backup_progress_bar.setMaximumWidth(200)
+        self.backup_progress_bar.setFormat("Резервная копия: %p%")
+        self.backup_progress_bar.hide()
+        self.status_bar.addPermanentWidget(self.backup_progress_bar)
+        # Колбэк прогресса вызывается в фоновом потоке, сигнал доставит его в поток интерфейса
+        self.backup_progress.connect(self.on_backup_progress)
+        
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.start_snapshot)
+        if self.backup_interval <= 0:
+            return
+        if not backup_schedule_allowed(self.db.db_name):
+            logging.info("Scheduled snapshots disabled: %s is in memory or read-only",
+                         self.db.db_name)
+            return
+        self.backup_timer.setInterval(self.backup_interval * 60 * 1000)
+        self.backup_timer.start()
+    
+    def start_snapshot(self):
+        if self.backup_worker.pending():
+            return
+        self.backup_progress_bar.setValue(0)
+        self.backup_progress_bar.show()
+        self.backup_worker.read(self.backups.snapshot, progress=self.backup_progress.emit,
+                                description="Резервное копирование",
+                                on_result=self.on_snapshot_done,
+                                on_error=self.on_snapshot_failed)
+    
+    def on_backup_progress(self, copied, total):
+        self.backup_progress_bar.setMaximum(total)
+        self.backup_progress_bar.setValue(copied)
+    
+    def on_snapshot_done(self, path):
+        self.backup_progress_bar.hide()
+        self.status_bar.showMessage(f"Снимок базы сохранён: {path}", 5000)
+    
+    def on_snapshot_failed(self, error):
+        self.backup_progress_bar.hide()
+        QMessageBox.critical(self, "Ошибка", f"Ошибка резервного копирования: {str(error)}")
+    
+    def restore_snapshot(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Выберите снимок", self.backups.directory,
+                                              "Снимки базы (*.db)")
+        if not path:
+            return
+        
+        reply = QMessageBox.question(
+            self, "Восстановление",
+            "Текущие данные будут заменены данными из снимка. Продолжить?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        
+        # Через поток записи: восстановление не пересечётся с добавлением и удалением
+        self.worker.write(self.backups.restore, path, description="Восстановление из снимка",
+                          on_result=self.on_restore_done, on_error=self.on_restore_failed)
+    
+    def on_restore_done(self, safety_path):
+        self.table_widget.load_data()
+        self.statistics_panel.schedule_refresh()
+        QMessageBox.information(self, "Успех", "База восстановлена из снимка.\n"
+                                f"Прежнее состояние сохранено в {safety_path}")
+    
+    def on_restore_failed(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка восстановления: {str(error)}")
+    
+    def update_diagnostics(self):
+        snapshot = METRICS.snapshot()
+        self.diagnostics_label.setText(format_summary(snapshot))
+        cache = self.db.cache.stats()
+        self.diagnostics_label.setToolTip(
+            f"{format_details(snapshot)}\nКэш запросов: попаданий {cache['hits']}, "
+            f"промахов {cache['misses']}, вытеснено {cache['evictions']}, "
+            f"сбросов {cache['invalidations']}, записей {cache['entries']}")
+    
+    def on_worker_progress(self, pending, description):
+        if pending:
+            self.status_bar.showMessage(f"{description or 'Работа с базой данных'}… "
+                                        f"(операций: {pending})")
+        else:
+            self.status_bar.showMessage("Готов к работе")
+    
     def closeEvent(self, event):
         reply = QMessageBox.question(
             self, 'Подтверждение выхода',
@@ -229,6 +638,13 @@ class MainWindow(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
+            self.change_notifier.stop()
+            self.backup_timer.stop()
+            if self.table_widget.thumbnails is not None:
+                self.table_widget.thumbnails.close()
+            self.worker.wait_for_done()
+            self.backup_worker.wait_for_done()
+            self.db.close()
             event.accept()
         else:
             event.ignore()
\ No newline at end of file
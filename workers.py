@@ -0,0 +1,128 @@
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+
+CHANGE_POLL_INTERVAL_MS = 1000
+
+class _TaskSignals(QObject):
+    done = Signal(object, object, object)
+
+class DatabaseTask(QRunnable):
+    def __init__(self, fn, args, kwargs, description="", on_result=None, on_error=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.description = description
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cancelled = False
+        self.signals = _TaskSignals()
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def run(self):
+        if self.cancelled:
+            self.signals.done.emit(self, None, None)
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.done.emit(self, None, e)
+            return
+        self.signals.done.emit(self, result, None)
+
+class DatabaseWorker(QObject):
+    progress = Signal(int, str)
+    
+    def __init__(self, parent=None, max_readers=2):
+        super().__init__(parent)
+        self._read_pool = QThreadPool(self)
+        self._read_pool.setMaxThreadCount(max_readers)
+        # Все изменения идут через один поток, чтобы писатели не конкурировали за блокировку
+        self._write_pool = QThreadPool(self)
+        self._write_pool.setMaxThreadCount(1)
+        self._tasks = []
+        self._keyed = {}
+    
+    def read(self, fn, *args, description="", on_result=None, on_error=None, key=None, **kwargs):
+        return self._submit(self._read_pool, fn, args, kwargs, description,
+                            on_result, on_error, key)
+    
+    def write(self, fn, *args, description="", on_result=None, on_error=None, **kwargs):
+        return self._submit(self._write_pool, fn, args, kwargs, description,
+                            on_result, on_error, None)
+    
+    def _submit(self, pool, fn, args, kwargs, description, on_result, on_error, key):
+        if key is not None and key in self._keyed:
+            self.cancel(self._keyed[key])
+        
+        task = DatabaseTask(fn, args, kwargs, description, on_result, on_error)
+        task.signals.done.connect(self._on_done)
+        self._tasks.append(task)
+        if key is not None:
+            self._keyed[key] = task
+        pool.start(task)
+        self._emit_progress()
+        return task
+    
+    def cancel(self, task):
+        task.cancel()
+        for pool in (self._read_pool, self._write_pool):
+            if pool.tryTake(task):
+                self._finish(task)
+                return
+    
+    def _on_done(self, task, result, error):
+        if not self._finish(task) or task.cancelled:
+            return
+        if error is not None:
+            if task.on_error is not None:
+                task.on_error(error)
+        elif task.on_result is not None:
+            task.on_result(result)
+    
+    def _finish(self, task):
+        if task not in self._tasks:
+            return False
+        self._tasks.remove(task)
+        for key, keyed_task in list(self._keyed.items()):
+            if keyed_task is task:
+                del self._keyed[key]
+        self._emit_progress()
+        return True
+    
+    def _emit_progress(self):
+        descriptions = [task.description for task in self._tasks
+                        if task.description and not task.cancelled]
+        self.progress.emit(len(self._tasks), descriptions[-1] if descriptions else "")
+    
+    def pending(self):
+        return len(self._tasks)
+    
+    def wait_for_done(self, msecs=-1):
+        self._read_pool.waitForDone(msecs)
+        self._write_pool.waitForDone(msecs)
+
+class ChangeNotifier(QObject):
+    # Другие окна и скрипты импорта пишут в ту же базу; PRAGMA data_version на отдельном
+    # соединении стоит микросекунды и не читает страницы, поэтому её можно опрашивать по таймеру
+    changed = Signal()
+    
+    def __init__(self, db, interval_ms=CHANGE_POLL_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self._version = db.get_data_version()
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start()
+    
+    def poll(self):
+        version = self.db.get_data_version()
+        if version != self._version:
+            self._version = version
+            self.changed.emit()
+    
+    def stop(self):
+        self.timer.stop()